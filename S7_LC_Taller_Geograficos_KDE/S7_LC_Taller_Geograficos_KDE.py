@@ -100,6 +100,46 @@
 
 # (Utilice este espacio para describir el procedimiento, análisis, y conclusiones)
 
+# **Nota sobre el tamaño de la visualización.** Un HTML que incrusta todas las curvas de nivel, como `Files/interactive_contour_plots.html`, crece con cada tipo de delito y con la resolución de la grilla. El módulo `tiles_contornos.py` de esta carpeta exporta las curvas a tiles GeoJSON por nivel de zoom, y el mapa sólo descarga los tiles visibles. La siguiente celda exporta las curvas de robos y homicidios (con `KDERapido` de `kde_rapido.py` y el ancho `normal_reference`) y compara lo que pesan los tiles de cada zoom con ese HTML. La columna `bytes` es lo que se descarga al ver toda la ciudad en ese zoom, y `bytes_vista` es una cota de lo que descarga una pantalla. En cada zoom, lo que descarga una pantalla debería ser al menos 10 veces más liviano que el HTML:
+
+# In[ ]:
+
+
+import os
+
+import pandas as pd
+
+from kde_rapido import KDERapido
+from tiles_contornos import capa_folium, exportar_tiles, tamanos_tiles
+
+delitos = pd.read_csv("Files/data/Chicago_delitos_verano_2019.csv")
+tamano_html = os.path.getsize("Files/interactive_contour_plots.html")
+
+tablas = []
+for tipo in ["robo", "homicidio"]:
+    kde = KDERapido(delitos.loc[delitos["tipo_crimen"] == tipo, ["lon", "lat"]])
+    exportar_tiles(*kde.malla(), carpeta = f"Files/tiles/{tipo}")
+    tabla = pd.DataFrame(tamanos_tiles(f"Files/tiles/{tipo}")).T
+    tabla.index.name = "zoom"
+    tablas.append(tabla.assign(tipo = tipo).set_index("tipo", append = True))
+tamanos = pd.concat(tablas).groupby(level = "zoom").sum()
+tamanos["veces_menor_que_html"] = tamano_html / tamanos["bytes_vista"]
+print(f"interactive_contour_plots.html: {tamano_html / 1e6:.2f} MB")
+tamanos
+
+
+# Para ver los tiles en un mapa de `folium` (sirviendo la carpeta con `python -m http.server`, ya que el navegador no descarga archivos locales desde `file://`):
+
+# In[ ]:
+
+
+import folium
+
+mapa = folium.Map(location = [41.881998, -87.627800], zoom_start = 11)
+capa_folium("Files/tiles/robo", url_base = "Files/tiles/robo").add_to(mapa)
+mapa
+
+
 # ## 4. Explicando la ubicación del delito
 # 
 # El objetivo de este punto es encontrar posibles correlaciones  entre el crimen y características de la ciudad. Para ello, utilice los datos de OpenStreetMap y explore si existe una correlación entre el porcentaje del área de la comunidad  dedicado a tiendas (`retail`)  y comercios (`commercial`) y el número total de robos y homicidios en esa comunidad. Ofrezca una explicación intuitiva de por qué cree que aparecen estas correlaciones. (Esto puede tomar mucho tiempo y requerir mucha capacidad computacional, puede aprovechar los recursos de [Google Colab](https://colab.research.google.com/))
@@ -444,6 +444,15 @@ distancias
 
 
 # Tenemos entonces todas las distancias entre Uniandes y el BanRep, y los puntos más cercanos de las ciclovías.
+#
+# Este doble ciclo evalúa cada par (punto, ciclovía) por separado, por lo que se vuelve muy lento cuando tenemos miles de puntos, por ejemplo todos los `bares`. El módulo `distancias.py`, en esta misma carpeta, ofrece una versión vectorizada de `calculate_all_distances` que devuelve el mismo `DataFrame` y, con el argumento `k`, usa un índice espacial para quedarse sólo con las `k` ciclovías más cercanas a cada punto:
+
+# In[ ]:
+
+
+from distancias import calculate_all_distances
+
+calculate_all_distances(db, ciclovias, k = 3)
 
 # ## Uniones espaciales
 # 
@@ -538,7 +547,41 @@ map
 
 
 # [Folium](https://pypi.org/project/folium/) entonces nos permite con facilidad ubicar nuestros datos en un mapa interactivo. Notemos que omití graficar los supermercados, esto se debe a que al ser más de 1000 datos le puede tomar a [folium](https://pypi.org/project/folium/) un tiempo considerable. Para superar esto una buena alternativa  es [bokeh](https://bokeh.org/), un submódulo de la librería [datashader](https://datashader.org/), que exploraremos en un proximo cuaderno. (Te invito que explores este  [enlace](https://anaconda.org/jbednar/nyc_taxi/notebook) para ver más detalles sobre este submódulo)
-# 
+#
+# Parte de esa demora se debe a cómo construimos las capas: un `folium.Marker` por fila y un `to_json()` por polígono. El módulo `capas_folium.py`, en esta misma carpeta, construye cada capa en una sola pasada: los puntos en un `FastMarkerCluster` y los polígonos simplificados y serializados una sola vez. Con `medir_mapa` podemos comparar el tiempo de construcción y el tamaño del HTML resultante de las dos formas de construir el mapa de bares y UPL:
+
+# In[ ]:
+
+
+from capas_folium import capa_puntos, capa_poligonos, medir_mapa
+
+def mapa_ciclos():
+    # Las mismas capas que arriba, un elemento a la vez
+    mapa = folium.Map(location = [4.65283,-74.054339], tiles = "OpenStreetMap", zoom_start = 10)
+    for i in range(0,len(bares)):
+        folium.Marker(
+            location=[bares.iloc[i]['LATITUD'], bares.iloc[i]['LONGITUD']],
+            popup=bares.iloc[i]['NOMBRE_EST'],
+        ).add_to(mapa)
+    for _, r in upla_filt.iterrows():
+        sim_geo = gpd.GeoSeries(r['geometry']).simplify(tolerance=0.001)
+        geo_j = folium.GeoJson(data=sim_geo.to_json(),
+                               style_function=lambda x: {'fillColor': '#FFFFFF'})
+        folium.Popup(r['UPlNombre']).add_to(geo_j)
+        geo_j.add_to(mapa)
+    return mapa
+
+def mapa_capas():
+    mapa = folium.Map(location = [4.65283,-74.054339], tiles = "OpenStreetMap", zoom_start = 10)
+    capa_puntos(bares, lat = "LATITUD", lon = "LONGITUD", popup = "NOMBRE_EST").add_to(mapa)
+    capa_poligonos(upla_filt, popup = "UPlNombre", tolerancia = 0.001).add_to(mapa)
+    return mapa
+
+for nombre, construir in [("Marker e iterrows()", mapa_ciclos), ("capas_folium", mapa_capas)]:
+    segundos, tamano = medir_mapa(construir)
+    print(f"{nombre}: construcción {segundos:.2f} s, HTML {tamano / 1e6:.2f} MB")
+mapa_capas()
+
 
 # # Referencias
 # 
@@ -0,0 +1,102 @@
+# coding: utf-8
+
+"""Constructores de capas de `folium` para muchos puntos o polígonos.
+
+En el cuaderno `S7_LSC1_Datos_Geograficos` la capa de bares crea un
+`folium.Marker` por fila con `.iloc`, y la capa de UPL llama `simplify()` y
+`to_json()` para cada polígono dentro de `iterrows()`. Ambas cosas son lentas
+y el HTML crece con un bloque de código por cada elemento. Estas funciones
+serializan la capa completa en una sola pasada:
+
+- `capa_puntos`: todos los puntos en un `FastMarkerCluster` (un arreglo de
+  coordenadas y un único callback de JavaScript) o en una sola colección
+  GeoJSON de marcadores circulares.
+- `capa_poligonos`: la `GeoSeries` completa se simplifica y se convierte a
+  GeoJSON una sola vez, con un `GeoJsonPopup` compartido.
+
+`medir_mapa` permite comparar el tiempo de construcción y el tamaño del HTML
+contra los ciclos originales.
+"""
+
+import time
+
+import folium
+import geopandas as gpd
+from folium.plugins import FastMarkerCluster
+
+_CALLBACK_POPUP = """
+function (fila) {
+    var marcador = L.marker(new L.LatLng(fila[0], fila[1]));
+    marcador.bindPopup(String(fila[2]));
+    return marcador;
+}
+"""
+
+
+def _a_wgs84(geometria):
+    # Leaflet espera lat/lon en WGS84; p. ej. las UPL vienen en MAGNA-SIRGAS (EPSG:4686)
+    if geometria.crs is not None and geometria.crs.to_epsg() != 4326:
+        return geometria.to_crs(4326)
+    return geometria
+
+
+def capa_puntos(gdf, lat = "LATITUD", lon = "LONGITUD", popup = None, agrupar = True,
+                nombre = None, radio = 3, color = "blue"):
+    """Capa con todos los puntos de `gdf`.
+
+    Con `agrupar=True` devuelve un `FastMarkerCluster`; si no, una capa
+    `GeoJson` de marcadores circulares. `popup` es la columna que se muestra
+    al hacer clic en cada punto. Si `lat`/`lon` no están en `gdf` se usan las
+    coordenadas de la geometría, llevada a EPSG:4326 si está en otro sistema.
+    """
+    if lat in gdf.columns and lon in gdf.columns:
+        latitudes, longitudes = gdf[lat], gdf[lon]
+    else:
+        geometria = _a_wgs84(gdf.geometry)
+        latitudes, longitudes = geometria.y, geometria.x
+    if agrupar:
+        columnas = [latitudes.to_numpy(), longitudes.to_numpy()]
+        callback = None
+        if popup is not None:
+            columnas.append(gdf[popup].astype(str).to_numpy())
+            callback = _CALLBACK_POPUP
+        datos = [list(fila) for fila in zip(*columnas)]
+        return FastMarkerCluster(datos, callback = callback, name = nombre)
+    puntos = gpd.GeoDataFrame(gdf[[popup]] if popup is not None else None,
+                              geometry = gpd.points_from_xy(longitudes, latitudes), crs = 4326)
+    return folium.GeoJson(
+        puntos.to_json(),
+        name = nombre,
+        marker = folium.CircleMarker(radius = radio, color = color, fill = True, fill_opacity = 0.7),
+        popup = folium.GeoJsonPopup(fields = [popup], labels = False) if popup is not None else None)
+
+
+def capa_poligonos(gdf, popup = None, tolerancia = 0.001, nombre = None,
+                   estilo = None):
+    """Capa `GeoJson` con todos los polígonos de `gdf`, simplificados una sola vez.
+
+    `tolerancia` se pasa a `GeoSeries.simplify` (en las unidades de la
+    proyección; `None` para no simplificar). La geometría simplificada se lleva
+    a EPSG:4326 si está en otro sistema. Sólo se serializan la geometría y la
+    columna `popup`.
+    """
+    if estilo is None:
+        estilo = {"fillColor": "#FFFFFF"}
+    geometria = gdf.geometry if tolerancia is None else gdf.geometry.simplify(tolerance = tolerancia)
+    capa = gpd.GeoDataFrame(gdf[[popup]] if popup is not None else None, geometry = _a_wgs84(geometria))
+    return folium.GeoJson(
+        capa.to_json(),
+        name = nombre,
+        style_function = lambda x: estilo,
+        popup = folium.GeoJsonPopup(fields = [popup], labels = False) if popup is not None else None)
+
+
+def medir_mapa(construir, *args, **kwargs):
+    """Tiempo de construcción (segundos) y tamaño del HTML (bytes) de un mapa.
+
+    `construir` recibe `args`/`kwargs` y devuelve un `folium.Map`.
+    """
+    inicio = time.perf_counter()
+    mapa = construir(*args, **kwargs)
+    html = mapa.get_root().render()
+    return time.perf_counter() - inicio, len(html.encode("utf-8"))
@@ -0,0 +1,168 @@
+# coding: utf-8
+
+"""Distancias masivas entre puntos y geometrías (líneas o polígonos).
+
+Versión vectorizada de `calculate_all_distances` del cuaderno
+`S7_LSC1_Datos_Geograficos`. En lugar del doble ciclo con `.iloc`,
+`nearest_points` y `geodesic` por cada par (punto, ciclovía), los puntos
+más cercanos se obtienen en bloque con `shapely.shortest_line` y las
+distancias con un kernel geodésico (o haversine) sobre arreglos de NumPy.
+
+Las coordenadas se asumen geográficas (longitud, latitud), igual que en el
+cuaderno, donde ambas bases se llevan a MAGNA-SIRGAS (EPSG: 4686).
+"""
+
+import numpy as np
+import pandas as pd
+import shapely
+from pyproj import Geod
+
+RADIO_TIERRA_KM = 6371.0088
+
+# Kilómetros por grado de latitud (mínimo, en el ecuador) y de longitud en el ecuador
+KM_POR_GRADO_LAT = 110.574
+KM_POR_GRADO_LON = 111.320
+
+_GEOD = Geod(ellps = "WGS84")
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distancia de gran círculo en kilómetros entre arreglos de coordenadas."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+
+def geodesica(lat1, lon1, lat2, lon2):
+    """Distancia geodésica sobre el elipsoide WGS84 en kilómetros.
+
+    Es el mismo cálculo que `geopy.distance.geodesic`, pero vectorizado.
+    """
+    _, _, metros = _GEOD.inv(np.asarray(lon1, dtype = float), np.asarray(lat1, dtype = float),
+                             np.asarray(lon2, dtype = float), np.asarray(lat2, dtype = float))
+    return np.asarray(metros) / 1000
+
+
+_METODOS = {"geodesica": geodesica, "haversine": haversine}
+
+
+def _geometrias(gdf):
+    return np.asarray(gdf.geometry.array, dtype = object)
+
+
+def _verificar_crs(df, ciclovias):
+    crs_puntos = getattr(df, "crs", None)
+    crs_lineas = getattr(ciclovias, "crs", None)
+    if crs_puntos is not None and crs_lineas is not None and crs_puntos != crs_lineas:
+        raise ValueError("Las bases están en proyecciones distintas: "
+                         f"{crs_puntos} y {crs_lineas}. Use `.to_crs` para homogeneizarlas.")
+    for crs in (crs_puntos, crs_lineas):
+        if crs is not None and not crs.is_geographic:
+            raise ValueError(f"Se esperaban coordenadas geográficas (lon, lat) y se recibió {crs}.")
+
+
+def _distancias_pares(puntos, lineas, kernel):
+    """Punto más cercano de cada línea a cada punto (pares alineados) y su distancia."""
+    cortas = shapely.shortest_line(puntos, lineas)
+    coords = shapely.get_coordinates(cortas).reshape(-1, 2, 2)
+    origen, destino = coords[:, 0], coords[:, 1]
+    return kernel(origen[:, 1], origen[:, 0], destino[:, 1], destino[:, 0])
+
+
+def _todas(puntos, lineas, etiquetas, columna_id, kernel, max_pares):
+    n, m = len(puntos), len(lineas)
+    bloque = max(1, max_pares // max(m, 1))
+    partes = []
+    for inicio in range(0, n, bloque):
+        p = puntos[inicio:inicio + bloque]
+        pares_p = np.repeat(p, m)
+        pares_l = np.tile(lineas, len(p))
+        partes.append(pd.DataFrame({
+            columna_id: np.repeat(etiquetas[inicio:inicio + bloque], m),
+            "ciclovia": np.tile(np.arange(m), len(p)),
+            "distance": _distancias_pares(pares_p, pares_l, kernel)}))
+    if not partes:
+        return pd.DataFrame({columna_id: [], "ciclovia": [], "distance": []})
+    return pd.concat(partes, ignore_index = True)
+
+
+def _k_cercanas(puntos, lineas, etiquetas, columna_id, kernel, k):
+    n, m = len(puntos), len(lineas)
+    k = min(k, m)
+    arbol = shapely.STRtree(lineas)
+    lat = shapely.get_y(puntos)
+
+    # Radio inicial: el doble de la distancia (en grados) a la línea más cercana
+    (_, _), d_min = arbol.query_nearest(puntos, return_distance = True, all_matches = False)
+    radio = 2 * d_min + 1e-6
+
+    pendientes = np.arange(n)
+    res_p, res_l, res_d = [], [], []
+    while pendientes.size:
+        ip, il = arbol.query(puntos[pendientes], predicate = "dwithin", distance = radio[pendientes])
+        dist = _distancias_pares(puntos[pendientes[ip]], lineas[il], kernel)
+        orden = np.lexsort((dist, ip))
+        ip, il, dist = ip[orden], il[orden], dist[orden]
+        conteo = np.bincount(ip, minlength = pendientes.size)
+        inicio = np.concatenate(([0], np.cumsum(conteo)[:-1]))
+
+        # Con k candidatos, ninguna línea fuera del radio puede estar más cerca que el k-ésimo
+        # si el radio cubre la distancia d_k expresada en grados (usando el grado más corto).
+        completos = conteo >= k
+        d_k = np.full(pendientes.size, np.inf)
+        d_k[completos] = dist[inicio[completos] + k - 1]
+        cos_lat = np.cos(np.radians(np.minimum(np.abs(lat[pendientes]) + radio[pendientes], 89.9)))
+        km_por_grado = np.minimum(KM_POR_GRADO_LAT, KM_POR_GRADO_LON * cos_lat)
+        radio_req = d_k / km_por_grado
+        listos = completos & (radio_req <= radio[pendientes])
+
+        seleccion = listos[ip] & (np.arange(len(ip)) - inicio[ip] < k)
+        res_p.append(pendientes[ip[seleccion]])
+        res_l.append(il[seleccion])
+        res_d.append(dist[seleccion])
+
+        siguiente = np.where(completos, radio_req * 1.01, radio[pendientes] * 2)
+        radio[pendientes] = siguiente
+        pendientes = pendientes[~listos]
+
+    res_p = np.concatenate(res_p) if res_p else np.array([], dtype = int)
+    res_l = np.concatenate(res_l) if res_l else np.array([], dtype = int)
+    res_d = np.concatenate(res_d) if res_d else np.array([], dtype = float)
+    orden = np.lexsort((res_d, res_p))
+    return pd.DataFrame({columna_id: etiquetas[res_p[orden]],
+                         "ciclovia": res_l[orden],
+                         "distance": res_d[orden]})
+
+
+def calculate_all_distances(df, ciclovias, k = None, columna_id = "lugar",
+                            metodo = "geodesica", max_pares = 1_000_000):
+    """Distancia (km) entre cada punto de `df` y el punto más cercano de cada ciclovía.
+
+    Devuelve el mismo `DataFrame` largo del cuaderno, con columnas `columna_id`,
+    `ciclovia` (posición de la línea en `ciclovias`) y `distance`.
+
+    Parámetros
+    ----------
+    df : GeoDataFrame de puntos.
+    ciclovias : GeoDataFrame de líneas (o polígonos), en la misma proyección.
+    k : si se indica, sólo se devuelven las `k` ciclovías más cercanas a cada punto,
+        usando un índice espacial `STRtree` para descartar el resto de pares.
+    columna_id : columna de `df` que identifica cada punto.
+    metodo : "geodesica" (elipsoide WGS84, como `geopy`) o "haversine" (esfera).
+    max_pares : número máximo de pares evaluados por bloque cuando `k` es `None`.
+    """
+    if metodo not in _METODOS:
+        raise ValueError(f"metodo debe ser uno de {sorted(_METODOS)}, se recibió {metodo!r}")
+    _verificar_crs(df, ciclovias)
+    kernel = _METODOS[metodo]
+    puntos = _geometrias(df)
+    lineas = _geometrias(ciclovias)
+    etiquetas = df[columna_id].to_numpy()
+    if k is None:
+        return _todas(puntos, lineas, etiquetas, columna_id, kernel, max_pares)
+    if k < 1:
+        raise ValueError("k debe ser un entero positivo")
+    if len(puntos) == 0 or len(lineas) == 0:
+        return pd.DataFrame({columna_id: [], "ciclovia": [], "distance": []})
+    return _k_cercanas(puntos, lineas, etiquetas, columna_id, kernel, int(k))
@@ -0,0 +1,204 @@
+# coding: utf-8
+
+"""Estimación de densidad de kernel por agrupamiento lineal y convolución FFT.
+
+`KDEMultivariate` de `statsmodels` evalúa la densidad sumando el kernel de
+cada observación en cada punto de la grilla, O(n_puntos × n_grilla), y el
+ancho de banda `cv_ml` cuesta O(n²) en cada paso del optimizador. Aquí los
+datos se agrupan primero en una grilla regular (agrupamiento lineal, ver
+Wand, 1994) y la densidad en toda la grilla se obtiene convolucionando esos
+conteos con un kernel gaussiano mediante FFT, lo que toma milisegundos.
+
+`KDERapido` imita la interfaz de `KDEMultivariate` (`bw`, `pdf`) para
+variables continuas en una o dos dimensiones: la distancia al centro de la
+ciudad (sección 3.1) y las superficies de puntos calientes en lat/lon
+(sección 3.2).
+
+Referencias
+-----------
+- Wand, M. P. (1994). Fast computation of multivariate kernel estimators.
+  Journal of Computational and Graphical Statistics, 3(4), 433-445.
+"""
+
+import numpy as np
+from scipy import optimize
+from scipy.interpolate import RegularGridInterpolator
+from scipy.signal import fftconvolve
+from scipy.spatial import cKDTree
+
+# Número de anchos de banda a cada lado que se incluyen en la grilla y en el kernel truncado
+TAU = 4.0
+
+
+def ancho_normal_reference(datos):
+    """Regla de referencia normal, igual que `bw='normal_reference'` en `statsmodels`."""
+    datos = _como_matriz(datos)
+    n, d = datos.shape
+    return 1.06 * np.std(datos, axis = 0) * n ** (-1.0 / (4 + d))
+
+
+def _como_matriz(datos):
+    datos = np.asarray(datos, dtype = float)
+    if datos.ndim == 1:
+        datos = datos[:, None]
+    if datos.ndim != 2 or datos.shape[1] not in (1, 2):
+        raise ValueError("Sólo se admiten datos en una o dos dimensiones")
+    return datos
+
+
+def binear(datos, grillas):
+    """Agrupamiento lineal de los datos en una grilla regular.
+
+    Cada observación reparte su peso entre los nodos vecinos de la grilla en
+    proporción a su cercanía. Devuelve un arreglo de conteos con la forma de
+    la grilla (un eje por dimensión, en el mismo orden de las columnas).
+    """
+    datos = _como_matriz(datos)
+    formas = [len(g) for g in grillas]
+    conteos = np.zeros(int(np.prod(formas)))
+    # Posición continua de cada dato en unidades de celdas
+    pos = np.column_stack([(datos[:, j] - g[0]) / (g[1] - g[0]) for j, g in enumerate(grillas)])
+    base = np.floor(pos).astype(np.int64)
+    frac = pos - base
+    # Se recorren las 2^d esquinas de la celda que contiene a cada dato
+    for esquina in np.ndindex(*(2,) * len(grillas)):
+        idx = base + np.array(esquina)
+        peso = np.prod(np.where(np.array(esquina), frac, 1 - frac), axis = 1)
+        validos = np.all((idx >= 0) & (idx < np.array(formas)), axis = 1)
+        plano = np.ravel_multi_index(idx[validos].T, formas)
+        conteos += np.bincount(plano, weights = peso[validos], minlength = conteos.size)
+    return conteos.reshape(formas)
+
+
+def _kernel_grilla(ancho, grillas, tau = TAU):
+    """Kernel gaussiano producto evaluado en los desfases de la grilla, truncado en `tau` anchos."""
+    kernel = np.ones(())
+    for h, g in zip(ancho, grillas):
+        delta = g[1] - g[0]
+        L = min(len(g) - 1, int(np.ceil(tau * h / delta)))
+        u = np.arange(-L, L + 1) * delta / h
+        k = np.exp(-0.5 * u ** 2) / (h * np.sqrt(2 * np.pi))
+        kernel = np.multiply.outer(kernel, k)
+    return kernel
+
+
+def densidad_binneada(conteos, grillas, ancho, tau = TAU):
+    """Densidad en los nodos de la grilla a partir de los conteos agrupados."""
+    n = conteos.sum()
+    densidad = fftconvolve(conteos, _kernel_grilla(ancho, grillas, tau), mode = "same") / n
+    return np.maximum(densidad, 0)
+
+
+def ancho_cv_ml(datos, n_grilla = None, limites = None, ancho_inicial = None):
+    """Ancho de banda por validación cruzada de máxima verosimilitud aproximada.
+
+    Aproxima el criterio `cv_ml` de `statsmodels` sobre la representación
+    agrupada: la densidad de cada observación se interpola desde la grilla y
+    se le resta su propio aporte K_h(0) para dejarla fuera, por lo que cada
+    evaluación del criterio es una convolución FFT más una interpolación en
+    lugar de O(n²) evaluaciones del kernel. Por defecto usa 4096 nodos en 1-D
+    y 256 por eje en 2-D.
+    """
+    datos = _como_matriz(datos)
+    n, d = datos.shape
+    if n_grilla is None:
+        n_grilla = 4096 if d == 1 else 256
+    if ancho_inicial is None:
+        ancho_inicial = ancho_normal_reference(datos)
+    ancho_inicial = np.broadcast_to(np.asarray(ancho_inicial, dtype = float), (d,))
+    # La grilla se fija una vez para que los criterios sean comparables entre anchos
+    grillas = _grillas(datos, TAU * ancho_inicial, n_grilla, limites)
+    conteos = binear(datos, grillas)
+    delta = np.array([g[1] - g[0] for g in grillas])
+    pos = (datos - np.array([g[0] for g in grillas])) / delta
+    frac = pos - np.floor(pos)
+    _, vecinos = cKDTree(datos / ancho_inicial).query(datos / ancho_inicial, k = 2)
+    vecino = datos[vecinos[:, 1]]
+
+    def menos_log_verosimilitud(log_ancho):
+        ancho = np.exp(log_ancho)
+        # Evita anchos tan pequeños que la grilla no pueda representarlos
+        if np.any(ancho < delta):
+            return np.inf
+        f = RegularGridInterpolator(grillas, densidad_binneada(conteos, grillas, ancho, tau = 2 * TAU))(datos)
+        # Aporte propio de cada dato tras agruparlo e interpolarlo: con pesos lineales (1 - r, r)
+        # en cada eje es K(0)((1 - r)² + r²) + 2r(1 - r)K(delta), multiplicado entre ejes
+        k0 = 1 / (ancho * np.sqrt(2 * np.pi))
+        k1 = k0 * np.exp(-0.5 * (delta / ancho) ** 2)
+        propio = np.prod(k0 * ((1 - frac) ** 2 + frac ** 2) + 2 * frac * (1 - frac) * k1, axis = 1)
+        f_loo = (n * f - propio) / (n - 1)
+        # Un dato aislado a más de 2·TAU anchos de los demás queda con densidad nula por el
+        # truncamiento del kernel; el aporte de su vecino más cercano es una cota inferior exacta
+        cercano = np.prod(k0) * np.exp(-0.5 * np.sum(((datos - vecino) / ancho) ** 2, axis = 1)) / (n - 1)
+        return -np.mean(np.log(np.maximum(np.maximum(f_loo, cercano), 1e-300)))
+
+    resultado = optimize.minimize(menos_log_verosimilitud, np.log(ancho_inicial), method = "Nelder-Mead",
+                                  options = {"xatol": 1e-3, "fatol": 1e-6})
+    return np.exp(resultado.x)
+
+
+def _grillas(datos, margen, n_grilla, limites):
+    d = datos.shape[1]
+    n_grilla = np.broadcast_to(np.asarray(n_grilla, dtype = int), (d,))
+    if limites is None:
+        limites = [(datos[:, j].min() - margen[j], datos[:, j].max() + margen[j]) for j in range(d)]
+    elif d == 1 and np.ndim(limites) == 1:
+        limites = [limites]
+    return [np.linspace(lo, hi, m) for (lo, hi), m in zip(limites, n_grilla)]
+
+
+class KDERapido:
+    """Densidad de kernel gaussiana binneada en una o dos dimensiones.
+
+    Parámetros
+    ----------
+    datos : arreglo (n,) o (n, d) con d = 1 o 2; por ejemplo columnas `lon`, `lat`.
+    bw : "normal_reference", "cv_ml" (aproximado sobre la grilla) o un arreglo con
+        el ancho de banda de cada variable, como en `KDEMultivariate`.
+    n_grilla : número de nodos por dimensión.
+    limites : lista de (mínimo, máximo) por dimensión; por defecto el rango de los
+        datos más TAU anchos de banda a cada lado.
+
+    Atributos
+    ---------
+    bw : ancho de banda usado por variable.
+    grillas : lista con los nodos de la grilla en cada dimensión.
+    densidad : densidad estimada en la grilla, con un eje por variable
+        (para graficar con `contourf` en 2-D use `densidad.T`).
+    """
+
+    def __init__(self, datos, bw = "normal_reference", n_grilla = 512, limites = None):
+        datos = _como_matriz(datos)
+        self.nobs, self.k_vars = datos.shape
+        if isinstance(bw, str):
+            if bw == "normal_reference":
+                bw = ancho_normal_reference(datos)
+            elif bw == "cv_ml":
+                bw = ancho_cv_ml(datos, limites = limites)
+            else:
+                raise ValueError(f"bw debe ser 'normal_reference', 'cv_ml' o un arreglo, se recibió {bw!r}")
+        self.bw = np.broadcast_to(np.asarray(bw, dtype = float), (self.k_vars,)).copy()
+        self.grillas = _grillas(datos, TAU * self.bw, n_grilla, limites)
+        self.densidad = densidad_binneada(binear(datos, self.grillas), self.grillas, self.bw)
+        self._interpolador = RegularGridInterpolator(self.grillas, self.densidad,
+                                                     bounds_error = False, fill_value = 0.0)
+
+    def pdf(self, puntos = None):
+        """Densidad en `puntos` (interpolada desde la grilla); sin argumentos, la grilla completa.
+
+        En 2-D un solo punto puede pasarse como `(lon, lat)`.
+        """
+        if puntos is None:
+            return self.densidad
+        puntos = np.asarray(puntos, dtype = float)
+        if puntos.ndim == 1 and self.k_vars > 1:
+            # Un solo punto, no una muestra de una variable
+            puntos = puntos.reshape(1, self.k_vars)
+        return self._interpolador(_como_matriz(puntos))
+
+    def malla(self):
+        """Mallas (como `np.meshgrid`) y densidad listas para `plt.contour` en 2-D."""
+        if self.k_vars == 1:
+            return self.grillas[0], self.densidad
+        x, y = np.meshgrid(*self.grillas)
+        return x, y, self.densidad.T
@@ -0,0 +1,217 @@
+# coding: utf-8
+
+"""Almacén local de puntos de interés y usos del suelo de OpenStreetMap.
+
+`OSM(fp).get_pois(...)` vuelve a leer todo el archivo PBF para cada filtro y
+las respuestas de Overpass que guarda el taller en `Files/cache/*.json` son
+blobs opacos indexados por SHA1. Este módulo ingiere una de esas fuentes una
+sola vez y la guarda como GeoParquet:
+
+- una fila por elemento etiquetado (nodo, vía o relación multipolígono) con su
+  geometría, las etiquetas más usadas como columnas (`landuse`, `shop`, ...)
+  y el resto de etiquetas en la columna `tags` (JSON);
+- filas ordenadas por la curva de Hilbert y escritas en grupos de filas
+  pequeños con la columna `bbox`, de modo que `gpd.read_parquet(..., bbox=...)`
+  sólo lee los grupos que cruzan el rectángulo consultado.
+
+Las consultas por etiqueta y rectángulo (`consultar`) y el cálculo del
+porcentaje del área de cada comunidad dedicado a `retail` y `commercial`
+(`proporcion_uso_suelo`, sección 4 del taller) funcionan sin red.
+"""
+
+import json
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+CARPETA = Path(__file__).resolve().parent / "Files"
+CARPETA_CACHE = CARPETA / "cache"
+RUTA_ALMACEN = CARPETA / "osm_local.parquet"
+
+# Etiquetas que se guardan como columnas propias para poder filtrarlas al leer
+CLAVES = ["name", "landuse", "shop", "amenity", "building", "leisure", "highway"]
+
+# Elementos por grupo de filas: grupos pequeños permiten descartar más al filtrar por bbox
+FILAS_POR_GRUPO = 2_000
+
+
+def _elementos_overpass(rutas):
+    for ruta in rutas:
+        with open(ruta) as archivo:
+            datos = json.load(archivo)
+        # Las respuestas de Nominatim (listas) del mismo caché no son de Overpass
+        if isinstance(datos, dict) and "elements" in datos:
+            yield from datos["elements"]
+
+
+def _poligono_relacion(miembros, lineas):
+    externas = [lineas[m["ref"]] for m in miembros
+                if m["type"] == "way" and m.get("role") in ("outer", "") and m["ref"] in lineas]
+    internas = [lineas[m["ref"]] for m in miembros
+                if m["type"] == "way" and m.get("role") == "inner" and m["ref"] in lineas]
+    if not externas:
+        return None
+    # Las vías de un anillo pueden venir partidas en varios tramos
+    geometria = shapely.union_all(shapely.get_parts(shapely.polygonize(externas)))
+    if internas:
+        geometria = geometria.difference(shapely.union_all(shapely.get_parts(shapely.polygonize(internas))))
+    return shapely.make_valid(geometria) if not geometria.is_empty else None
+
+
+def leer_overpass(rutas = None):
+    """`GeoDataFrame` con los elementos etiquetados de respuestas JSON de Overpass.
+
+    Por defecto lee todos los `.json` de `Files/cache`. Las vías cerradas se
+    convierten en polígonos, las abiertas en líneas y las relaciones
+    `multipolygon` se arman a partir de sus vías miembro.
+    """
+    if rutas is None:
+        rutas = sorted(CARPETA_CACHE.glob("*.json"))
+    nodos, vias, relaciones = {}, {}, {}
+    for elemento in _elementos_overpass(rutas):
+        tipo, ident = elemento["type"], elemento["id"]
+        if tipo == "node":
+            nodos[ident] = elemento
+        elif tipo == "way":
+            vias[ident] = elemento
+        elif tipo == "relation":
+            relaciones[ident] = elemento
+
+    coordenadas = {i: (n["lon"], n["lat"]) for i, n in nodos.items()}
+    lineas = {}
+    for ident, via in vias.items():
+        puntos = [coordenadas[n] for n in via["nodes"] if n in coordenadas]
+        if len(puntos) >= 2:
+            lineas[ident] = shapely.LineString(puntos)
+
+    filas = []
+    for ident, nodo in nodos.items():
+        if nodo.get("tags"):
+            filas.append(("node", ident, nodo["tags"], shapely.Point(coordenadas[ident])))
+    for ident, via in vias.items():
+        if not via.get("tags") or ident not in lineas:
+            continue
+        linea = lineas[ident]
+        cerrada = via["nodes"][0] == via["nodes"][-1] and len(linea.coords) >= 4
+        filas.append(("way", ident, via["tags"], shapely.Polygon(linea.coords) if cerrada else linea))
+    for ident, relacion in relaciones.items():
+        etiquetas = relacion.get("tags", {})
+        if etiquetas.get("type") not in ("multipolygon", "boundary"):
+            continue
+        geometria = _poligono_relacion(relacion.get("members", []), lineas)
+        if geometria is not None:
+            filas.append(("relation", ident, etiquetas, geometria))
+
+    tipos, ids, etiquetas, geometrias = zip(*filas) if filas else ((), (), (), ())
+    return _tabla(tipos, ids, etiquetas, geometrias)
+
+
+def _tabla(tipos, ids, etiquetas, geometrias):
+    tabla = pd.DataFrame({"osm_type": pd.Categorical(tipos, categories = ["node", "way", "relation"]),
+                          "osm_id": np.asarray(ids, dtype = np.int64)})
+    for clave in CLAVES:
+        tabla[clave] = [e.get(clave) for e in etiquetas]
+    tabla["tags"] = [json.dumps({k: v for k, v in e.items() if k not in CLAVES}, ensure_ascii = False)
+                     for e in etiquetas]
+    return gpd.GeoDataFrame(tabla, geometry = list(geometrias), crs = 4326)
+
+
+def leer_pbf(ruta_pbf):
+    """`GeoDataFrame` con los puntos de interés y usos del suelo de un archivo PBF.
+
+    Usa `pyrosm` y lee el archivo una sola vez por tipo de dato.
+    """
+    from pyrosm import OSM
+
+    osm = OSM(str(ruta_pbf))
+    partes = [p for p in (osm.get_pois(), osm.get_landuse()) if p is not None and len(p)]
+    datos = pd.concat(partes, ignore_index = True)
+    excluidas = {"id", "osm_type", "geometry", "tags", "timestamp", "version", "changeset", "lon", "lat"}
+    registros = datos.drop(columns = [c for c in excluidas if c in datos.columns]).to_dict("records")
+    extras = datos["tags"] if "tags" in datos.columns else [None] * len(datos)
+    etiquetas = []
+    for registro, extra in zip(registros, extras):
+        # `pyrosm` deja las etiquetas sin columna propia como texto JSON
+        if isinstance(extra, str):
+            extra = json.loads(extra)
+        propias = {k: v for k, v in registro.items() if isinstance(v, str)}
+        etiquetas.append({**(extra or {}), **propias})
+    return _tabla(datos["osm_type"].to_numpy(), datos["id"].to_numpy(), etiquetas, datos.geometry.to_numpy())
+
+
+def guardar(gdf, ruta = RUTA_ALMACEN, filas_por_grupo = FILAS_POR_GRUPO):
+    """Guarda el `GeoDataFrame` como GeoParquet ordenado espacialmente y con columna `bbox`."""
+    gdf = gdf[~gdf.geometry.is_empty & gdf.geometry.notna()]
+    orden = np.argsort(gdf.geometry.hilbert_distance(), kind = "stable")
+    gdf = gdf.iloc[orden].reset_index(drop = True)
+    gdf.to_parquet(ruta, write_covering_bbox = True, row_group_size = filas_por_grupo)
+    return Path(ruta)
+
+
+def ingerir(fuente = None, ruta = RUTA_ALMACEN):
+    """Construye el almacén desde un archivo `.pbf` o desde respuestas JSON de Overpass.
+
+    `fuente` puede ser la ruta a un PBF, una lista de archivos JSON o `None`
+    para usar el caché del taller (`Files/cache`).
+    """
+    if fuente is not None and str(fuente).endswith(".pbf"):
+        gdf = leer_pbf(fuente)
+    else:
+        gdf = leer_overpass(fuente)
+    return guardar(gdf, ruta)
+
+
+def consultar(etiquetas = None, limites = None, ruta = RUTA_ALMACEN, columnas = None):
+    """Elementos del almacén que cumplen un filtro de etiquetas y caen en un rectángulo.
+
+    `etiquetas` es un diccionario como el `custom_filter` de `pyrosm`, por
+    ejemplo `{"landuse": ["retail", "commercial"]}` o `{"shop": True}` para
+    cualquier valor. Las claves de `CLAVES` se filtran al leer el archivo; las
+    demás se buscan en la columna `tags`. `limites` es
+    (lon_min, lat_min, lon_max, lat_max).
+    """
+    filtros = []
+    resto = {}
+    for clave, valores in (etiquetas or {}).items():
+        if clave not in CLAVES:
+            resto[clave] = valores
+        elif valores is True:
+            filtros.append((clave, "!=", ""))
+        else:
+            filtros.append((clave, "in", list(np.atleast_1d(valores))))
+    if columnas is not None:
+        columnas = list(dict.fromkeys(list(columnas) + (["tags"] if resto else [])))
+    gdf = gpd.read_parquet(ruta, columns = columnas, bbox = limites, filters = filtros or None)
+    for clave, valores in resto.items():
+        valor = gdf["tags"].map(lambda t: json.loads(t).get(clave))
+        gdf = gdf[valor.notna() if valores is True else valor.isin(list(np.atleast_1d(valores)))]
+    return gdf
+
+
+def proporcion_uso_suelo(areas, usos = ("retail", "commercial"), columna_area = "community",
+                         ruta = RUTA_ALMACEN, crs_metrico = None):
+    """Porcentaje del área de cada comunidad dedicado a cada uso del suelo.
+
+    Interseca los polígonos `landuse` del almacén con `areas` en una proyección
+    métrica (por defecto la UTM estimada para las áreas) y devuelve una tabla
+    con una columna `pct_<uso>` por uso y `pct_total`.
+    """
+    areas = areas.to_crs(4326)
+    usos_suelo = consultar({"landuse": list(usos)}, limites = tuple(areas.total_bounds), ruta = ruta,
+                           columnas = ["landuse", "geometry"])
+    usos_suelo = usos_suelo[usos_suelo.geom_type.isin(["Polygon", "MultiPolygon"])]
+    if crs_metrico is None:
+        crs_metrico = areas.estimate_utm_crs()
+    areas_m = areas[[columna_area, "geometry"]].to_crs(crs_metrico)
+    # Se disuelve por uso para no contar dos veces polígonos superpuestos
+    usos_m = usos_suelo.to_crs(crs_metrico).dissolve(by = "landuse").reset_index()
+    cruce = gpd.overlay(areas_m, usos_m, how = "intersection", keep_geom_type = True)
+    superficie = cruce.assign(m2 = cruce.area).groupby([columna_area, "landuse"])["m2"].sum().unstack(fill_value = 0)
+    superficie = superficie.reindex(index = areas_m[columna_area], columns = list(usos), fill_value = 0)
+    area_total = areas_m.set_index(columna_area).area
+    tabla = (100 * superficie.div(area_total, axis = 0)).add_prefix("pct_")
+    tabla["pct_total"] = tabla.sum(axis = 1)
+    return tabla
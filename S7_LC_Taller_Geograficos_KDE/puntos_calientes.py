@@ -0,0 +1,237 @@
+# coding: utf-8
+
+"""Puntos calientes espacio-temporales con ventanas móviles sobre las fechas de los delitos.
+
+En la sección 3.2 del taller la densidad de homicidios y robos se estima una
+sola vez con lat/lon de todo el verano y la columna `fecha` no se usa. Aquí:
+
+- cada delito se asigna a un periodo (día o semana, en la hora de Chicago) y
+  se agrupa linealmente (`binear` de `kde_rapido`) en una grilla lat/lon fija;
+- la capa suavizada de cada periodo se calcula con una sola convolución FFT
+  al agregar sus delitos y se guarda; como la convolución es lineal, la
+  intensidad de una ventana de varios periodos es la suma de sus capas;
+- al desplazar la ventana se suman las capas que entran y se restan las que
+  salen, sin volver a estimar nada;
+- un lote nuevo de delitos (p. ej. los del día) sólo toca las capas de sus
+  periodos: cuesta lo mismo con un verano de datos que con una semana.
+
+De cada ventana salen los k puntos calientes (máximos locales de la
+intensidad) y un cuadro de una animación de `matplotlib`.
+
+Uso típico::
+
+    calientes = PuntosCalientes(ancho = 0.01).fit_csv()
+    tabla = calientes.puntos_calientes(ancho_ventana = 7, k = 5)
+    calientes.animar(ancho_ventana = 7, ruta = "Files/figs/puntos_calientes.gif")
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.ndimage import maximum_filter
+from scipy.signal import fftconvolve
+
+from kde_rapido import TAU, _grillas, _kernel_grilla, ancho_normal_reference, binear
+from union_espacial import RUTA_DELITOS
+
+# Zona horaria en la que se cortan los días (las fechas del archivo están en UTC)
+ZONA = "America/Chicago"
+
+# Filas leídas en cada bloque del CSV
+TAMANO_BLOQUE = 250_000
+
+
+class PuntosCalientes:
+    """Intensidad de kernel por periodo sobre una grilla fija (eje 0 = lon, eje 1 = lat).
+
+    Parámetros
+    ----------
+    ancho : ancho de banda (lon, lat) en grados; por defecto la regla de
+        referencia normal del primer lote, que queda fija para los siguientes
+        (`fit` y `fit_csv` empiezan de cero y la vuelven a calcular).
+    n_grilla : nodos por eje de la grilla.
+    limites : [(lon_min, lon_max), (lat_min, lat_max)]; por defecto el rango
+        del primer lote más `tau` anchos. Los delitos fuera de la grilla no se
+        cuentan.
+    frecuencia : "D" (días) o "W" (semanas); las ventanas se miden en periodos.
+    zona : zona horaria de los periodos.
+
+    La intensidad está en delitos por grado² (integra al número de delitos de
+    la ventana, salvo los que caen cerca del borde de la grilla).
+    """
+
+    def __init__(self, ancho = None, n_grilla = 128, limites = None, frecuencia = "D", zona = ZONA, tau = TAU):
+        self.ancho_inicial = ancho
+        self.n_grilla = n_grilla
+        self.limites = limites
+        self.frecuencia = frecuencia
+        self.zona = zona
+        self.tau = tau
+        self._reiniciar()
+
+    def _reiniciar(self):
+        # El ancho y la grilla se vuelven a fijar con el primer lote si no se indicaron
+        self.ancho = self.ancho_inicial
+        self.grillas = None
+        # Capa suavizada y número de delitos de cada periodo (ordinal de `pd.Period`)
+        self.capas = {}
+        self.eventos = {}
+
+    def _preparar(self, datos):
+        if self.ancho is None:
+            self.ancho = ancho_normal_reference(datos)
+            if not np.all(self.ancho > 0):
+                raise ValueError("el primer lote no alcanza para la regla de referencia normal; indique ancho")
+        self.ancho = np.broadcast_to(np.asarray(self.ancho, dtype = float), (2,)).copy()
+        self.grillas = _grillas(datos, self.tau * self.ancho, self.n_grilla, self.limites)
+        self._kernel = _kernel_grilla(self.ancho, self.grillas, self.tau)
+        self.forma = tuple(len(g) for g in self.grillas)
+
+    def _periodos(self, fechas):
+        fechas = pd.to_datetime(pd.Series(fechas), utc = True).dt.tz_convert(self.zona).dt.tz_localize(None)
+        return fechas.dt.to_period(self.frecuencia).array.asi8
+
+    def _periodo_local(self, fecha):
+        # Las fechas sin zona de `desde` y `hasta` ya están en la hora local
+        fecha = pd.Timestamp(fecha)
+        if fecha.tzinfo is not None:
+            fecha = fecha.tz_convert(self.zona).tz_localize(None)
+        return fecha.to_period(self.frecuencia).ordinal
+
+    def agregar(self, fechas, lat, lon):
+        """Incorpora un lote de delitos; sólo se recalculan las capas de sus periodos."""
+        datos = np.column_stack([np.asarray(lon, dtype = float), np.asarray(lat, dtype = float)])
+        periodos = self._periodos(fechas)
+        validos = np.isfinite(datos).all(axis = 1) & (periodos != pd.NaT.value)
+        datos, periodos = datos[validos], periodos[validos]
+        if len(datos) == 0:
+            return self
+        if self.grillas is None:
+            self._preparar(datos)
+        orden = np.argsort(periodos, kind = "stable")
+        datos, periodos = datos[orden], periodos[orden]
+        distintos, inicios = np.unique(periodos, return_index = True)
+        for periodo, parte in zip(distintos, np.split(datos, inicios[1:])):
+            # La convolución es lineal: el lote se suaviza solo y se suma a la capa del periodo
+            capa = fftconvolve(binear(parte, self.grillas), self._kernel, mode = "same")
+            periodo = int(periodo)
+            if periodo in self.capas:
+                self.capas[periodo] += capa
+                self.eventos[periodo] += len(parte)
+            else:
+                self.capas[periodo], self.eventos[periodo] = capa, len(parte)
+        return self
+
+    def fit(self, delitos, col_fecha = "fecha", col_lat = "lat", col_lon = "lon"):
+        """Estima desde cero con un `DataFrame` de delitos (p. ej. sólo los robos).
+
+        Para sumar lotes a lo ya estimado use `agregar`.
+        """
+        self._reiniciar()
+        return self.agregar(delitos[col_fecha], delitos[col_lat], delitos[col_lon])
+
+    def fit_csv(self, ruta_csv = RUTA_DELITOS, tipos = None, tamano_bloque = TAMANO_BLOQUE,
+                col_fecha = "fecha", col_lat = "lat", col_lon = "lon", columna_tipo = "tipo_crimen"):
+        """Estima desde cero leyendo el CSV de delitos por bloques; `tipos` filtra por `tipo_crimen` (p. ej. ["robo"])."""
+        self._reiniciar()
+        columnas = [col_fecha, col_lat, col_lon] + ([columna_tipo] if tipos is not None else [])
+        for bloque in pd.read_csv(ruta_csv, usecols = columnas, chunksize = tamano_bloque):
+            if tipos is not None:
+                bloque = bloque[bloque[columna_tipo].isin(tipos)]
+            self.agregar(bloque[col_fecha], bloque[col_lat], bloque[col_lon])
+        return self
+
+    def _capa(self, periodo):
+        capa = self.capas.get(periodo)
+        return capa if capa is not None else np.zeros(self.forma)
+
+    def inicio_periodo(self, periodo):
+        """Fecha (hora local) en que empieza el periodo con ordinal `periodo`."""
+        return pd.Period(ordinal = periodo, freq = self.frecuencia).start_time
+
+    def ventanas(self, ancho_ventana = 7, paso = 1, desde = None, hasta = None):
+        """Genera `(inicio, fin, eventos, intensidad)` de cada ventana de `ancho_ventana` periodos.
+
+        Las ventanas avanzan de a `paso` periodos entre el primero y el último
+        con datos (o entre las fechas locales `desde` y `hasta`); `fin` es el inicio
+        del periodo siguiente a la ventana. La intensidad se actualiza sumando
+        las capas que entran y restando las que salen.
+        """
+        if not self.capas:
+            return
+        primero = min(self.capas) if desde is None else self._periodo_local(desde)
+        ultimo = max(self.capas) if hasta is None else self._periodo_local(hasta)
+        if ultimo < primero:
+            return
+        ancho_ventana = min(ancho_ventana, ultimo - primero + 1)
+        suma = sum((self._capa(p) for p in range(primero, primero + ancho_ventana)), np.zeros(self.forma))
+        eventos = sum(self.eventos.get(p, 0) for p in range(primero, primero + ancho_ventana))
+        inicio = primero
+        while True:
+            yield (self.inicio_periodo(inicio), self.inicio_periodo(inicio + ancho_ventana), eventos,
+                   np.maximum(suma, 0))
+            if inicio + paso + ancho_ventana - 1 > ultimo:
+                return
+            # Salen [inicio, inicio + paso) y entran [inicio + ancho, inicio + ancho + paso)
+            for p in range(inicio, min(inicio + paso, inicio + ancho_ventana)):
+                suma -= self._capa(p)
+                eventos -= self.eventos.get(p, 0)
+            for p in range(max(inicio + ancho_ventana, inicio + paso), inicio + paso + ancho_ventana):
+                suma += self._capa(p)
+                eventos += self.eventos.get(p, 0)
+            inicio += paso
+
+    def picos(self, intensidad, k = 10, vecindad = 3):
+        """Los `k` máximos locales más altos de una grilla: arreglo (k, 3) con lon, lat e intensidad."""
+        # Lo que queda de restar capas con FFT es ruido de redondeo, no un pico
+        piso = 1e-9 * intensidad.max()
+        es_pico = (intensidad == maximum_filter(intensidad, size = vecindad, mode = "constant")) & (intensidad > piso)
+        i, j = np.nonzero(es_pico)
+        mejores = np.argsort(intensidad[i, j])[::-1][:k]
+        i, j = i[mejores], j[mejores]
+        return np.column_stack([self.grillas[0][i], self.grillas[1][j], intensidad[i, j]])
+
+    def puntos_calientes(self, ancho_ventana = 7, paso = 1, k = 10, vecindad = 3, **kwargs):
+        """Tabla con los `k` puntos calientes de cada ventana (`rango` 1 es el más intenso)."""
+        filas = []
+        for inicio, fin, eventos, intensidad in self.ventanas(ancho_ventana, paso, **kwargs):
+            for rango, (lon, lat, valor) in enumerate(self.picos(intensidad, k, vecindad), start = 1):
+                filas.append((inicio, fin, eventos, rango, lon, lat, valor))
+        return pd.DataFrame(filas, columns = ["inicio", "fin", "eventos", "rango", "lon", "lat", "intensidad"])
+
+    def animar(self, ancho_ventana = 7, paso = 1, k = 5, ruta = None, fps = 4, cmap = "inferno", **kwargs):
+        """Animación con la intensidad de cada ventana y sus `k` puntos calientes.
+
+        Devuelve la `FuncAnimation` (en un cuaderno se muestra con
+        `HTML(animacion.to_jshtml())`); con `ruta` además la guarda (`.gif`
+        con Pillow, `.mp4` con ffmpeg).
+        """
+        import matplotlib.pyplot as plt
+        from matplotlib.animation import FuncAnimation
+
+        cuadros = [(inicio, fin, eventos, intensidad, self.picos(intensidad, k))
+                   for inicio, fin, eventos, intensidad in self.ventanas(ancho_ventana, paso, **kwargs)]
+        if not cuadros:
+            raise ValueError("no hay delitos agregados")
+        # Una misma escala de colores para todos los cuadros
+        maximo = max(c[3].max() for c in cuadros) or 1.0
+        extension = [self.grillas[0][0], self.grillas[0][-1], self.grillas[1][0], self.grillas[1][-1]]
+        figura, eje = plt.subplots(figsize = (6, 7))
+        imagen = eje.imshow(cuadros[0][3].T, origin = "lower", extent = extension, cmap = cmap,
+                            vmin = 0, vmax = maximo, aspect = "auto")
+        marcas = eje.scatter([], [], s = 80, facecolors = "none", edgecolors = "cyan")
+        eje.set_xlabel("lon")
+        eje.set_ylabel("lat")
+        figura.colorbar(imagen, ax = eje, label = "delitos por grado²")
+
+        def dibujar(n):
+            inicio, fin, eventos, intensidad, picos = cuadros[n]
+            imagen.set_data(intensidad.T)
+            marcas.set_offsets(picos[:, :2] if len(picos) else np.empty((0, 2)))
+            eje.set_title("%s a %s (%d delitos)" % (inicio.date(), (fin - pd.Timedelta(days = 1)).date(), eventos))
+            return imagen, marcas
+
+        animacion = FuncAnimation(figura, dibujar, frames = len(cuadros), interval = 1000 / fps, blit = False)
+        plt.close(figura)
+        if ruta is not None:
+            animacion.save(ruta, fps = fps)
+        return animacion
@@ -0,0 +1,205 @@
+# coding: utf-8
+
+"""Servicio de consulta para el modelo `Files/mejor_modelo_kde.joblib`.
+
+El archivo guarda un `KernelDensity` de `scikit-learn` ya ajustado, junto con
+el `KDTree` de sus puntos de entrenamiento. `ServicioKDE` lo carga una sola
+vez con `mmap_mode="r"`, de modo que los puntos de entrenamiento quedan
+mapeados en memoria en lugar de copiarse, y responde dos tipos de consulta:
+
+- la densidad en un lote de coordenadas (`densidad`), evaluada a través del
+  árbol con las tolerancias `atol`/`rtol` de `KernelDensity`;
+- las `k` celdas más calientes dentro de un rectángulo (`top_celdas`).
+
+Para la segunda el plano se divide en *tiles* fijos; la densidad de cada
+tile se calcula una vez y se guarda en un caché LRU, así que al desplazar o
+acercar un mapa sólo se evalúan los tiles nuevos.
+
+Las coordenadas deben venir en el mismo orden de columnas con el que se
+ajustó el modelo. Se puede usar desde `Python`, desde la línea de comandos
+o como servidor HTTP local::
+
+    python servicio_kde.py densidad puntos.csv
+    python servicio_kde.py top -87.7 41.8 -87.6 41.9 -k 10
+    python servicio_kde.py servir --puerto 8000
+"""
+
+import argparse
+import json
+import math
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import joblib
+import numpy as np
+import pandas as pd
+
+RUTA_MODELO = Path(__file__).resolve().parent / "Files" / "mejor_modelo_kde.joblib"
+
+
+class ServicioKDE:
+    """Evaluación por lotes y por tiles de un `KernelDensity` persistido.
+
+    Parámetros
+    ----------
+    ruta : archivo `.joblib` con el modelo ajustado.
+    atol, rtol : tolerancias absoluta y relativa del recorrido del árbol; valores
+        mayores que cero dan una aproximación más rápida de la densidad.
+    columnas : nombres de las dos coordenadas, en el orden de entrenamiento.
+    tamano_tile : lado de cada tile en las unidades de las coordenadas.
+    resolucion : número de celdas por lado dentro de cada tile.
+    max_tiles : tamaño del caché LRU de tiles.
+    tamano_lote : número máximo de puntos evaluados a la vez.
+    """
+
+    def __init__(self, ruta = RUTA_MODELO, atol = 0.0, rtol = 1e-4, columnas = ("lon", "lat"),
+                 tamano_tile = 0.02, resolucion = 32, max_tiles = 512, tamano_lote = 50_000):
+        self.modelo = joblib.load(ruta, mmap_mode = "r")
+        self.modelo.set_params(atol = atol, rtol = rtol)
+        self.columnas = tuple(columnas)
+        self.tamano_tile = float(tamano_tile)
+        self.resolucion = int(resolucion)
+        self.tamano_lote = int(tamano_lote)
+        self._tile = lru_cache(maxsize = max_tiles)(self._evaluar_tile)
+
+    def densidad(self, puntos):
+        """Densidad del modelo en un arreglo (n, 2) de coordenadas."""
+        puntos = np.atleast_2d(np.asarray(puntos, dtype = float))
+        salida = np.empty(len(puntos))
+        for inicio in range(0, len(puntos), self.tamano_lote):
+            lote = puntos[inicio:inicio + self.tamano_lote]
+            salida[inicio:inicio + self.tamano_lote] = np.exp(self.modelo.score_samples(lote))
+        return salida
+
+    def _centros_tile(self, i, j):
+        paso = self.tamano_tile / self.resolucion
+        eje_0 = (i * self.resolucion + np.arange(self.resolucion) + 0.5) * paso
+        eje_1 = (j * self.resolucion + np.arange(self.resolucion) + 0.5) * paso
+        return np.meshgrid(eje_0, eje_1, indexing = "ij")
+
+    def _evaluar_tile(self, i, j):
+        c0, c1 = self._centros_tile(i, j)
+        densidad = self.densidad(np.column_stack([c0.ravel(), c1.ravel()]))
+        densidad.flags.writeable = False
+        return densidad
+
+    def tiles(self, limites):
+        """Índices (i, j) de los tiles que cubren `limites = (min_0, min_1, max_0, max_1)`."""
+        min_0, min_1, max_0, max_1 = limites
+        if min_0 > max_0 or min_1 > max_1:
+            raise ValueError("Los límites deben ser (min_0, min_1, max_0, max_1)")
+        rango_i = range(math.floor(min_0 / self.tamano_tile), math.floor(max_0 / self.tamano_tile) + 1)
+        rango_j = range(math.floor(min_1 / self.tamano_tile), math.floor(max_1 / self.tamano_tile) + 1)
+        return [(i, j) for i in rango_i for j in rango_j]
+
+    def top_celdas(self, limites, k = 10):
+        """Las `k` celdas de mayor densidad cuyo centro cae dentro de `limites`.
+
+        Devuelve un `DataFrame` con las coordenadas del centro de cada celda y su
+        densidad, ordenado de mayor a menor.
+        """
+        min_0, min_1, max_0, max_1 = limites
+        coords_0, coords_1, densidades = [], [], []
+        for i, j in self.tiles(limites):
+            c0, c1 = self._centros_tile(i, j)
+            c0, c1 = c0.ravel(), c1.ravel()
+            dentro = (c0 >= min_0) & (c0 <= max_0) & (c1 >= min_1) & (c1 <= max_1)
+            coords_0.append(c0[dentro])
+            coords_1.append(c1[dentro])
+            densidades.append(self._tile(i, j)[dentro])
+        c0, c1, dens = (np.concatenate(x) for x in (coords_0, coords_1, densidades))
+        k = min(k, len(dens))
+        mejores = np.argpartition(-dens, k - 1)[:k] if k > 0 else np.array([], dtype = int)
+        mejores = mejores[np.argsort(-dens[mejores])]
+        return pd.DataFrame({self.columnas[0]: c0[mejores], self.columnas[1]: c1[mejores],
+                             "densidad": dens[mejores]})
+
+    def info_cache(self):
+        """Aciertos, fallos y ocupación del caché de tiles."""
+        return self._tile.cache_info()
+
+
+def _crear_manejador(servicio):
+    class Manejador(BaseHTTPRequestHandler):
+        def _responder(self, codigo, cuerpo):
+            datos = json.dumps(cuerpo).encode("utf-8")
+            self.send_response(codigo)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(datos)))
+            self.end_headers()
+            self.wfile.write(datos)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/top":
+                return self._responder(404, {"error": "ruta desconocida"})
+            try:
+                parametros = parse_qs(url.query)
+                limites = [float(v) for v in parametros["limites"][0].split(",")]
+                k = int(parametros.get("k", ["10"])[0])
+                tabla = servicio.top_celdas(limites, k = k)
+            except (KeyError, ValueError) as error:
+                return self._responder(400, {"error": str(error)})
+            self._responder(200, tabla.to_dict(orient = "records"))
+
+        def do_POST(self):
+            if urlparse(self.path).path != "/densidad":
+                return self._responder(404, {"error": "ruta desconocida"})
+            try:
+                largo = int(self.headers.get("Content-Length", 0))
+                puntos = json.loads(self.rfile.read(largo))["puntos"]
+                densidad = servicio.densidad(puntos)
+            except (KeyError, ValueError) as error:
+                return self._responder(400, {"error": str(error)})
+            self._responder(200, {"densidad": densidad.tolist()})
+
+    return Manejador
+
+
+def servir(servicio, puerto = 8000, host = "127.0.0.1"):
+    """Servidor HTTP local: `POST /densidad` con {"puntos": [[x0, x1], ...]} y
+    `GET /top?limites=min_0,min_1,max_0,max_1&k=10`."""
+    servidor = ThreadingHTTPServer((host, puerto), _crear_manejador(servicio))
+    print(f"Sirviendo el modelo en http://{host}:{puerto}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument("--modelo", default = RUTA_MODELO)
+    parser.add_argument("--atol", type = float, default = 0.0)
+    parser.add_argument("--rtol", type = float, default = 1e-4)
+    sub = parser.add_subparsers(dest = "comando", required = True)
+
+    p_densidad = sub.add_parser("densidad", help = "densidad en las coordenadas de un CSV")
+    p_densidad.add_argument("csv", help = "archivo con las dos columnas de coordenadas")
+
+    p_top = sub.add_parser("top", help = "celdas más calientes dentro de un rectángulo")
+    p_top.add_argument("limites", nargs = 4, type = float, metavar = ("MIN_0", "MIN_1", "MAX_0", "MAX_1"))
+    p_top.add_argument("-k", type = int, default = 10)
+
+    p_servir = sub.add_parser("servir", help = "servidor HTTP local")
+    p_servir.add_argument("--puerto", type = int, default = 8000)
+    p_servir.add_argument("--host", default = "127.0.0.1")
+
+    args = parser.parse_args(argv)
+    servicio = ServicioKDE(args.modelo, atol = args.atol, rtol = args.rtol)
+    if args.comando == "densidad":
+        puntos = pd.read_csv(args.csv)
+        puntos["densidad"] = servicio.densidad(puntos.iloc[:, :2].to_numpy())
+        print(puntos.to_csv(index = False), end = "")
+    elif args.comando == "top":
+        print(servicio.top_celdas(args.limites, k = args.k).to_string(index = False))
+    else:
+        servir(servicio, puerto = args.puerto, host = args.host)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+# coding: utf-8
+
+"""Exportación de curvas de nivel de una densidad a tiles GeoJSON por nivel de zoom.
+
+`interactive_contour_plots.html` incrusta cada vértice de cada curva de nivel
+como JSON dentro del HTML, por lo que el archivo crece con el número de
+tipos de crimen y con la resolución de la grilla. Aquí las curvas de nivel
+rellenas de una grilla de densidad (por ejemplo `KDERapido.malla()`) se
+convierten una vez en polígonos, se simplifican y cuantizan según el tamaño
+de un pixel en cada zoom, y se cortan en tiles `{z}/{x}/{y}.geojson` del
+esquema de teselas de OpenStreetMap. La capa de `folium` que devuelve
+`capa_folium` sólo descarga los tiles visibles para el zoom actual.
+
+Uso típico::
+
+    kde = KDERapido(delitos[["lon", "lat"]])
+    indice = exportar_tiles(*kde.malla(), carpeta = "Files/tiles/robos")
+    mapa = folium.Map(location = [41.88, -87.63], zoom_start = 11)
+    capa_folium(indice, url_base = "Files/tiles/robos").add_to(mapa)
+
+Los navegadores no permiten descargar archivos locales desde un HTML abierto
+con `file://`; para verlo sirva la carpeta, por ejemplo con
+`python -m http.server`.
+"""
+
+import json
+import math
+from pathlib import Path
+
+import numpy as np
+import shapely
+from branca.element import MacroElement
+from contourpy import FillType, contour_generator
+from jinja2 import Template
+from matplotlib import colormaps
+from matplotlib.colors import to_hex
+
+PIXELES_POR_TILE = 256
+
+
+def _a_tile(lon, lat, z):
+    n = 2 ** z
+    x = int(math.floor((lon + 180) / 360 * n))
+    lat = math.radians(max(min(lat, 85.0511), -85.0511))
+    y = int(math.floor((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n))
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def limites_tile(x, y, z):
+    """(lon_min, lat_min, lon_max, lat_max) del tile (x, y) en el zoom z."""
+    n = 2 ** z
+    lon_min = x / n * 360 - 180
+    lon_max = (x + 1) / n * 360 - 180
+    lat_max = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    lat_min = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * (y + 1) / n))))
+    return lon_min, lat_min, lon_max, lat_max
+
+
+def poligonos_nivel(x, y, densidad, niveles = 10):
+    """Polígonos rellenos entre niveles consecutivos de la densidad.
+
+    `x`, `y` son los nodos de la grilla (1-D o mallas como las de `np.meshgrid`)
+    y `densidad` tiene forma (len(y), len(x)). `niveles` es el número de niveles
+    o la lista de cortes. Devuelve los cortes y un `MultiPolygon` por banda.
+    """
+    densidad = np.asarray(densidad, dtype = float)
+    if np.isscalar(niveles):
+        # El primer corte se ubica por encima de cero para no rellenar todo el fondo
+        cortes = np.linspace(0, densidad.max(), int(niveles) + 1)
+        cortes[0] = cortes[1] * 1e-3
+    else:
+        cortes = np.asarray(niveles, dtype = float)
+    generador = contour_generator(x, y, densidad, fill_type = FillType.OuterOffset)
+    bandas = []
+    for inferior, superior in zip(cortes[:-1], cortes[1:]):
+        puntos, desfases = generador.filled(inferior, superior)
+        poligonos = []
+        for pts, ofs in zip(puntos, desfases):
+            anillos = [pts[a:b] for a, b in zip(ofs[:-1], ofs[1:])]
+            poligonos.append(shapely.Polygon(anillos[0], anillos[1:]))
+        bandas.append(shapely.make_valid(shapely.MultiPolygon(poligonos)))
+    return cortes, bandas
+
+
+def _tolerancia(z, lat):
+    # Tamaño de un pixel en grados de longitud, corregido por la latitud
+    return 360 / (PIXELES_POR_TILE * 2 ** z) * math.cos(math.radians(lat))
+
+
+def exportar_tiles(x, y, densidad, carpeta, niveles = 10, zooms = range(9, 16),
+                   pixeles_simplificacion = 1.0, cmap = "YlOrRd"):
+    """Escribe los tiles GeoJSON de las curvas de nivel y un `indice.json`.
+
+    En cada zoom los polígonos se simplifican con una tolerancia de
+    `pixeles_simplificacion` pixeles, se cuantizan a un cuarto de esa
+    tolerancia y se descartan las partes menores a un pixel. Devuelve el
+    índice (zooms exportados, colores, cortes, rango de tiles por zoom y
+    límites). Los tiles sin polígonos no se escriben. `zooms` no tiene que ser
+    contiguo: entre dos zooms exportados la capa usa el menor.
+    """
+    carpeta = Path(carpeta)
+    cortes, bandas = poligonos_nivel(x, y, densidad, niveles)
+    colores = [to_hex(colormaps[cmap](v)) for v in np.linspace(0.15, 1, len(bandas))]
+    todas = shapely.union_all([b for b in bandas if not b.is_empty])
+    lon_min, lat_min, lon_max, lat_max = todas.bounds
+    lat_media = (lat_min + lat_max) / 2
+
+    rangos, n_tiles = {}, 0
+    for z in zooms:
+        tolerancia = pixeles_simplificacion * _tolerancia(z, lat_media)
+        paso = tolerancia / 4
+        decimales = max(0, int(math.ceil(-math.log10(paso))))
+        simplificadas = []
+        for nivel, banda in enumerate(bandas):
+            banda = shapely.set_precision(shapely.simplify(banda, tolerancia), paso)
+            partes = [p for p in shapely.get_parts(banda) if p.area >= tolerancia ** 2]
+            if partes:
+                simplificadas.append((nivel, shapely.MultiPolygon(partes)))
+        x0, y0 = _a_tile(lon_min, lat_max, z)
+        x1, y1 = _a_tile(lon_max, lat_min, z)
+        rangos[z] = [x0, x1, y0, y1]
+        for tx in range(x0, x1 + 1):
+            for ty in range(y0, y1 + 1):
+                rect = limites_tile(tx, ty, z)
+                rasgos = []
+                for nivel, banda in simplificadas:
+                    recorte = shapely.set_precision(shapely.clip_by_rect(banda, *rect), paso)
+                    # El recorte puede dejar líneas o puntos sueltos en el borde del tile
+                    partes = [p for p in shapely.get_parts(recorte)
+                              if p.geom_type == "Polygon" and not p.is_empty]
+                    if not partes:
+                        continue
+                    geometria = json.loads(shapely.to_geojson(shapely.MultiPolygon(partes)))
+                    geometria["coordinates"] = _redondear(geometria["coordinates"], decimales)
+                    rasgos.append({"type": "Feature", "properties": {"nivel": nivel}, "geometry": geometria})
+                if not rasgos:
+                    continue
+                ruta = carpeta / str(z) / str(tx) / f"{ty}.geojson"
+                ruta.parent.mkdir(parents = True, exist_ok = True)
+                with open(ruta, "w") as archivo:
+                    json.dump({"type": "FeatureCollection", "features": rasgos}, archivo, separators = (",", ":"))
+                n_tiles += 1
+
+    zooms = sorted(rangos)
+    indice = {"zoom_min": zooms[0], "zoom_max": zooms[-1], "zooms": zooms, "colores": colores,
+              "cortes": cortes.tolist(), "rangos": rangos, "n_tiles": n_tiles,
+              "limites": [lon_min, lat_min, lon_max, lat_max]}
+    carpeta.mkdir(parents = True, exist_ok = True)
+    with open(carpeta / "indice.json", "w") as archivo:
+        json.dump(indice, archivo, separators = (",", ":"))
+    return indice
+
+
+def tamanos_tiles(carpeta, tiles_vista = 24):
+    """Tiles y bytes por zoom de una carpeta exportada con `exportar_tiles`.
+
+    Para cada zoom devuelve el número de tiles, el total de bytes (lo que
+    descarga una vista de toda la ciudad), el tile más pesado y `bytes_vista`:
+    la suma de los `tiles_vista` tiles más pesados, una cota de lo que
+    descarga una pantalla (24 tiles de 256 pixeles cubren 1280×768 con un
+    tile de margen por eje). Sirve para compararlo con el tamaño de un HTML
+    que incrusta todas las curvas de nivel.
+    """
+    pesos = {}
+    for ruta in Path(carpeta).glob("*/*/*.geojson"):
+        pesos.setdefault(int(ruta.parts[-3]), []).append(ruta.stat().st_size)
+    return {z: {"tiles": len(p), "bytes": sum(p), "bytes_max": max(p),
+                "bytes_vista": sum(sorted(p)[-tiles_vista:])}
+            for z, p in sorted(pesos.items())}
+
+
+def _redondear(coordenadas, decimales):
+    if coordenadas and isinstance(coordenadas[0], (int, float)):
+        return [round(c, decimales) for c in coordenadas]
+    return [_redondear(c, decimales) for c in coordenadas]
+
+
+class CapaContornosTiles(MacroElement):
+    """Capa de `folium` que carga bajo demanda los tiles de `exportar_tiles`."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        (function() {
+            var mapa = {{ this._parent.get_name() }};
+            var capa = L.layerGroup().addTo(mapa);
+            var rangos = {{ this.indice["rangos"]|tojson }};
+            var colores = {{ this.indice["colores"]|tojson }};
+            var zooms = {{ this.indice["zooms"]|tojson }};
+            var cargados = {};
+            function estilo(rasgo) {
+                return {fillColor: colores[rasgo.properties.nivel], fillOpacity: {{ this.opacidad }}, stroke: false};
+            }
+            function tileX(lon, n) { return Math.floor((lon + 180) / 360 * n); }
+            function tileY(lat, n) {
+                var r = lat * Math.PI / 180;
+                return Math.floor((1 - Math.log(Math.tan(r) + 1 / Math.cos(r)) / Math.PI) / 2 * n);
+            }
+            function nivel(zoomMapa) {
+                // Mayor zoom exportado que no supera al del mapa (o el menor exportado)
+                var z = zooms[0];
+                zooms.forEach(function(v) { if (v <= zoomMapa) { z = v; } });
+                return z;
+            }
+            function actualizar() {
+                var z = nivel(mapa.getZoom());
+                var n = Math.pow(2, z), b = mapa.getBounds();
+                Object.keys(cargados).forEach(function(clave) {
+                    if (cargados[clave].z !== z) {
+                        if (cargados[clave].capa) { capa.removeLayer(cargados[clave].capa); }
+                        delete cargados[clave];
+                    }
+                });
+                var r = rangos[z];
+                var x0 = Math.max(r[0], tileX(b.getWest(), n)), x1 = Math.min(r[1], tileX(b.getEast(), n));
+                var y0 = Math.max(r[2], tileY(b.getNorth(), n)), y1 = Math.min(r[3], tileY(b.getSouth(), n));
+                for (var x = x0; x <= x1; x++) {
+                    for (var y = y0; y <= y1; y++) {
+                        var clave = z + "/" + x + "/" + y;
+                        if (clave in cargados) { continue; }
+                        cargados[clave] = {z: z, capa: null};
+                        (function(clave) {
+                            fetch({{ this.url_base|tojson }} + "/" + clave + ".geojson")
+                                .then(function(r) { return r.ok ? r.json() : null; })
+                                .then(function(datos) {
+                                    // Los tiles vacíos no se exportan
+                                    if (!datos || !(clave in cargados)) { return; }
+                                    cargados[clave].capa = L.geoJSON(datos, {style: estilo}).addTo(capa);
+                                })
+                                .catch(function() {});
+                        })(clave);
+                    }
+                }
+            }
+            mapa.on("moveend", actualizar);
+            actualizar();
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, indice, url_base, opacidad = 0.5):
+        super().__init__()
+        self._name = "CapaContornosTiles"
+        self.indice = indice
+        if "zooms" not in indice:
+            # Los índices anteriores tienen los zooms exportados sólo en las claves de "rangos"
+            self.indice = dict(indice, zooms = sorted(int(z) for z in indice["rangos"]))
+        self.url_base = str(url_base).rstrip("/")
+        self.opacidad = opacidad
+
+
+def capa_folium(indice, url_base, opacidad = 0.5):
+    """Capa de `folium` a partir del índice (o de la carpeta) generado por `exportar_tiles`.
+
+    `url_base` es la ruta a la carpeta de tiles relativa al HTML del mapa.
+    """
+    if not isinstance(indice, dict):
+        with open(Path(indice) / "indice.json") as archivo:
+            indice = json.load(archivo)
+    return CapaContornosTiles(indice, url_base, opacidad)
@@ -0,0 +1,141 @@
+# coding: utf-8
+
+"""Unión espacial por bloques entre los delitos y las áreas comunitarias de Chicago.
+
+En lugar de cargar toda la base y hacer `gpd.sjoin(delitos, areas)` en una
+sola pasada, el archivo de delitos se lee por bloques con `pandas`, cada
+bloque se asigna a su área comunitaria con un `STRtree` de polígonos
+(construido una sola vez por proceso) y los bloques se reparten en un
+grupo de procesos. Sólo se guardan los conteos por área y tipo de crimen,
+por lo que la memoria no depende del número de filas del archivo.
+
+Uso típico (sección 2.1 del taller)::
+
+    from union_espacial import tabla_delitos
+    tabla = tabla_delitos()
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+CARPETA_DATOS = Path(__file__).resolve().parent / "Files" / "data"
+RUTA_DELITOS = CARPETA_DATOS / "Chicago_delitos_verano_2019.csv"
+RUTA_AREAS = CARPETA_DATOS / "Areas_comunitarias_Chicago"
+
+FILA_TOTAL = "Total ciudad"
+FILA_SIN_AREA = "Sin área"
+
+_ARBOL = None
+
+
+def leer_areas(ruta = RUTA_AREAS):
+    """Lee los polígonos de las áreas comunitarias en WGS84 (lon, lat)."""
+    areas = gpd.read_file(ruta)
+    if areas.crs is not None and not areas.crs.equals("EPSG:4326"):
+        areas = areas.to_crs(4326)
+    return areas
+
+
+def _iniciar_trabajador(poligonos_wkb):
+    # Cada proceso reconstruye el índice una única vez a partir de WKB
+    global _ARBOL
+    _ARBOL = shapely.STRtree(shapely.from_wkb(poligonos_wkb))
+
+
+def _contar_bloque(lon, lat, codigos, n_codigos):
+    """Conteos (n_areas + 1, n_codigos); la última fila son los puntos fuera de toda área."""
+    n_areas = len(_ARBOL.geometries)
+    puntos = shapely.points(lon, lat)
+    idx_punto, idx_area = _ARBOL.query(puntos, predicate = "intersects")
+    # Un punto en el borde de dos áreas se asigna a la primera
+    idx_punto, primero = np.unique(idx_punto, return_index = True)
+    area = np.full(len(puntos), n_areas, dtype = np.int64)
+    area[idx_punto] = idx_area[primero]
+    conteos = np.bincount(area * n_codigos + codigos, minlength = (n_areas + 1) * n_codigos)
+    return conteos.reshape(n_areas + 1, n_codigos)
+
+
+def _bloques(ruta_csv, tamano_bloque, columna_tipo, col_lat, col_lon, mapa_tipos):
+    lector = pd.read_csv(ruta_csv, usecols = [columna_tipo, col_lat, col_lon],
+                         dtype = {col_lat: "float64", col_lon: "float64"},
+                         chunksize = tamano_bloque)
+    for bloque in lector:
+        bloque = bloque.dropna(subset = [col_lat, col_lon])
+        for tipo in sorted(set(bloque[columna_tipo].dropna().unique()) - mapa_tipos.keys()):
+            mapa_tipos[tipo] = len(mapa_tipos)
+        bloque = bloque.dropna(subset = [columna_tipo])
+        codigos = bloque[columna_tipo].map(mapa_tipos).to_numpy(np.int64)
+        yield (bloque[col_lon].to_numpy(), bloque[col_lat].to_numpy(), codigos, len(mapa_tipos))
+
+
+def _resultados(bloques, poligonos_wkb, n_procesos):
+    if n_procesos == 1:
+        _iniciar_trabajador(poligonos_wkb)
+        for args in bloques:
+            yield _contar_bloque(*args)
+        return
+    # Se limita el número de bloques en vuelo para que la memoria no crezca con el archivo
+    with ProcessPoolExecutor(max_workers = n_procesos, initializer = _iniciar_trabajador,
+                             initargs = (poligonos_wkb,)) as ejecutor:
+        en_vuelo = deque()
+        for args in bloques:
+            en_vuelo.append(ejecutor.submit(_contar_bloque, *args))
+            if len(en_vuelo) >= 2 * n_procesos:
+                yield en_vuelo.popleft().result()
+        while en_vuelo:
+            yield en_vuelo.popleft().result()
+
+
+def _armar_tabla(conteos, nombres_areas, mapa_tipos):
+    tipos = sorted(mapa_tipos, key = mapa_tipos.get)
+    tabla = pd.DataFrame(conteos, index = list(nombres_areas) + [FILA_SIN_AREA], columns = tipos)
+    if tabla.loc[FILA_SIN_AREA].sum() == 0:
+        tabla = tabla.drop(index = FILA_SIN_AREA)
+    tabla.insert(0, "total", tabla.sum(axis = 1))
+    tabla.loc[FILA_TOTAL] = tabla.sum(axis = 0)
+    totales = tabla.loc[FILA_TOTAL].replace(0, np.nan)
+    porcentajes = (100 * tabla / totales).add_prefix("pct_")
+    return pd.concat([tabla, porcentajes], axis = 1)
+
+
+def conteos_incrementales(ruta_csv = RUTA_DELITOS, areas = None, columna_area = "community",
+                          columna_tipo = "tipo_crimen", col_lat = "lat", col_lon = "lon",
+                          tamano_bloque = 250_000, n_procesos = None):
+    """Genera la tabla acumulada de delitos por área después de procesar cada bloque.
+
+    Cada tabla tiene una fila por área comunitaria (más "Sin área" si hay
+    delitos fuera de los polígonos) y la fila final "Total ciudad". Las
+    columnas son el total de delitos, un conteo por cada tipo de crimen y los
+    mismos conteos como porcentaje del total de la ciudad (`pct_*`).
+    """
+    if areas is None:
+        areas = leer_areas()
+    if n_procesos is None:
+        n_procesos = os.cpu_count() or 1
+    poligonos_wkb = shapely.to_wkb(np.asarray(areas.geometry.array, dtype = object))
+    nombres_areas = areas[columna_area].to_numpy()
+
+    mapa_tipos = {}
+    acumulado = np.zeros((len(areas) + 1, 0), dtype = np.int64)
+    bloques = _bloques(ruta_csv, tamano_bloque, columna_tipo, col_lat, col_lon, mapa_tipos)
+    for conteos in _resultados(bloques, poligonos_wkb, n_procesos):
+        # Pueden aparecer tipos de crimen nuevos en bloques posteriores
+        ancho = len(mapa_tipos)
+        acumulado = np.pad(acumulado, ((0, 0), (0, ancho - acumulado.shape[1])))
+        acumulado[:, :conteos.shape[1]] += conteos
+        yield _armar_tabla(acumulado, nombres_areas, mapa_tipos)
+
+
+def tabla_delitos(ruta_csv = RUTA_DELITOS, areas = None, **kwargs):
+    """Tabla final de delitos por área comunitaria, con la fila de total de la ciudad."""
+    tabla = None
+    for tabla in conteos_incrementales(ruta_csv, areas, **kwargs):
+        pass
+    return tabla
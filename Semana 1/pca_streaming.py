@@ -0,0 +1,162 @@
+# coding: utf-8
+
+"""PCA en una pasada sobre un CSV leído por partes.
+
+En `S1_LC_Taller_PCA_v2` se estandariza todo `lugares.csv` en pandas
+(`Z = (X - mu) / sigma`), se forma `Z.cov()`, se usa `np.linalg.eig` (para
+matrices generales) y se ordenan a mano los valores propios; después se
+vuelve a ajustar con el paquete `pca`. `PCAStreaming`:
+
+- recorre el CSV por partes (`chunksize`) y acumula la media y la matriz de
+  comomentos con la actualización por lotes de Welford (Chan et al., 1979),
+  sin guardar la tabla;
+- la matriz de correlaciones (la covarianza de Z) sale de esos acumulados y
+  se descompone con `np.linalg.eigh` o, con muchos indicadores y pocas
+  componentes, con SVD aleatorizada;
+- del mismo ajuste salen el criterio de Kaiser, la varianza explicada, las
+  cargas y, con una segunda pasada por partes, las ciudades con mayor puntaje
+  en cada componente.
+
+Los valores propios coinciden con los de `np.linalg.eig(Z.cov())` del
+cuaderno.
+"""
+
+import heapq
+
+import numpy as np
+import pandas as pd
+from sklearn.utils.extmath import randomized_svd
+
+# Filas leídas en cada parte del CSV
+TAMANO_PARTE = 100_000
+
+
+class PCAStreaming:
+    """Componentes principales a partir de la media y la covarianza acumuladas por partes.
+
+    Parámetros
+    ----------
+    n_componentes : componentes que se guardan (por defecto todas con
+        `metodo="eigh"`).
+    estandarizar : usar la matriz de correlaciones (datos estandarizados con
+        la desviación estándar muestral, como `(X - mu) / sigma`).
+    metodo : "eigh" o "aleatorizado" (requiere `n_componentes`).
+    indice : columna que identifica las filas (p. ej. "Ciudad").
+    """
+
+    def __init__(self, n_componentes = None, estandarizar = True, metodo = "eigh", indice = "Ciudad",
+                 semilla = 123):
+        self.n_componentes = n_componentes
+        self.estandarizar = estandarizar
+        self.metodo = metodo
+        self.indice = indice
+        self.semilla = semilla
+        self._reiniciar()
+
+    def _reiniciar(self):
+        self.n = 0
+        self.columnas = None
+        self.media = self.comomentos = None
+
+    def _matriz(self, parte):
+        if self.indice is not None and self.indice in parte.columns:
+            parte = parte.set_index(self.indice)
+        if self.columnas is None:
+            self.columnas = parte.select_dtypes("number").columns
+        return parte.index, parte[self.columnas].to_numpy(dtype = np.float64)
+
+    def actualizar(self, parte):
+        """Incorpora una parte de la tabla a la media y la matriz de comomentos (sin reiniciar)."""
+        _, X = self._matriz(parte)
+        m = len(X)
+        if m == 0:
+            return self
+        media_parte = X.mean(axis = 0)
+        centrada = X - media_parte
+        comomentos_parte = centrada.T @ centrada
+        if self.n == 0:
+            self.media, self.comomentos = media_parte, comomentos_parte
+        else:
+            # Combinación de Chan de dos grupos (n, media, comomentos)
+            delta = media_parte - self.media
+            total = self.n + m
+            self.media = self.media + delta * m / total
+            self.comomentos = self.comomentos + comomentos_parte + np.outer(delta, delta) * self.n * m / total
+        self.n += m
+        return self
+
+    def fit(self, X):
+        """Ajusta con una tabla en memoria (`DataFrame`), descartando lo acumulado antes."""
+        self._reiniciar()
+        return self.actualizar(X).descomponer()
+
+    def fit_csv(self, ruta, chunksize = TAMANO_PARTE, **kwargs):
+        """Ajusta recorriendo el CSV una vez por partes de `chunksize` filas, desde cero."""
+        self._reiniciar()
+        for parte in pd.read_csv(ruta, chunksize = chunksize, **kwargs):
+            self.actualizar(parte)
+        return self.descomponer()
+
+    def descomponer(self):
+        """Valores y vectores propios de la covarianza (o correlación) acumulada."""
+        covarianza = self.comomentos / (self.n - 1)
+        self.media_ = pd.Series(self.media, index = self.columnas)
+        self.desviacion_ = pd.Series(np.sqrt(np.diag(covarianza)), index = self.columnas)
+        if self.estandarizar:
+            covarianza = covarianza / np.outer(self.desviacion_, self.desviacion_)
+        p = covarianza.shape[0]
+        if self.metodo == "eigh":
+            valores, vectores = np.linalg.eigh(covarianza)
+            valores, vectores = valores[::-1], vectores[:, ::-1]
+        elif self.metodo == "aleatorizado":
+            if self.n_componentes is None:
+                raise ValueError("metodo='aleatorizado' requiere n_componentes")
+            # La covarianza es simétrica semidefinida: sus valores singulares son sus valores propios
+            vectores, valores, _ = randomized_svd(covarianza, self.n_componentes, random_state = self.semilla)
+        else:
+            raise ValueError("metodo debe ser 'eigh' o 'aleatorizado'")
+        k = min(self.n_componentes or p, len(valores))
+        valores, vectores = valores[:k], vectores[:, :k]
+        # Signo fijo: la carga de mayor valor absoluto de cada componente es positiva
+        signos = np.sign(vectores[np.abs(vectores).argmax(axis = 0), np.arange(k)])
+        vectores = vectores * signos
+        nombres = [f"PC{i + 1}" for i in range(k)]
+        traza = np.trace(covarianza)
+        self.valores_propios_ = pd.Series(valores, index = nombres)
+        self.cargas_ = pd.DataFrame(vectores, index = self.columnas, columns = nombres)
+        self.varianza_explicada_ = self.valores_propios_ / traza
+        self.varianza_explicada_acumulada_ = self.varianza_explicada_.cumsum()
+        # Kaiser: valores propios mayores que el promedio (1 con la matriz de correlaciones)
+        self.kaiser_ = int((valores > traza / p).sum())
+        return self
+
+    def transform(self, X):
+        """Puntajes de cada fila de `X` en las componentes (`np.dot(Z, eig_vec)`)."""
+        indice, datos = self._matriz(X)
+        datos = datos - self.media_.to_numpy()
+        if self.estandarizar:
+            datos = datos / self.desviacion_.to_numpy()
+        return pd.DataFrame(datos @ self.cargas_.to_numpy(), index = indice, columns = self.cargas_.columns)
+
+    def transform_csv(self, ruta, chunksize = TAMANO_PARTE, **kwargs):
+        """Puntajes del CSV parte por parte."""
+        for parte in pd.read_csv(ruta, chunksize = chunksize, **kwargs):
+            yield self.transform(parte)
+
+    def mayores(self, datos, n = 5, componentes = ("PC1", "PC2"), chunksize = TAMANO_PARTE, **kwargs):
+        """Las `n` filas con mayor puntaje en cada componente (p. ej. las ciudades de `top_cities`).
+
+        `datos` es un `DataFrame` o la ruta al CSV, que se recorre por partes
+        guardando sólo las `n` mejores de cada componente.
+        """
+        partes = [self.transform(datos)] if isinstance(datos, pd.DataFrame) \
+            else self.transform_csv(datos, chunksize, **kwargs)
+        mejores = {c: [] for c in componentes}
+        for puntajes in partes:
+            for c in componentes:
+                candidatos = puntajes.nlargest(n, c)
+                mejores[c] = heapq.nlargest(n, mejores[c] + list(zip(candidatos[c], candidatos.index)),
+                                            key = lambda par: par[0])
+        return {c: pd.Series([v for v, _ in pares], index = pd.Index([i for _, i in pares], name = self.indice),
+                             name = c)
+                for c, pares in mejores.items()}
@@ -0,0 +1,203 @@
+# coding: utf-8
+
+"""Compresión de imágenes con SVD por bloques.
+
+En `S2_LSC1_SVD fundamentos`, `svd_truncada(l, X)` calcula la SVD completa
+de la imagen entera en cada llamada (costo cúbico en el tamaño de la imagen)
+y reconstruye una imagen por cada número de valores singulares. Aquí:
+
+- cada canal se divide en bloques de `tamano_bloque` × `tamano_bloque`
+  píxeles y la SVD de cada bloque se calcula en un grupo de procesos
+  (completa o aleatorizada con `rango_max`);
+- el rango de cada bloque es el menor que alcanza la meta de energía
+  (Σ s_i² retenida / Σ s_i²) o de PSNR; los bloques planos usan pocos
+  valores singulares y los bloques con detalle, más;
+- los factores U y Vt se guardan en `float16` y los valores singulares en
+  `float32`, en un solo archivo `.npz`;
+- `ImagenComprimida.reconstruir` decodifica con cualquier rango o energía
+  menor a partir de los mismos factores, sin volver a comprimir.
+
+Como los bloques cumplen la meta de PSNR por separado, la imagen completa
+también la cumple (salvo el redondeo de `float16`).
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.utils.extmath import randomized_svd
+
+TAMANO_BLOQUE = 64
+
+# Meta de energía cuando no se da ninguna meta
+ENERGIA = 0.99
+
+# Bloques por tarea del grupo de procesos
+BLOQUES_POR_TAREA = 64
+
+
+def psnr(original, reconstruida, maximo = 255.0):
+    """Relación señal a ruido de pico, en decibeles."""
+    mse = np.mean((np.asarray(original, dtype = np.float64) - np.asarray(reconstruida, dtype = np.float64)) ** 2)
+    return np.inf if mse == 0 else 10 * np.log10(maximo ** 2 / mse)
+
+
+def _rango(sigma, norma2, energia, psnr_meta, maximo, pixeles, rango_max):
+    # Menor rango cuya cola Σ_{i>r} s_i² cumple la meta (la norma² del bloque es exacta)
+    if energia is None and psnr_meta is None:
+        return int(min(len(sigma), rango_max or len(sigma)))
+    cola = norma2 - np.concatenate([[0.0], np.cumsum(sigma.astype(np.float64) ** 2)])
+    permitida = np.inf
+    if energia is not None:
+        permitida = (1 - energia) * norma2
+    if psnr_meta is not None:
+        permitida = min(permitida, pixeles * maximo ** 2 * 10 ** (-psnr_meta / 10))
+    cumple = np.flatnonzero(cola <= permitida + 1e-9 * norma2)
+    r = cumple[0] if len(cumple) else len(sigma)
+    return int(min(r, rango_max or r))
+
+
+def _comprimir_bloques(bloques, energia, psnr_meta, maximo, rango_max, semilla):
+    resultado = []
+    for bloque in bloques:
+        bloque = bloque.astype(np.float64)
+        norma2 = float(np.sum(bloque ** 2))
+        if rango_max is not None and rango_max < min(bloque.shape) // 2:
+            U, sigma, Vt = randomized_svd(bloque, rango_max, random_state = semilla)
+        else:
+            U, sigma, Vt = np.linalg.svd(bloque, full_matrices = False)
+        r = _rango(sigma, norma2, energia, psnr_meta, maximo, bloque.size, rango_max)
+        resultado.append((U[:, :r].astype(np.float16), sigma[:r].astype(np.float32),
+                          Vt[:r].astype(np.float16), norma2))
+    return resultado
+
+
+class ImagenComprimida:
+    """Factores SVD de cada bloque de una imagen (alto × ancho o alto × ancho × canales)."""
+
+    def __init__(self, forma, dtype, tamano_bloque, maximo, rangos, normas2, U, sigma, Vt):
+        self.forma = tuple(forma)
+        self.dtype = np.dtype(dtype)
+        self.tamano_bloque = tamano_bloque
+        self.maximo = maximo
+        self.rangos = np.asarray(rangos, dtype = np.int32)
+        self.normas2 = np.asarray(normas2, dtype = np.float64)
+        # Factores de todos los bloques concatenados, en el orden de `_posiciones`
+        self.U, self.sigma, self.Vt = U, sigma, Vt
+
+    def _posiciones(self):
+        # (canal, fila, columna, alto, ancho) de cada bloque
+        alto, ancho = self.forma[:2]
+        canales = self.forma[2] if len(self.forma) == 3 else 1
+        t = self.tamano_bloque
+        return [(c, i, j, min(t, alto - i), min(t, ancho - j))
+                for c in range(canales) for i in range(0, alto, t) for j in range(0, ancho, t)]
+
+    @property
+    def bytes(self):
+        """Bytes de los factores guardados."""
+        return self.U.nbytes + self.sigma.nbytes + self.Vt.nbytes
+
+    def tasa_compresion(self):
+        """Bytes de la imagen original (en su `dtype`) sobre bytes de los factores."""
+        return np.prod(self.forma) * self.dtype.itemsize / self.bytes
+
+    def reconstruir(self, rango = None, energia = None):
+        """Imagen decodificada con a lo sumo `rango` valores singulares por bloque, o con los
+        necesarios para retener `energia` en cada bloque; por defecto, todos los guardados."""
+        salida = np.zeros(self.forma, dtype = np.float32)
+        vista = salida if salida.ndim == 3 else salida[..., None]
+        inicio_u = inicio_s = inicio_v = 0
+        for (c, i, j, alto, ancho), r, norma2 in zip(self._posiciones(), self.rangos, self.normas2):
+            U = self.U[inicio_u:inicio_u + alto * r].reshape(alto, r)
+            sigma = self.sigma[inicio_s:inicio_s + r]
+            Vt = self.Vt[inicio_v:inicio_v + r * ancho].reshape(r, ancho)
+            inicio_u, inicio_s, inicio_v = inicio_u + alto * r, inicio_s + r, inicio_v + r * ancho
+            usar = r
+            if rango is not None:
+                usar = min(usar, rango)
+            if energia is not None:
+                usar = min(usar, _rango(sigma, norma2, energia, None, self.maximo, alto * ancho, None))
+            vista[i:i + alto, j:j + ancho, c] = (U[:, :usar].astype(np.float32) * sigma[:usar]) \
+                @ Vt[:usar].astype(np.float32)
+        if np.issubdtype(self.dtype, np.integer):
+            info = np.iinfo(self.dtype)
+            return np.clip(np.rint(salida), info.min, info.max).astype(self.dtype)
+        return salida.astype(self.dtype)
+
+    def guardar(self, ruta):
+        np.savez(ruta, forma = self.forma, dtype = str(self.dtype), tamano_bloque = self.tamano_bloque,
+                 maximo = self.maximo, rangos = self.rangos, normas2 = self.normas2,
+                 U = self.U, sigma = self.sigma, Vt = self.Vt)
+
+    @classmethod
+    def cargar(cls, ruta):
+        archivo = np.load(ruta)
+        return cls(archivo["forma"], str(archivo["dtype"]), int(archivo["tamano_bloque"]),
+                   float(archivo["maximo"]), archivo["rangos"], archivo["normas2"],
+                   archivo["U"], archivo["sigma"], archivo["Vt"])
+
+
+def _tareas(imagen, tamano_bloque):
+    imagen = np.asarray(imagen)
+    canales = imagen if imagen.ndim == 3 else imagen[..., None]
+    alto, ancho = imagen.shape[:2]
+    return [canales[i:i + tamano_bloque, j:j + tamano_bloque, c]
+            for c in range(canales.shape[2])
+            for i in range(0, alto, tamano_bloque) for j in range(0, ancho, tamano_bloque)]
+
+
+def _armar(imagen, factores, tamano_bloque, maximo):
+    U, sigma, Vt, normas2 = zip(*factores)
+    return ImagenComprimida(np.shape(imagen), np.asarray(imagen).dtype, tamano_bloque, maximo,
+                            [len(s) for s in sigma], normas2,
+                            np.concatenate([u.ravel() for u in U]), np.concatenate(sigma),
+                            np.concatenate([v.ravel() for v in Vt]))
+
+
+def comprimir_imagenes(imagenes, energia = None, psnr_meta = None, tamano_bloque = TAMANO_BLOQUE,
+                       rango_max = None, maximo = None, n_procesos = None, semilla = 123):
+    """Comprime varias imágenes con un mismo grupo de procesos.
+
+    Parámetros
+    ----------
+    imagenes : arreglos alto × ancho o alto × ancho × canales.
+    energia : fracción de Σ s_i² retenida en cada bloque (`ENERGIA` si no se
+        da ninguna meta).
+    psnr_meta : PSNR mínimo (dB) de cada bloque; si se dan las dos metas se
+        cumplen ambas.
+    rango_max : tope de valores singulares por bloque (con SVD aleatorizada
+        si es menor que la mitad del bloque).
+    maximo : valor de pico para el PSNR (255 para `uint8`, 1 para flotantes).
+    """
+    if energia is None and psnr_meta is None and rango_max is None:
+        energia = ENERGIA
+    imagenes = [np.asarray(imagen) for imagen in imagenes]
+    tareas, limites = [], [0]
+    for imagen in imagenes:
+        tareas.extend(_tareas(imagen, tamano_bloque))
+        limites.append(len(tareas))
+    picos = [maximo if maximo is not None else (255.0 if imagen.dtype == np.uint8 else 1.0) for imagen in imagenes]
+    # Los bloques se agrupan por imagen para usar el pico de cada una
+    grupos = [(tareas[inicio:min(inicio + BLOQUES_POR_TAREA, fin)], pico)
+              for fin_previo, fin, pico in zip(limites[:-1], limites[1:], picos)
+              for inicio in range(fin_previo, fin, BLOQUES_POR_TAREA)]
+    n_procesos = min(n_procesos or os.cpu_count() or 1, max(len(grupos), 1))
+    if n_procesos <= 1:
+        resultados = [_comprimir_bloques(bloques, energia, psnr_meta, pico, rango_max, semilla)
+                      for bloques, pico in grupos]
+    else:
+        with ProcessPoolExecutor(max_workers = n_procesos) as ejecutor:
+            futuros = [ejecutor.submit(_comprimir_bloques, bloques, energia, psnr_meta, pico, rango_max, semilla)
+                       for bloques, pico in grupos]
+            resultados = [f.result() for f in futuros]
+    factores = [f for resultado in resultados for f in resultado]
+    return [_armar(imagen, factores[inicio:fin], tamano_bloque, pico)
+            for imagen, inicio, fin, pico in zip(imagenes, limites[:-1], limites[1:], picos)]
+
+
+def comprimir(imagen, energia = None, psnr_meta = None, tamano_bloque = TAMANO_BLOQUE, rango_max = None,
+              maximo = None, n_procesos = None, semilla = 123):
+    """Comprime una imagen; ver `comprimir_imagenes`."""
+    return comprimir_imagenes([imagen], energia, psnr_meta, tamano_bloque, rango_max, maximo,
+                              n_procesos, semilla)[0]
@@ -0,0 +1,165 @@
+# coding: utf-8
+
+"""Eigenfaces con SVD aleatorizada o incremental y bases reutilizables.
+
+En `S2_LC_Taller_SVD2` se calcula la SVD completa de la matriz de imágenes
+centrada (dos veces: con todas las imágenes y con `X_train_centered`) para
+quedarse con K = 1000 componentes, y `GridSearchCV` vuelve a ajustar
+`TruncatedSVD` para cada pliegue y cada `n_components` de la grilla. Aquí:
+
+- `Eigenfaces` calcula sólo las primeras componentes con SVD aleatorizada
+  (Halko et al., 2011) o, con `metodo="completo"`, con `np.linalg.svd`;
+- la base de cada matriz de entrenamiento se guarda con `max_componentes`
+  componentes; los candidatos de la grilla con el mismo pliegue toman las
+  primeras `n_components` de esa base en lugar de recalcularla. Con
+  `memoria` (una carpeta o un `joblib.Memory`) las bases se guardan en disco
+  y las comparten los procesos de `GridSearchCV(n_jobs=...)`;
+- `fit_lotes` ajusta la base con `IncrementalPCA` sobre lotes de imágenes, p.
+  ej. los de `lotes_caras`, que lee los JPEG de las carpetas `lfw_funneled`
+  sin cargar todas las imágenes a la vez.
+"""
+
+import os
+from collections import OrderedDict
+
+import joblib
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.decomposition import IncrementalPCA
+from sklearn.utils.extmath import randomized_svd
+
+from lfw_memmap import ESCALA, RECORTE, leer_caras
+
+# Imágenes por lote en la lectura por lotes
+TAMANO_LOTE = 500
+
+# Bases guardadas en memoria (una por matriz de entrenamiento y configuración)
+MAX_BASES = 8
+_BASES = OrderedDict()
+
+
+def rutas_lfw(carpeta, min_faces_per_person = 0):
+    """Rutas, etiquetas y nombres de las caras de `lfw_funneled` en el orden de `fetch_lfw_people`.
+
+    Devuelve `(rutas, target, target_names)`: las filas quedan en el mismo
+    orden que `lfw_dataset.data` (incluida la permutación con semilla 42).
+    """
+    nombres, rutas = [], []
+    for persona in sorted(os.listdir(carpeta)):
+        carpeta_persona = os.path.join(carpeta, persona)
+        if not os.path.isdir(carpeta_persona):
+            continue
+        archivos = [os.path.join(carpeta_persona, f) for f in sorted(os.listdir(carpeta_persona))]
+        if len(archivos) >= min_faces_per_person:
+            nombres.extend([persona.replace("_", " ")] * len(archivos))
+            rutas.extend(archivos)
+    target_names = np.unique(nombres)
+    target = np.searchsorted(target_names, nombres)
+    indices = np.arange(len(rutas))
+    np.random.RandomState(42).shuffle(indices)
+    return [rutas[i] for i in indices], target[indices], target_names
+
+
+def lotes_caras(rutas, tamano_lote = TAMANO_LOTE, recorte = RECORTE, escala = ESCALA):
+    """Lotes de `leer_caras` de a lo sumo `tamano_lote` imágenes."""
+    for inicio in range(0, len(rutas), tamano_lote):
+        yield leer_caras(rutas[inicio:inicio + tamano_lote], recorte, escala)
+
+
+def _base(X, k, metodo, n_iter, random_state, centrar):
+    # Media, valores singulares, primeras k filas de Vt y varianza total de X centrada
+    media = X.mean(axis = 0) if centrar else np.zeros(X.shape[1], dtype = X.dtype)
+    Xc = X - media
+    if metodo == "aleatorizado":
+        _, sigma, Vt = randomized_svd(Xc, k, n_iter = n_iter, random_state = random_state)
+    elif metodo == "completo":
+        _, sigma, Vt = np.linalg.svd(Xc, full_matrices = False)
+        sigma, Vt = sigma[:k], Vt[:k]
+    else:
+        raise ValueError("metodo debe ser 'aleatorizado' o 'completo'")
+    return media, sigma, Vt, float(np.sum(Xc ** 2))
+
+
+class Eigenfaces(TransformerMixin, BaseEstimator):
+    """Proyección sobre las primeras `n_components` caras propias.
+
+    Parámetros
+    ----------
+    n_components : componentes usadas por `transform`.
+    max_componentes : componentes de la base que se calcula y se guarda; en
+        una grilla sobre `n_components` conviene fijarlo en el mayor valor de
+        la grilla para que todos los candidatos compartan la base.
+    metodo : "aleatorizado" (por defecto) o "completo".
+    n_iter : iteraciones de potencia de la SVD aleatorizada.
+    centrar : restar el rostro promedio antes de la SVD (como `X_train_centered`).
+    memoria : carpeta o `joblib.Memory` para guardar las bases en disco.
+    """
+
+    def __init__(self, n_components = 100, max_componentes = None, metodo = "aleatorizado", n_iter = 4,
+                 random_state = None, centrar = True, memoria = None):
+        self.n_components = n_components
+        self.max_componentes = max_componentes
+        self.metodo = metodo
+        self.n_iter = n_iter
+        self.random_state = random_state
+        self.centrar = centrar
+        self.memoria = memoria
+
+    def _calcular_base(self, X, k):
+        if self.memoria is not None:
+            memoria = self.memoria if isinstance(self.memoria, joblib.Memory) \
+                else joblib.Memory(self.memoria, verbose = 0)
+            return memoria.cache(_base)(X, k, self.metodo, self.n_iter, self.random_state, self.centrar)
+        clave = (joblib.hash(X), k, self.metodo, self.n_iter, self.random_state, self.centrar)
+        if clave in _BASES:
+            _BASES.move_to_end(clave)
+        else:
+            _BASES[clave] = _base(X, k, self.metodo, self.n_iter, self.random_state, self.centrar)
+            if len(_BASES) > MAX_BASES:
+                _BASES.popitem(last = False)
+        return _BASES[clave]
+
+    def _guardar(self, media, sigma, Vt, varianza_total):
+        if self.n_components > len(sigma):
+            raise ValueError("n_components es mayor que las componentes de la base (%d)" % len(sigma))
+        self.mean_ = media
+        self.singular_values_ = sigma[:self.n_components]
+        self.components_ = Vt[:self.n_components]
+        self.explained_variance_ratio_ = self.singular_values_ ** 2 / varianza_total
+        self.n_features_in_ = Vt.shape[1]
+        return self
+
+    def fit(self, X, y = None):
+        X = np.asarray(X)
+        k = max(self.n_components, self.max_componentes or 0)
+        k = min(k, min(X.shape))
+        return self._guardar(*self._calcular_base(X, k))
+
+    def fit_lotes(self, lotes):
+        """Ajusta la base con `IncrementalPCA` recorriendo una sola vez un iterable de lotes.
+
+        Los lotes con menos filas que `n_components` se acumulan con los
+        siguientes, porque `partial_fit` necesita al menos esa cantidad; lo
+        que sobra al final se agrega al último lote.
+        """
+        ipca = IncrementalPCA(n_components = self.n_components)
+        pendientes, filas, listo = [], 0, None
+        for lote in lotes:
+            pendientes.append(np.asarray(lote))
+            filas += len(lote)
+            if filas >= self.n_components:
+                if listo is not None:
+                    ipca.partial_fit(listo)
+                listo = np.vstack(pendientes)
+                pendientes, filas = [], 0
+        if listo is not None:
+            pendientes.insert(0, listo)
+        ipca.partial_fit(np.vstack(pendientes))
+        varianza_total = ipca.var_.sum() * ipca.n_samples_seen_
+        return self._guardar(ipca.mean_, ipca.singular_values_, ipca.components_, varianza_total)
+
+    def transform(self, X):
+        return (np.asarray(X) - self.mean_) @ self.components_.T
+
+    def inverse_transform(self, Z):
+        return np.asarray(Z) @ self.components_ + self.mean_
@@ -0,0 +1,218 @@
+# coding: utf-8
+
+"""Caché de las caras de LFW ya decodificadas en un `.npy` mapeado en memoria.
+
+`fetch_lfw_people(min_faces_per_person=25)` decodifica, recorta y reduce los
+JPEG de `lfw_home/lfw_funneled` y los guarda con el caché de joblib, que hay
+que leer completo a memoria en cada sesión (y uno distinto por cada
+`min_faces_per_person`); el taller además vuelve a escribir cada imagen con
+`plt.imsave`. Aquí:
+
+- todas las caras se decodifican una sola vez, en varios procesos que
+  escriben directamente en un `.npy` (`float16` o `uint8`), con un índice de
+  personas y archivos al lado;
+- en las sesiones siguientes el `.npy` se abre con `mmap_mode="r"`: sólo se
+  leen del disco las filas que se usan, y el filtro `min_faces_per_person` y
+  el orden de `fetch_lfw_people` son arreglos de índices;
+- las fotos de cada persona quedan contiguas, así que `DatosLFW.persona`
+  devuelve una vista sin copiar (p. ej. sólo Serena Williams).
+
+El caché se vuelve a construir si cambia la carpeta de imágenes (o la de
+alguna persona: agregar, borrar o renombrar fotos), el recorte, la escala o el
+tipo de dato.
+"""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# Recorte y escala por defecto de `fetch_lfw_people`
+RECORTE = (slice(70, 195), slice(78, 172))
+ESCALA = 0.5
+
+# Imágenes decodificadas en cada tarea
+IMAGENES_POR_TAREA = 256
+
+VERSION = 1
+
+
+def _listar(carpeta):
+    # Personas en orden alfabético y sus archivos en orden, como `fetch_lfw_people`
+    personas, conteos, rutas = [], [], []
+    for persona in sorted(os.listdir(carpeta)):
+        carpeta_persona = os.path.join(carpeta, persona)
+        if not os.path.isdir(carpeta_persona):
+            continue
+        archivos = sorted(os.listdir(carpeta_persona))
+        personas.append(persona.replace("_", " "))
+        conteos.append(len(archivos))
+        rutas.extend(os.path.join(persona, f) for f in archivos)
+    return personas, np.array(conteos, dtype = np.int64), rutas
+
+
+def leer_caras(rutas, recorte = RECORTE, escala = ESCALA):
+    """Matriz (imágenes × píxeles) en escala de grises y [0, 1], como `lfw_dataset.data`.
+
+    Con `recorte=None` y `escala=None` las imágenes se leen completas (p. ej.
+    las de la carpeta `data` que guarda el cuaderno).
+    """
+    filas = []
+    for ruta in rutas:
+        with Image.open(ruta) as imagen:
+            if recorte is not None:
+                alto, ancho = recorte
+                imagen = imagen.crop((ancho.start, alto.start, ancho.stop, alto.stop))
+            if escala is not None:
+                imagen = imagen.resize((int(escala * imagen.width), int(escala * imagen.height)))
+            cara = np.asarray(imagen, dtype = np.float32) / 255.0
+        if cara.ndim == 3:
+            cara = cara[..., :3].mean(axis = 2)
+        filas.append(cara.ravel())
+    return np.vstack(filas)
+
+
+def _forma(recorte, escala):
+    alto = recorte[0].stop - recorte[0].start if recorte is not None else 250
+    ancho = recorte[1].stop - recorte[1].start if recorte is not None else 250
+    if escala is not None:
+        alto, ancho = int(escala * alto), int(escala * ancho)
+    return alto, ancho
+
+
+def _decodificar(ruta_npy, carpeta, rutas, inicio, recorte, escala):
+    # Cada proceso escribe su tramo directamente en el archivo; devuelve las posiciones ilegibles
+    destino = np.load(ruta_npy, mmap_mode = "r+")
+    rutas = [os.path.join(carpeta, r) for r in rutas]
+    try:
+        caras, ilegibles = leer_caras(rutas, recorte, escala), []
+    except OSError:
+        # Algún archivo está dañado (p. ej. una descarga incompleta): se leen de a uno
+        caras, ilegibles = np.zeros((len(rutas), np.prod(destino.shape[1:])), dtype = np.float32), []
+        for i, ruta in enumerate(rutas):
+            try:
+                caras[i] = leer_caras([ruta], recorte, escala)[0]
+            except OSError:
+                ilegibles.append(inicio + i)
+    if destino.dtype == np.uint8:
+        caras = np.rint(caras * 255)
+    destino[inicio:inicio + len(rutas)] = caras.reshape((len(rutas),) + destino.shape[1:])
+    destino.flush()
+    return ilegibles
+
+
+def _huella_carpetas(carpeta):
+    # Agregar o borrar fotos de una persona cambia la fecha de su carpeta, no la de `carpeta`
+    h = hashlib.blake2b(digest_size = 16)
+    for entrada in sorted(os.scandir(carpeta), key = lambda e: e.name):
+        if entrada.is_dir():
+            h.update(("%s\0%d\n" % (entrada.name, entrada.stat().st_mtime_ns)).encode("utf-8"))
+    return h.hexdigest()
+
+
+def _firma(carpeta, recorte, escala, dtype):
+    return {"version": VERSION, "carpeta": os.path.abspath(carpeta), "mtime": os.stat(carpeta).st_mtime_ns,
+            "carpetas": _huella_carpetas(carpeta),
+            "recorte": None if recorte is None else [[s.start, s.stop] for s in recorte],
+            "escala": escala, "dtype": np.dtype(dtype).name}
+
+
+def construir_cache(carpeta, cache, recorte = RECORTE, escala = ESCALA, dtype = "float16", n_procesos = None):
+    """Decodifica todas las caras de `carpeta` en `cache/caras.npy` e `cache/indice.npz`."""
+    os.makedirs(cache, exist_ok = True)
+    personas, conteos, rutas = _listar(carpeta)
+    alto, ancho = _forma(recorte, escala)
+    temporal = os.path.join(cache, "caras.tmp.npy")
+    np.lib.format.open_memmap(temporal, mode = "w+", dtype = dtype, shape = (len(rutas), alto, ancho)).flush()
+    tramos = [(inicio, rutas[inicio:inicio + IMAGENES_POR_TAREA])
+              for inicio in range(0, len(rutas), IMAGENES_POR_TAREA)]
+    n_procesos = min(n_procesos or os.cpu_count() or 1, max(len(tramos), 1))
+    if n_procesos <= 1:
+        ilegibles = [_decodificar(temporal, carpeta, parte, inicio, recorte, escala) for inicio, parte in tramos]
+    else:
+        with ProcessPoolExecutor(max_workers = n_procesos) as ejecutor:
+            futuros = [ejecutor.submit(_decodificar, temporal, carpeta, parte, inicio, recorte, escala)
+                       for inicio, parte in tramos]
+            ilegibles = [futuro.result() for futuro in futuros]
+    validas = np.ones(len(rutas), dtype = bool)
+    validas[[i for parte in ilegibles for i in parte]] = False
+    np.savez(os.path.join(cache, "indice.npz"), personas = np.array(personas), conteos = conteos,
+             rutas = np.array(rutas), validas = validas)
+    os.replace(temporal, os.path.join(cache, "caras.npy"))
+    with open(os.path.join(cache, "firma.json"), "w") as archivo:
+        json.dump(_firma(carpeta, recorte, escala, dtype), archivo)
+
+
+class DatosLFW:
+    """Caras de LFW sobre el `.npy` mapeado en memoria, con la interfaz de `fetch_lfw_people`.
+
+    `images`, `data` y `target` están en el mismo orden que los de
+    `fetch_lfw_people(min_faces_per_person=...)`; `images` y `data` se leen
+    del disco al pedirlos, en el tipo de dato del caché. Los archivos que no se
+    pudieron leer no cuentan para `min_faces_per_person` ni aparecen.
+    """
+
+    def __init__(self, caras, personas, conteos, rutas, validas, min_faces_per_person = 0):
+        self.caras = caras
+        self.personas = personas
+        self.rutas = rutas
+        self.validas = validas
+        desfases = np.concatenate([[0], np.cumsum(conteos)])
+        self.inicio_persona, self.fin_persona = desfases[:-1], desfases[1:]
+        # Imágenes válidas por persona; una carpeta vacía tiene inicio == fin y cuenta 0
+        self.conteos = np.diff(np.concatenate([[0], np.cumsum(validas)])[desfases])
+        self.posicion = {nombre: p for p, nombre in enumerate(personas)}
+        elegidas = np.flatnonzero(self.conteos >= min_faces_per_person)
+        if len(elegidas) == 0:
+            raise ValueError("min_faces_per_person=%d is too restrictive" % min_faces_per_person)
+        self.target_names = np.unique(personas[elegidas])
+        filas = np.concatenate([self._filas(p) for p in elegidas])
+        target = np.searchsorted(self.target_names, np.repeat(personas[elegidas], self.conteos[elegidas]))
+        orden = np.arange(len(filas))
+        np.random.RandomState(42).shuffle(orden)
+        self.filas, self.target = filas[orden], target[orden]
+
+    def __len__(self):
+        return len(self.filas)
+
+    @property
+    def images(self):
+        return self.caras[self.filas]
+
+    @property
+    def data(self):
+        return self.images.reshape(len(self), -1)
+
+    def _filas(self, p):
+        filas = np.arange(self.inicio_persona[p], self.fin_persona[p])
+        return filas[self.validas[filas]]
+
+    def persona(self, nombre):
+        """Fotos de una persona (p. ej. "Serena Williams") como vista del archivo, sin copiar."""
+        p = self.posicion[nombre]
+        inicio, fin = self.inicio_persona[p], self.fin_persona[p]
+        if self.validas[inicio:fin].all():
+            return self.caras[inicio:fin]
+        return self.caras[self._filas(p)]
+
+
+def cargar_lfw(carpeta = "data/lfw_home/lfw_funneled", min_faces_per_person = 0, cache = None,
+               recorte = RECORTE, escala = ESCALA, dtype = "float16", n_procesos = None):
+    """`DatosLFW` desde el caché (por defecto `lfw_home/cache_npy`), construyéndolo si hace falta."""
+    if cache is None:
+        cache = os.path.join(os.path.dirname(os.path.abspath(carpeta)), "cache_npy")
+    ruta_firma = os.path.join(cache, "firma.json")
+    firma = _firma(carpeta, recorte, escala, dtype)
+    vigente = False
+    if os.path.exists(ruta_firma):
+        with open(ruta_firma) as archivo:
+            vigente = json.load(archivo) == firma
+    if not vigente:
+        construir_cache(carpeta, cache, recorte, escala, dtype, n_procesos)
+    indice = np.load(os.path.join(cache, "indice.npz"))
+    caras = np.load(os.path.join(cache, "caras.npy"), mmap_mode = "r")
+    return DatosLFW(caras, indice["personas"], indice["conteos"], indice["rutas"], indice["validas"],
+                    min_faces_per_person)
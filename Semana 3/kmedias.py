@@ -0,0 +1,182 @@
+# coding: utf-8
+
+"""Implementación vectorizada de `kmedias` del cuaderno `S3_LSC2_K_Medias`.
+
+Mantiene la firma y el resultado de la versión del cuaderno (etiquetas de 1
+a K y gráficas opcionales de cada iteración con `visualizar_proceso`), pero:
+
+- las distancias de todas las observaciones a todos los centroides se
+  calculan en un solo producto matricial, ‖x‖² − 2x·c + ‖c‖², sobre un
+  buffer preasignado y por bloques de filas;
+- los centroides se actualizan con `np.bincount` en lugar de armar cada
+  cluster punto por punto con `np.c_`;
+- la convergencia se mide con la norma del desplazamiento de los
+  centroides (`np.sum(centroides_nuevos - centroides) == 0` puede no
+  cumplirse nunca o cumplirse por cancelación de signos);
+- los centroides iniciales se eligen con k-means++ y existe un modo
+  mini-batch para bases de millones de observaciones.
+"""
+
+import matplotlib.pyplot as plt
+import numpy as np
+
+# Filas procesadas a la vez al calcular distancias
+TAMANO_BLOQUE = 65_536
+
+
+def _graficar(X, clusteres, centroides, titulo, etiqueta_centroides):
+    fig, ax = plt.subplots()
+    g_puntos = plt.scatter(X[:,0], X[:,1], c = clusteres, alpha = 0.8)
+    legend = ax.legend(*g_puntos.legend_elements(), loc = "upper right", title = titulo)
+    ax.add_artist(legend)
+    g_centroides = plt.scatter(centroides[:,0], centroides[:,1], color = "red", label = "Centroides")
+    plt.legend([g_centroides], [etiqueta_centroides], loc = "upper left")
+    plt.show()
+
+
+def asignar(X, centroides, normas_x = None, tamano_bloque = TAMANO_BLOQUE):
+    """Cluster más cercano (0 a K-1) y distancia euclidiana al cuadrado de cada observación."""
+    n = X.shape[0]
+    K = centroides.shape[0]
+    if normas_x is None:
+        normas_x = np.einsum("ij,ij->i", X, X)
+    normas_c = np.einsum("ij,ij->i", centroides, centroides)
+    etiquetas = np.empty(n, dtype = np.intp)
+    distancias = np.empty(n, dtype = X.dtype)
+    buffer = np.empty((min(tamano_bloque, n), K), dtype = X.dtype)
+    for inicio in range(0, n, tamano_bloque):
+        fin = min(inicio + tamano_bloque, n)
+        d = buffer[:fin - inicio]
+        np.matmul(X[inicio:fin], centroides.T, out = d)
+        d *= -2
+        d += normas_c
+        etiquetas[inicio:fin] = np.argmin(d, axis = 1)
+        distancias[inicio:fin] = d[np.arange(fin - inicio), etiquetas[inicio:fin]] + normas_x[inicio:fin]
+    np.maximum(distancias, 0, out = distancias)
+    return etiquetas, distancias
+
+
+def kmeans_pp(X, K, rng, normas_x = None):
+    """Centroides iniciales con k-means++ (Arthur y Vassilvitskii, 2007)."""
+    n = X.shape[0]
+    centroides = np.empty((K, X.shape[1]), dtype = X.dtype)
+    centroides[0] = X[rng.integers(n)]
+    _, d_min = asignar(X, centroides[:1], normas_x)
+    for k in range(1, K):
+        total = d_min.sum()
+        # Si todos los puntos coinciden con algún centroide se elige uno al azar
+        indice = rng.choice(n, p = d_min / total) if total > 0 else rng.integers(n)
+        centroides[k] = X[indice]
+        _, d_nueva = asignar(X, centroides[k:k + 1], normas_x)
+        np.minimum(d_min, d_nueva, out = d_min)
+    return centroides
+
+
+def _actualizar(X, etiquetas, K, centroides, distancias):
+    conteos = np.bincount(etiquetas, minlength = K)
+    nuevos = np.empty_like(centroides)
+    for j in range(X.shape[1]):
+        nuevos[:, j] = np.bincount(etiquetas, weights = X[:, j], minlength = K)
+    vacios = conteos == 0
+    nuevos[~vacios] /= conteos[~vacios, None]
+    # Un cluster vacío se reubica en las observaciones más lejanas a su centroide
+    if vacios.any():
+        lejanos = np.argpartition(distancias, -vacios.sum())[-vacios.sum():]
+        nuevos[vacios] = X[lejanos]
+    return nuevos
+
+
+def kmedias(X, K, max_iter = 100, visualizar_proceso = True, semilla = 666, tol = 1e-4,
+            inicializacion = "k-means++", tamano_lote = None, retornar_centroides = False,
+            graficar_cada = 10):
+    """Agrupa las filas de `X` en `K` clusters y devuelve sus etiquetas (de 1 a K).
+
+    Parámetros
+    ----------
+    X : arreglo (n_observaciones, n_variables).
+    K : número de clusters.
+    max_iter : número máximo de iteraciones (o de lotes en modo mini-batch).
+    visualizar_proceso : grafica los clusters y centroides de cada iteración (sólo
+        las dos primeras variables), como en el cuaderno.
+    semilla : semilla del generador aleatorio.
+    tol : tolerancia de convergencia, relativa a la varianza media de las variables;
+        se detiene cuando la norma al cuadrado del desplazamiento de los centroides
+        es menor que `tol * mean(var(X))`.
+    inicializacion : "k-means++" o "aleatoria" (K observaciones al azar, como en el cuaderno).
+    tamano_lote : si se indica, usa k-means mini-batch (Sculley, 2010) con lotes de ese
+        tamaño y asigna todas las observaciones al final.
+    retornar_centroides : si es verdadero devuelve también los centroides (K, n_variables).
+    graficar_cada : en modo mini-batch, con `visualizar_proceso` se grafica el lote y los
+        centroides actualizados cada `graficar_cada` lotes (y el último).
+    """
+    X = np.asarray(X)
+    if not np.issubdtype(X.dtype, np.floating):
+        X = X.astype(np.float64)
+    X = np.ascontiguousarray(X)
+    n_observaciones = X.shape[0]
+    if not 1 <= K <= n_observaciones:
+        raise ValueError("K debe estar entre 1 y el número de observaciones")
+    rng = np.random.default_rng(semilla)
+    normas_x = np.einsum("ij,ij->i", X, X)
+    umbral = tol * np.mean(np.var(X, axis = 0))
+
+    if inicializacion == "k-means++":
+        centroides = kmeans_pp(X, K, rng, normas_x)
+    elif inicializacion == "aleatoria":
+        centroides = X[rng.choice(n_observaciones, K, replace = False)].copy()
+    else:
+        raise ValueError("inicializacion debe ser 'k-means++' o 'aleatoria'")
+
+    if tamano_lote is not None:
+        centroides = _mini_batch(X, K, centroides, rng, max_iter, umbral, tamano_lote, normas_x,
+                                 visualizar_proceso, graficar_cada)
+        clusteres, _ = asignar(X, centroides, normas_x)
+    else:
+        for n in range(1, max_iter + 1):
+            if visualizar_proceso:
+                print("Iteración", str(n))
+            clusteres, distancias = asignar(X, centroides, normas_x)
+            if visualizar_proceso:
+                _graficar(X, clusteres + 1, centroides, "Clusteres\niteración " + str(n), "Centroides")
+            centroides_nuevos = _actualizar(X, clusteres, K, centroides, distancias)
+            if visualizar_proceso:
+                _graficar(X, clusteres + 1, centroides_nuevos, "Clusteres\niteración " + str(n),
+                          "Nuevos centroides")
+            cambio = np.sum((centroides_nuevos - centroides) ** 2)
+            centroides = centroides_nuevos
+            if cambio <= umbral:
+                break
+        clusteres, _ = asignar(X, centroides, normas_x)
+
+    if retornar_centroides:
+        return clusteres + 1, centroides
+    return clusteres + 1
+
+
+def _mini_batch(X, K, centroides, rng, max_iter, umbral, tamano_lote, normas_x,
+                visualizar_proceso = False, graficar_cada = 10):
+    n = X.shape[0]
+    acumulados = np.zeros(K)
+    centroides = centroides.copy()
+    for n_lote in range(1, max_iter + 1):
+        lote = rng.integers(n, size = tamano_lote)
+        X_lote = X[lote]
+        etiquetas, _ = asignar(X_lote, centroides, normas_x[lote])
+        conteos = np.bincount(etiquetas, minlength = K)
+        sumas = np.empty_like(centroides)
+        for j in range(X.shape[1]):
+            sumas[:, j] = np.bincount(etiquetas, weights = X_lote[:, j], minlength = K)
+        # Tasa de aprendizaje por centroide: 1 / número de observaciones vistas
+        acumulados += conteos
+        activos = conteos > 0
+        tasa = conteos[activos] / acumulados[activos]
+        anteriores = centroides[activos].copy()
+        centroides[activos] = (1 - tasa)[:, None] * anteriores + (sumas[activos] / acumulados[activos, None])
+        convergio = np.sum((centroides[activos] - anteriores) ** 2) <= umbral
+        # Se grafica sólo el lote: con millones de observaciones graficar X completa no es viable
+        if visualizar_proceso and (n_lote % graficar_cada == 0 or n_lote == max_iter or convergio):
+            print("Lote", str(n_lote))
+            _graficar(X_lote, etiquetas + 1, centroides, "Clusteres\nlote " + str(n_lote), "Centroides")
+        if convergio:
+            break
+    return centroides
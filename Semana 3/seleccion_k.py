@@ -0,0 +1,226 @@
+# coding: utf-8
+
+"""Selección del número de clusters K con el método del codo y el índice de Silhouette.
+
+En el cuaderno `S3_LSC2_K_Medias` se ajusta `KMeans` para K = 1, ..., 10 en
+serie y para cada K se llama `silhouette_score(X, labels)`, que calcula todas
+las distancias entre pares de observaciones: O(n²) en tiempo y memoria. Aquí:
+
+- los ajustes para cada K se reparten en un grupo de procesos, cada uno con un
+  solo hilo de BLAS/OpenMP para no sobresuscribir los núcleos (o se encadenan
+  con inicio caliente: los centroides de K - 1 más un centroide nuevo elegido
+  como en k-means++);
+- el Silhouette se calcula sobre una muestra común a todos los K, estratificada
+  por los clusters del K más grande (así los clusters chicos no quedan fuera
+  de la muestra), por bloques de filas, y cada bloque de distancias se
+  reutiliza para todos los K;
+- el índice de Calinski-Harabasz se calcula en una sola pasada con
+  `np.bincount`, dentro del mismo proceso que ajusta cada K.
+
+`barrido_k` devuelve una tabla con la inercia, el Silhouette, el índice de
+Calinski-Harabasz y el tiempo de ajuste de cada K.
+"""
+
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from threadpoolctl import threadpool_limits
+
+_X = None
+
+
+def _iniciar_trabajador(X):
+    global _X
+    _X = X
+
+
+def _iniciar_proceso(X):
+    # Cada proceso ajusta un K con un solo hilo: los procesos ya ocupan los núcleos
+    threadpool_limits(1)
+    _iniciar_trabajador(X)
+
+
+def _ajustar(k, n_init, semilla, etiquetas = False, init = None):
+    inicio = time.perf_counter()
+    if init is None:
+        modelo = KMeans(n_clusters = k, n_init = n_init, random_state = semilla)
+    else:
+        modelo = KMeans(n_clusters = k, n_init = 1, init = init, random_state = semilla)
+    modelo.fit(_X)
+    segundos = time.perf_counter() - inicio
+    return {"k": k, "inercia": modelo.inertia_, "centroides": modelo.cluster_centers_,
+            "calinski_harabasz": calinski_harabasz(_X, modelo.labels_, k),
+            "etiquetas": modelo.labels_ if etiquetas else None, "segundos": segundos}
+
+
+def _nuevo_centroide(X, centroides, rng, tamano_muestra = 100_000):
+    # Se elige con probabilidad proporcional a la distancia al cuadrado (k-means++)
+    idx = rng.choice(len(X), min(tamano_muestra, len(X)), replace = False)
+    Xm = X[idx]
+    d2 = ((Xm[:, None, :] - centroides[None, :, :]) ** 2).sum(axis = 2).min(axis = 1)
+    total = d2.sum()
+    elegido = rng.choice(len(Xm), p = d2 / total) if total > 0 else rng.integers(len(Xm))
+    return np.vstack([centroides, Xm[elegido]])
+
+
+def muestra_estratificada(estratos, tamano, rng):
+    """Índices ordenados de una muestra de `tamano` con asignación proporcional a cada estrato.
+
+    Las cuotas se redondean por el método del resto mayor y cada estrato no
+    vacío aporta al menos una observación (la muestra puede pasarse de `tamano`
+    en tantas observaciones como estratos haya).
+    """
+    n = len(estratos)
+    if tamano >= n:
+        return np.arange(n)
+    _, estratos = np.unique(estratos, return_inverse = True)
+    conteos = np.bincount(estratos)
+    exactas = conteos * tamano / n
+    cuotas = np.floor(exactas).astype(np.intp)
+    faltan = tamano - cuotas.sum()
+    cuotas[np.argsort(cuotas - exactas, kind = "stable")[:faltan]] += 1
+    cuotas = np.maximum(cuotas, 1)
+    # Se barajan los índices y se ordenan por estrato: los primeros de cada estrato son al azar
+    barajados = rng.permutation(n)
+    barajados = barajados[np.argsort(estratos[barajados], kind = "stable")]
+    inicios = np.concatenate([[0], np.cumsum(conteos)[:-1]])
+    return np.sort(np.concatenate([barajados[i:i + c] for i, c in zip(inicios, cuotas)]))
+
+
+def calinski_harabasz(X, etiquetas, k):
+    """Índice de Calinski-Harabasz en una pasada con `np.bincount` (NaN si K = 1).
+
+    Usa la descomposición de la suma de cuadrados total T = B + W alrededor de
+    la media global, con las medias de cada cluster según `etiquetas`.
+    """
+    if k < 2:
+        return np.nan
+    n = len(X)
+    conteos = np.bincount(etiquetas, minlength = k)
+    media = X.mean(axis = 0)
+    total = entre = 0.0
+    for j in range(X.shape[1]):
+        columna = X[:, j] - media[j]
+        total += columna @ columna
+        sumas = np.bincount(etiquetas, weights = columna, minlength = k)
+        entre += np.sum(sumas[conteos > 0] ** 2 / conteos[conteos > 0])
+    dentro = total - entre
+    if dentro <= 0:
+        return np.nan
+    return (entre / (k - 1)) / (dentro / (n - k))
+
+
+def silhouettes(Xm, etiquetas, tamano_bloque = 1024):
+    """Silhouette medio para varias particiones de la misma muestra.
+
+    `etiquetas` es un diccionario {K: etiquetas de la muestra}. Las distancias
+    de cada bloque de filas a toda la muestra se calculan una sola vez y se
+    reutilizan para todos los K; la memoria es O(tamano_bloque × m). Da el
+    mismo resultado que `sklearn.metrics.silhouette_score` sobre la muestra.
+    """
+    m = len(Xm)
+    normas = np.einsum("ij,ij->i", Xm, Xm)
+    preparados = {}
+    for k, lab in etiquetas.items():
+        _, lab = np.unique(lab, return_inverse = True)
+        k_obs = lab.max() + 1
+        if k_obs < 2:
+            continue
+        una_caliente = np.zeros((m, k_obs))
+        una_caliente[np.arange(m), lab] = 1
+        preparados[k] = (lab, una_caliente, np.bincount(lab, minlength = k_obs), np.zeros(m))
+    for inicio in range(0, m, tamano_bloque):
+        fin = min(inicio + tamano_bloque, m)
+        d2 = normas[inicio:fin, None] - 2 * Xm[inicio:fin] @ Xm.T + normas[None, :]
+        D = np.sqrt(np.maximum(d2, 0))
+        filas = np.arange(fin - inicio)
+        for k, (lab, una_caliente, conteos, s) in preparados.items():
+            sumas = D @ una_caliente
+            propio = lab[inicio:fin]
+            n_propio = conteos[propio]
+            a = sumas[filas, propio] / np.maximum(n_propio - 1, 1)
+            medias = sumas / conteos
+            medias[filas, propio] = np.inf
+            b = medias.min(axis = 1)
+            with np.errstate(invalid = "ignore", divide = "ignore"):
+                valor = (b - a) / np.maximum(a, b)
+            # Como en scikit-learn, el Silhouette de un cluster de un solo elemento es 0
+            s[inicio:fin] = np.where(n_propio > 1, np.nan_to_num(valor), 0)
+    return {k: preparados[k][3].mean() if k in preparados else np.nan for k in etiquetas}
+
+
+def barrido_k(X, ks = range(1, 11), n_init = 10, semilla = 123, tamano_muestra = 10_000,
+              n_procesos = None, inicio_caliente = False):
+    """Ajusta `KMeans` para cada K de `ks` y resume las métricas de selección.
+
+    Parámetros
+    ----------
+    X : arreglo (n_observaciones, n_variables).
+    ks : valores de K a evaluar.
+    n_init : número de inicializaciones de `KMeans` por K (sin inicio caliente).
+    semilla : semilla para `KMeans` y para la muestra del Silhouette.
+    tamano_muestra : observaciones usadas para el Silhouette (todas si hay menos),
+        estratificadas por los clusters del K más grande.
+    n_procesos : procesos en paralelo; 1 ajusta en el proceso actual.
+    inicio_caliente : ajusta los K en orden creciente partiendo de los centroides
+        del K anterior (un solo inicio por K, sin paralelismo).
+
+    Devuelve un `DataFrame` indexado por K con `inercia`, `silhouette`,
+    `calinski_harabasz` y `segundos` (tiempo de ajuste).
+    """
+    X = np.ascontiguousarray(X, dtype = np.float64)
+    ks = sorted(ks)
+    rng = np.random.default_rng(semilla)
+    k_max = ks[-1]
+    if n_procesos is None:
+        n_procesos = min(len(ks), os.cpu_count() or 1)
+
+    if inicio_caliente:
+        _iniciar_trabajador(X)
+        resultados, centroides = [], None
+        for k in ks:
+            init = None
+            if centroides is not None and len(centroides) == k - 1:
+                init = _nuevo_centroide(X, centroides, rng)
+            resultados.append(_ajustar(k, n_init, semilla, k == k_max, init))
+            centroides = resultados[-1]["centroides"]
+    elif n_procesos == 1:
+        _iniciar_trabajador(X)
+        resultados = [_ajustar(k, n_init, semilla, k == k_max) for k in ks]
+    else:
+        with ProcessPoolExecutor(max_workers = n_procesos, initializer = _iniciar_proceso,
+                                 initargs = (X,)) as ejecutor:
+            futuros = [ejecutor.submit(_ajustar, k, n_init, semilla, k == k_max) for k in ks]
+            resultados = [f.result() for f in futuros]
+
+    muestra = muestra_estratificada(resultados[-1]["etiquetas"], tamano_muestra, rng)
+    Xm = X[muestra]
+    # Las etiquetas de KMeans son las del centroide más cercano: se recalculan sólo en la muestra
+    etiquetas = {r["k"]: ((Xm[:, None, :] - r["centroides"][None, :, :]) ** 2).sum(axis = 2).argmin(axis = 1)
+                 for r in resultados}
+    s = silhouettes(Xm, etiquetas)
+    tabla = pd.DataFrame({
+        "k": [r["k"] for r in resultados],
+        "inercia": [r["inercia"] for r in resultados],
+        "silhouette": [s[r["k"]] for r in resultados],
+        "calinski_harabasz": [r["calinski_harabasz"] for r in resultados],
+        "segundos": [r["segundos"] for r in resultados]})
+    return tabla.set_index("k")
+
+
+def graficar_barrido(tabla):
+    """Gráficas del método del codo y del índice de Silhouette, como en el cuaderno."""
+    plt.plot(tabla.index, tabla["inercia"], marker='o')
+    plt.xlabel('Número de clústeres (K)')
+    plt.ylabel('Varianza intra clúster')
+    plt.show()
+
+    plt.plot(tabla.index, tabla["silhouette"], marker='o')
+    plt.xlabel('Número de clústeres (K)')
+    plt.ylabel('Índice de Silhouette')
+    plt.show()
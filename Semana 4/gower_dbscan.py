@@ -0,0 +1,156 @@
+# coding: utf-8
+
+"""DBSCAN con distancia de Gower sin construir la matriz completa de distancias.
+
+En la sección 5 del taller se ajusta `DBSCAN(metric='precomputed')` sobre la
+matriz de Gower de todos los clientes, que ocupa O(n²) en memoria (unos 8 GB
+con 30.000 clientes en float64). La distancia de Gower entre dos clientes es
+
+    d(i, j) = (Σ_num |x_i - x_j| / rango + Σ_cat [c_i ≠ c_j]) / p
+
+con p el número de variables. Para cada par de combinaciones de categorías la
+parte categórica es una constante m, así que d(i, j) ≤ eps equivale a una
+distancia L1 entre las variables numéricas escaladas de a lo más eps·p − m.
+Aquí se arma un árbol KD (métrica L1) por combinación de categorías y se
+consultan los pares de combinaciones con ese radio. El resultado es el grafo
+de vecindad en formato disperso, que `DBSCAN` acepta como matriz
+precalculada, y la misma estructura da la curva de k-distancias para elegir
+`eps`.
+"""
+
+import itertools
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.spatial import cKDTree
+from sklearn.cluster import DBSCAN
+
+NUMERICAS = ["Ingreso", "Edad", "Puntaje_Gasto"]
+CATEGORICAS = ["Genero", "Grupo_Etario"]
+
+# Mismos cortes de edad que en la sección 3 del taller
+CORTES_EDAD = [18, 24, 34, 44, 54, 64, np.inf]
+ETIQUETAS_EDAD = ['18-24', '25-34', '35-44', '45-54', '55-64', '65+']
+
+# Filas consultadas a la vez en la curva de k-distancias
+TAMANO_BLOQUE = 100_000
+
+
+def agregar_grupo_etario(datos):
+    """Copia de `datos` con la columna `Grupo_Etario` construida a partir de `Edad`."""
+    datos = datos.copy()
+    datos['Grupo_Etario'] = pd.cut(datos['Edad'], bins = CORTES_EDAD, labels = ETIQUETAS_EDAD)
+    return datos
+
+
+class _Gower:
+    # Variables numéricas escaladas por su rango y un árbol L1 por combinación de categorías
+    def __init__(self, datos, numericas, categoricas):
+        valores = datos[numericas].to_numpy(dtype = np.float64)
+        if np.isnan(valores).any():
+            raise ValueError("Las variables numéricas no deben tener valores faltantes")
+        rango = valores.max(axis = 0) - valores.min(axis = 0)
+        rango[rango == 0] = 1
+        self.X = valores / rango
+        self.p = len(numericas) + len(categoricas)
+        self.n = len(valores)
+        if categoricas:
+            # Un valor faltante (p. ej. Edad = 18, fuera de los cortes de `pd.cut`) es una categoría más
+            codigos = np.column_stack([pd.factorize(datos[c].astype(object), use_na_sentinel = False)[0]
+                                       for c in categoricas])
+            combinaciones, grupo = np.unique(codigos, axis = 0, return_inverse = True)
+        else:
+            combinaciones, grupo = np.zeros((1, 0), dtype = np.intp), np.zeros(self.n, dtype = np.intp)
+        self.combinaciones = combinaciones
+        self.indices = [np.flatnonzero(grupo.ravel() == g) for g in range(len(combinaciones))]
+        self.arboles = [cKDTree(self.X[idx]) for idx in self.indices]
+
+    def diferencias(self, a, b):
+        return int(np.sum(self.combinaciones[a] != self.combinaciones[b]))
+
+
+def grafo_gower(datos, eps, numericas = NUMERICAS, categoricas = CATEGORICAS):
+    """Matriz dispersa (CSR) con las distancias de Gower menores o iguales a `eps`.
+
+    Incluye la diagonal y las distancias cero como entradas explícitas, de modo
+    que `DBSCAN(metric='precomputed')` encuentra las mismas vecindades que con
+    la matriz completa.
+    """
+    g = _Gower(datos, numericas, categoricas)
+    filas, columnas, valores = [], [], []
+    for a, b in itertools.combinations_with_replacement(range(len(g.arboles)), 2):
+        m = g.diferencias(a, b)
+        radio = eps * g.p - m
+        if radio < 0:
+            continue
+        pares = g.arboles[a].sparse_distance_matrix(g.arboles[b], radio * (1 + 1e-9), p = 1,
+                                                    output_type = "ndarray")
+        d = (pares["v"] + m) / g.p
+        dentro = d <= eps
+        i = g.indices[a][pares["i"][dentro]]
+        j = g.indices[b][pares["j"][dentro]]
+        d = d[dentro]
+        filas.append(i)
+        columnas.append(j)
+        valores.append(d)
+        if a != b:
+            filas.append(j)
+            columnas.append(i)
+            valores.append(d)
+    filas = np.concatenate(filas)
+    columnas = np.concatenate(columnas)
+    valores = np.concatenate(valores)
+    # Se arma el CSR directamente para conservar las distancias cero
+    orden = np.lexsort((columnas, filas))
+    indptr = np.zeros(g.n + 1, dtype = np.int64)
+    np.cumsum(np.bincount(filas, minlength = g.n), out = indptr[1:])
+    return sparse.csr_matrix((valores[orden], columnas[orden], indptr), shape = (g.n, g.n))
+
+
+def k_distancias(datos, k = 5, numericas = NUMERICAS, categoricas = CATEGORICAS,
+                 tamano_bloque = TAMANO_BLOQUE):
+    """Distancia de Gower de cada cliente a su k-ésimo vecino más cercano.
+
+    Como `NearestNeighbors(n_neighbors=k).kneighbors(X)[0][:, k - 1]` en el
+    taller, el propio cliente cuenta como primer vecino.
+    """
+    g = _Gower(datos, numericas, categoricas)
+    resultado = np.empty(g.n)
+    for a, idx_a in enumerate(g.indices):
+        for inicio in range(0, len(idx_a), tamano_bloque):
+            filas = idx_a[inicio:inicio + tamano_bloque]
+            candidatas = []
+            for b, arbol in enumerate(g.arboles):
+                k_b = min(k, arbol.n)
+                d, _ = arbol.query(g.X[filas], k = k_b, p = 1)
+                candidatas.append((d.reshape(len(filas), k_b) + g.diferencias(a, b)) / g.p)
+            candidatas = np.hstack(candidatas)
+            resultado[filas] = np.partition(candidatas, k - 1, axis = 1)[:, k - 1]
+    return resultado
+
+
+def graficar_k_distancias(distancias, eps = None, k = 5):
+    """Curva de k-distancias ordenadas, como en la sección 4 del taller."""
+    plt.figure(figsize=(8, 6))
+    plt.plot(np.sort(distancias))
+    if eps is not None:
+        plt.axhline(y=eps, color='r', linestyle='--')
+    plt.xlabel("Puntos ordenados (por distancia)")
+    plt.ylabel(f"Distancia de Gower al vecino {k} más cercano")
+    plt.title("Gráfico de K-Distancias para la Selección de eps en DBSCAN")
+    plt.show()
+
+
+def dbscan_gower(datos, eps = 0.5, min_samples = 5, numericas = NUMERICAS,
+                 categoricas = CATEGORICAS, n_jobs = None):
+    """Etiquetas de `DBSCAN` con distancia de Gower (-1 para ruido).
+
+    Si `datos` no tiene `Grupo_Etario` se construye a partir de `Edad`.
+    """
+    if "Grupo_Etario" in categoricas and "Grupo_Etario" not in datos.columns:
+        datos = agregar_grupo_etario(datos)
+    grafo = grafo_gower(datos, eps, numericas, categoricas)
+    modelo = DBSCAN(eps = eps, min_samples = min_samples, metric = 'precomputed', n_jobs = n_jobs)
+    return modelo.fit(grafo).labels_
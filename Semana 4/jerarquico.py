@@ -0,0 +1,225 @@
+# coding: utf-8
+
+"""Clustering jerárquico de Ward con el árbol calculado una sola vez.
+
+En la sección 4 del taller se llama `linkage(X_scaled, method='ward')` para el
+dendrograma, otra vez antes de `fcluster` y luego se ajusta
+`AgglomerativeClustering(n_clusters=5, linkage='ward')`, que vuelve a
+construir el mismo árbol. Cada llamada usa O(n²) memoria. `Jerarquico`
+calcula la matriz de enlace una vez y la reutiliza para el dendrograma y para
+los cortes por número de clusters o por distancia.
+
+Con `n_micro` se activa el modo escalable: los datos se resumen primero en
+micro-clusters (k-means mini-batch o BIRCH), el árbol de Ward se construye
+sobre los centroides ponderados por su tamaño, restringido a un grafo de
+vecinos más cercanos (`connectivity`), y cada observación recibe la etiqueta
+de su micro-cluster. Así la segmentación de Ward funciona con millones de
+filas y la memoria depende de `n_micro`, no de n.
+"""
+
+import heapq
+
+import matplotlib.pyplot as plt
+import numpy as np
+from scipy.cluster.hierarchy import dendrogram, fcluster, linkage
+from sklearn.cluster import Birch, MiniBatchKMeans
+from sklearn.neighbors import kneighbors_graph
+
+
+def _medias(X, etiquetas, m):
+    conteos = np.bincount(etiquetas, minlength = m).astype(np.float64)
+    medias = np.empty((m, X.shape[1]))
+    for j in range(X.shape[1]):
+        medias[:, j] = np.bincount(etiquetas, weights = X[:, j], minlength = m)
+    usados = conteos > 0
+    return medias[usados] / conteos[usados, None], conteos[usados], np.cumsum(usados) - 1
+
+
+def ward_ponderado(centroides, pesos, conectividad = None):
+    """Matriz de enlace de Ward (formato de `scipy`) para centroides con pesos.
+
+    El costo de unir A y B es el aumento de la varianza intra cluster,
+    n_A·n_B/(n_A + n_B)·‖c_A − c_B‖², y la altura es sqrt(2·costo), la misma
+    escala que `linkage(..., method='ward')`; la cuarta columna cuenta hojas
+    (micro-clusters), como exige `scipy`. Con pesos unitarios y sin
+    `conectividad` se obtiene el mismo árbol que `scipy`. `conectividad` es una
+    matriz dispersa (m, m): sólo se unen clusters conectados; si el grafo tiene
+    varias componentes, al final se unen entre sí sin restricción.
+    """
+    m = len(centroides)
+    total = 2 * m - 1
+    centros = np.empty((total, centroides.shape[1]))
+    centros[:m] = centroides
+    tamanos = np.empty(total)
+    tamanos[:m] = pesos
+    hojas = np.ones(total)
+    activo = np.zeros(total, dtype = bool)
+    activo[:m] = True
+    vecinos = [set() for _ in range(total)]
+
+    def costo(a, b):
+        d = centros[a] - centros[b]
+        return tamanos[a] * tamanos[b] / (tamanos[a] + tamanos[b]) * (d @ d)
+
+    monticulo = []
+    if conectividad is None:
+        pares = zip(*np.triu_indices(m, 1))
+    else:
+        conectividad = conectividad.tocoo()
+        pares = ((a, b) for a, b in zip(conectividad.row, conectividad.col) if a < b)
+    for a, b in pares:
+        vecinos[a].add(b)
+        vecinos[b].add(a)
+    # Costos iniciales en bloque: se usan las aristas ya registradas
+    for a in range(m):
+        if vecinos[a]:
+            otros = np.fromiter((b for b in vecinos[a] if b > a), dtype = np.intp)
+            if len(otros):
+                d = centros[otros] - centros[a]
+                c = tamanos[a] * tamanos[otros] / (tamanos[a] + tamanos[otros]) * np.einsum("ij,ij->i", d, d)
+                monticulo.extend(zip(c.tolist(), [a] * len(otros), otros.tolist()))
+    heapq.heapify(monticulo)
+
+    Z = np.empty((m - 1, 4))
+    for nuevo in range(m, total):
+        while monticulo and not (activo[monticulo[0][1]] and activo[monticulo[0][2]]):
+            heapq.heappop(monticulo)
+        if not monticulo:
+            # Grafo no conexo: se conectan todos los clusters activos restantes
+            restantes = np.flatnonzero(activo)
+            for i, a in enumerate(restantes):
+                for b in restantes[i + 1:]:
+                    vecinos[a].add(b)
+                    vecinos[b].add(a)
+                    monticulo.append((costo(a, b), a, b))
+            heapq.heapify(monticulo)
+        c, a, b = heapq.heappop(monticulo)
+        activo[a] = activo[b] = False
+        activo[nuevo] = True
+        tamanos[nuevo] = tamanos[a] + tamanos[b]
+        centros[nuevo] = (tamanos[a] * centros[a] + tamanos[b] * centros[b]) / tamanos[nuevo]
+        hojas[nuevo] = hojas[a] + hojas[b]
+        Z[nuevo - m] = (a, b, np.sqrt(2 * c), hojas[nuevo])
+        union = (vecinos[a] | vecinos[b]) - {a, b}
+        vecinos[a] = vecinos[b] = None
+        for v in union:
+            if activo[v]:
+                vecinos[v].discard(a)
+                vecinos[v].discard(b)
+                vecinos[v].add(nuevo)
+                vecinos[nuevo].add(v)
+                heapq.heappush(monticulo, (costo(v, nuevo), v, nuevo))
+    return Z
+
+
+def _numerar_como_sklearn(Z, hojas):
+    """Renumera las etiquetas de `fcluster` (1..K) en el orden de `AgglomerativeClustering` (más 1).
+
+    `AgglomerativeClustering` baja desde la raíz con un montículo de nodos
+    (`_hc_cut`) y numera los K subárboles en el orden en que quedan en él.
+    """
+    n = len(Z) + 1
+    k = len(np.unique(hojas))
+    nodos = [-(2 * n - 2)]
+    for _ in range(k - 1):
+        a, b = Z[-nodos[0] - n, :2].astype(np.intp)
+        heapq.heappush(nodos, -a)
+        heapq.heappushpop(nodos, -b)
+    nuevas = np.empty(k + 1, dtype = hojas.dtype)
+    for i, nodo in enumerate(nodos):
+        # Cualquier hoja del subárbol sirve para saber qué etiqueta de `fcluster` le tocó
+        nodo = -nodo
+        while nodo >= n:
+            nodo = int(Z[nodo - n, 0])
+        nuevas[hojas[nodo]] = i + 1
+    return nuevas[hojas]
+
+
+class Jerarquico:
+    """Clustering jerárquico de Ward con el árbol en caché.
+
+    Parámetros
+    ----------
+    n_micro : `None` para el árbol exacto sobre todas las observaciones; un
+        entero para resumir primero los datos en ese número de micro-clusters.
+    resumen : "kmeans" (`MiniBatchKMeans` con `n_micro` clusters) o "birch"
+        (`Birch` con umbral `umbral_birch`; `n_micro` se ignora).
+    vecinos : tamaño del grafo de k vecinos entre micro-clusters usado como
+        restricción de conectividad (`None` para no restringir).
+    metodo : método de `linkage` en el modo exacto.
+    tamano_muestra : observaciones con las que se ajusta el resumen con k-means;
+        luego todas se asignan a su micro-cluster más cercano.
+    semilla : semilla del resumen con k-means.
+    """
+
+    def __init__(self, n_micro = None, resumen = "kmeans", vecinos = 10, metodo = "ward",
+                 umbral_birch = 0.1, tamano_muestra = 200_000, semilla = 123):
+        self.n_micro = n_micro
+        self.resumen = resumen
+        self.vecinos = vecinos
+        self.metodo = metodo
+        self.umbral_birch = umbral_birch
+        self.tamano_muestra = tamano_muestra
+        self.semilla = semilla
+
+    def fit(self, X):
+        X = np.ascontiguousarray(X, dtype = np.float64)
+        if self.n_micro is None and self.resumen != "birch":
+            self.Z_ = linkage(X, method = self.metodo, metric = 'euclidean')
+            self.asignacion_ = np.arange(len(X))
+            self.centroides_, self.pesos_ = X, np.ones(len(X))
+            return self
+        if self.metodo != "ward":
+            raise ValueError("El modo con micro-clusters sólo admite metodo='ward'")
+        if self.resumen == "kmeans":
+            modelo = MiniBatchKMeans(n_clusters = self.n_micro, random_state = self.semilla,
+                                     batch_size = 4096, n_init = 1)
+            rng = np.random.default_rng(self.semilla)
+            muestra = rng.choice(len(X), min(self.tamano_muestra, len(X)), replace = False)
+            asignacion = modelo.fit(X[muestra]).predict(X)
+            m = self.n_micro
+        elif self.resumen == "birch":
+            modelo = Birch(threshold = self.umbral_birch, n_clusters = None).fit(X)
+            asignacion = modelo.labels_
+            m = len(modelo.subcluster_centers_)
+        else:
+            raise ValueError("resumen debe ser 'kmeans' o 'birch'")
+        # Los centros se recalculan como medias exactas de sus observaciones
+        self.centroides_, self.pesos_, reindice = _medias(X, asignacion, m)
+        self.asignacion_ = reindice[asignacion]
+        conectividad = None
+        if self.vecinos is not None and len(self.centroides_) > self.vecinos + 1:
+            conectividad = kneighbors_graph(self.centroides_, self.vecinos, include_self = False)
+            conectividad = conectividad + conectividad.T
+        self.Z_ = ward_ponderado(self.centroides_, self.pesos_, conectividad)
+        return self
+
+    def etiquetas(self, n_clusters = None, distancia = None):
+        """Etiquetas (de 1 a K) de todas las observaciones para un corte del árbol.
+
+        Se indica `n_clusters` (como `AgglomerativeClustering`) o `distancia`
+        (como `fcluster(Z, t, criterion='distance')`). Los clusters se numeran
+        como en `AgglomerativeClustering`: la etiqueta menos 1 es su `labels_`.
+        """
+        if (n_clusters is None) == (distancia is None):
+            raise ValueError("Indique n_clusters o distancia")
+        if n_clusters is not None:
+            hojas = fcluster(self.Z_, t = n_clusters, criterion = 'maxclust')
+        else:
+            hojas = fcluster(self.Z_, t = distancia, criterion = 'distance')
+        return _numerar_como_sklearn(self.Z_, hojas)[self.asignacion_]
+
+    def fit_predict(self, X, n_clusters = None, distancia = None):
+        return self.fit(X).etiquetas(n_clusters, distancia)
+
+    def dendrograma(self, p = 12, linea = None, **kwargs):
+        """Dendrograma truncado con el formato del taller; `linea` dibuja un corte."""
+        plt.figure(figsize=(8, 5))
+        dendrogram(self.Z_, truncate_mode='lastp', p=p, leaf_rotation=45., leaf_font_size=12.,
+                   show_contracted=True, **kwargs)
+        if linea is not None:
+            plt.axhline(y=linea, color='r', linestyle='--')
+        plt.title('Dendrograma de Clustering Jerárquico')
+        plt.xlabel('Número de Clientes')
+        plt.ylabel('Distancia Euclidiana')
+        plt.show()
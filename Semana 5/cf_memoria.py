@@ -0,0 +1,146 @@
+# coding: utf-8
+
+"""Predicción por lotes para los modelos de filtrado colaborativo de memoria.
+
+En `S5_LSC3_Colab`, `rmse_recom(cf_model)` llama a `cf_user_mean`,
+`cf_user_wmean` o `cf_gen_occ` una vez por cada par (usuario, película) de la
+base de prueba, y cada llamada busca columnas en pandas (`r_matrix[movie_id]`,
+`cosine_sim[user_id]`, `users.loc[...]`). Aquí cada modelo tiene un método
+`predict(usuarios, items)` que recibe arreglos y calcula todas las
+predicciones a la vez:
+
+- `MediaItem`: promedio de cada película, precalculado con `np.bincount`;
+- `MediaPonderada`: media ponderada por similitud de coseno entre usuarios,
+  con la matriz de ratings dispersa y productos elemento a elemento entre
+  las filas de similitud y las columnas de ratings de cada par;
+- `MediaGrupo`: promedio por película y grupo (ocupación y género), buscado
+  con índices enteros en lugar de `gen_occ_mean.loc[...]`.
+
+`rmse_recom` evalúa la base de prueba completa en una pasada o por bloques de
+`tamano_bloque` pares para bases más grandes.
+"""
+
+import numpy as np
+import pandas as pd
+
+from lastfm import matriz_dispersa, vecinos_coseno
+
+# Valor que el cuaderno asigna cuando no hay información
+POR_DEFECTO = 3.0
+
+
+class _ModeloLotes:
+    # `predict` por bloques de pares; cada modelo implementa `_predecir`
+    def predict(self, usuarios, items, tamano_bloque = None):
+        """Predicciones para los pares (usuarios[i], items[i])."""
+        usuarios = np.asarray(usuarios)
+        items = np.asarray(items)
+        if tamano_bloque is None:
+            return self._predecir(usuarios, items)
+        resultado = np.empty(len(usuarios))
+        for inicio in range(0, len(usuarios), tamano_bloque):
+            fin = inicio + tamano_bloque
+            resultado[inicio:fin] = self._predecir(usuarios[inicio:fin], items[inicio:fin])
+        return resultado
+
+
+class MediaItem(_ModeloLotes):
+    """Promedio de los ratings de cada ítem (`cf_user_mean`)."""
+
+    def __init__(self, ratings, usuario = 'user_id', item = 'movie_id', valor = 'rating',
+                 por_defecto = POR_DEFECTO):
+        codigos, self.items = pd.factorize(ratings[item], sort = True)
+        suma = np.bincount(codigos, weights = ratings[valor].to_numpy(dtype = np.float64))
+        self.medias = suma / np.bincount(codigos)
+        self.por_defecto = por_defecto
+
+    def _predecir(self, usuarios, items):
+        j = self.items.get_indexer(items)
+        return np.where(j >= 0, self.medias[j], self.por_defecto)
+
+
+class MediaPonderada(_ModeloLotes):
+    """Media de los ratings de cada ítem ponderada por la similitud de coseno entre usuarios.
+
+    Con `k=None` usa todas las similitudes, como `cf_user_wmean`; con un entero
+    sólo los k usuarios más parecidos (ver `lastfm.vecinos_coseno`).
+    """
+
+    def __init__(self, ratings, usuario = 'user_id', item = 'movie_id', valor = 'rating',
+                 por_defecto = POR_DEFECTO, k = None):
+        R, usuarios, items = matriz_dispersa(ratings, usuario, item, valor)
+        self.usuarios = pd.Index(usuarios)
+        self.items = pd.Index(items)
+        self.similitud = vecinos_coseno(R, k)
+        # Columnas de ratings (y de indicadores de rating) como filas para el producto por pares
+        self.ratings_item = R.T.tocsr()
+        self.indicador_item = self.ratings_item.copy()
+        self.indicador_item.data[:] = 1
+        self.por_defecto = por_defecto
+
+    def _predecir(self, usuarios, items):
+        i = self.usuarios.get_indexer(usuarios)
+        j = self.items.get_indexer(items)
+        resultado = np.full(len(i), self.por_defecto)
+        validos = np.flatnonzero((i >= 0) & (j >= 0))
+        if len(validos) == 0:
+            return resultado
+        S = self.similitud[i[validos]]
+        numerador = np.asarray(S.multiply(self.ratings_item[j[validos]]).sum(axis = 1)).ravel()
+        denominador = np.asarray(S.multiply(self.indicador_item[j[validos]]).sum(axis = 1)).ravel()
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            resultado[validos] = np.where(denominador != 0, numerador / denominador, self.por_defecto)
+        return resultado
+
+
+class MediaGrupo(_ModeloLotes):
+    """Promedio de cada ítem dentro del grupo del usuario (`cf_gen_occ`).
+
+    `users` tiene una fila por usuario (índice o columna `usuario`) con las
+    columnas de `grupos`; el promedio se calcula con los ratings de `ratings`.
+    """
+
+    def __init__(self, ratings, users, grupos = ('ocupacion', 'genero'), usuario = 'user_id',
+                 item = 'movie_id', valor = 'rating', por_defecto = POR_DEFECTO):
+        if usuario in users.columns:
+            users = users.set_index(usuario)
+        grupos = list(grupos)
+        codigos_grupo, _ = pd.MultiIndex.from_frame(users[grupos]).factorize()
+        self.grupo_usuario = pd.Series(codigos_grupo, index = users.index)
+        self.n_grupos = codigos_grupo.max() + 1
+        g = self.grupo_usuario.reindex(ratings[usuario]).to_numpy()
+        codigos_item, self.items = pd.factorize(ratings[item], sort = True)
+        conocidos = ~np.isnan(g)
+        clave = codigos_item[conocidos] * self.n_grupos + g[conocidos].astype(np.int64)
+        tamano = len(self.items) * self.n_grupos
+        valores = ratings[valor].to_numpy(dtype = np.float64)[conocidos]
+        conteos = np.bincount(clave, minlength = tamano)
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            self.medias = np.bincount(clave, weights = valores, minlength = tamano) / conteos
+        self.por_defecto = por_defecto
+
+    def _predecir(self, usuarios, items):
+        g = self.grupo_usuario.reindex(usuarios).to_numpy()
+        j = self.items.get_indexer(items)
+        validos = (j >= 0) & ~np.isnan(g)
+        media = np.full(len(j), np.nan)
+        media[validos] = self.medias[j[validos] * self.n_grupos + g[validos].astype(np.int64)]
+        return np.where(np.isnan(media), self.por_defecto, media)
+
+
+def rmse_recom(cf_model, X_test, usuario = 'user_id', item = 'movie_id', valor = 'rating',
+               tamano_bloque = None):
+    """Raíz del error cuadrático medio de un modelo sobre la base de prueba.
+
+    `cf_model` puede ser uno de los modelos de este módulo (se usa `predict`
+    sobre todos los pares) o una función `cf_model(usuario, item)` como en el
+    cuaderno, que se evalúa par por par.
+    """
+    usuarios = X_test[usuario].to_numpy()
+    items = X_test[item].to_numpy()
+    if hasattr(cf_model, "predict"):
+        y_pred = cf_model.predict(usuarios, items, tamano_bloque = tamano_bloque)
+    else:
+        y_pred = np.array([cf_model(u, i) for u, i in zip(usuarios, items)])
+    y_true = X_test[valor].to_numpy(dtype = np.float64)
+    return np.sqrt(np.mean((y_true - y_pred) ** 2))
@@ -0,0 +1,142 @@
+# coding: utf-8
+
+"""Recomendador colaborativo de Last.fm sobre una matriz dispersa usuario-artista.
+
+En `S5_LC_Taller_Colab_Grupal` la tabla `user_artists.dat` se pivotea a una
+matriz densa de ~1.900 usuarios × ~17.600 artistas, se rellena con ceros, se
+calcula la similitud de coseno densa entre todos los usuarios y luego
+`cf_user_wmean` recorre artista por artista con pandas. Casi toda esa memoria
+son ceros. Aquí:
+
+- los identificadores de usuarios y artistas se codifican como enteros y las
+  reproducciones se guardan en una matriz CSR, cuya memoria es proporcional al
+  número de interacciones;
+- `vecinos_coseno` calcula por bloques de filas los k usuarios más parecidos
+  a cada usuario y guarda sólo esas similitudes (nunca la matriz completa);
+- `RecomendadorVecinos.recomendar` calcula la media ponderada de
+  `cf_user_wmean` para todos los artistas a la vez con dos productos
+  dispersos y devuelve los N mejores que el usuario no ha escuchado.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+CARPETA = Path(__file__).resolve().parent
+
+# Filas de usuarios procesadas a la vez al buscar vecinos
+TAMANO_BLOQUE = 1024
+
+
+def cargar(carpeta = CARPETA):
+    """`user_artists` y `artists` con los nombres de columnas del taller."""
+    carpeta = Path(carpeta)
+    artists = pd.read_csv(carpeta / 'artists.dat', delimiter='\t')
+    artists = artists[['id', 'name']].rename(columns={'id': 'artistID', 'name': 'artistname'})
+    user_artists = pd.read_csv(carpeta / 'user_artists.dat', delimiter='\t')
+    user_artists = user_artists.rename(columns={'weight': 'nro_reproducciones'})
+    return user_artists, artists
+
+
+def matriz_dispersa(user_artists, usuario = 'userID', artista = 'artistID', valor = 'nro_reproducciones'):
+    """Matriz CSR usuarios × artistas y los identificadores de cada fila y columna.
+
+    Devuelve `(R, usuarios, artistas)`: `R[i, j]` son las reproducciones del
+    usuario `usuarios[i]` al artista `artistas[j]`.
+    """
+    codigos_u, usuarios = pd.factorize(user_artists[usuario], sort = True)
+    codigos_a, artistas = pd.factorize(user_artists[artista], sort = True)
+    R = sparse.csr_matrix((user_artists[valor].to_numpy(dtype = np.float64), (codigos_u, codigos_a)),
+                          shape = (len(usuarios), len(artistas)))
+    R.sum_duplicates()
+    return R, np.asarray(usuarios), np.asarray(artistas)
+
+
+def _normalizar_filas(R):
+    normas = np.sqrt(np.asarray(R.multiply(R).sum(axis = 1)).ravel())
+    normas[normas == 0] = 1
+    return sparse.diags(1 / normas) @ R
+
+
+def vecinos_coseno(R, k = 50, incluir_propio = True, tamano_bloque = TAMANO_BLOQUE):
+    """Matriz CSR (n × n) con las similitudes de coseno de cada fila a sus k vecinos.
+
+    Las similitudes se calculan por bloques de `tamano_bloque` filas, de modo
+    que la memoria máxima es O(tamano_bloque × n) más O(n × k) para el
+    resultado. Con `incluir_propio` la diagonal (similitud 1) se conserva,
+    como en la matriz `cosine_sim` del taller; `k=None` guarda todas las
+    similitudes no nulas.
+    """
+    Rn = _normalizar_filas(sparse.csr_matrix(R, dtype = np.float64))
+    RnT = Rn.T.tocsc()
+    n = Rn.shape[0]
+    filas, columnas, valores = [], [], []
+    for inicio in range(0, n, tamano_bloque):
+        fin = min(inicio + tamano_bloque, n)
+        S = (Rn[inicio:fin] @ RnT).toarray()
+        locales = np.arange(fin - inicio)
+        if not incluir_propio:
+            S[locales, locales + inicio] = 0
+        if k is not None and k < n:
+            mejores = np.argpartition(-S, k - 1, axis = 1)[:, :k]
+        else:
+            mejores = np.broadcast_to(np.arange(n), S.shape)
+        sim = S[locales[:, None], mejores]
+        guardar = sim != 0
+        filas.append(np.broadcast_to(locales[:, None] + inicio, mejores.shape)[guardar])
+        columnas.append(mejores[guardar])
+        valores.append(sim[guardar])
+    return sparse.csr_matrix((np.concatenate(valores), (np.concatenate(filas), np.concatenate(columnas))),
+                             shape = (n, n))
+
+
+class RecomendadorVecinos:
+    """Filtrado colaborativo basado en usuarios con un índice de k vecinos.
+
+    Parámetros
+    ----------
+    user_artists : tabla con `userID`, `artistID` y `nro_reproducciones`.
+    k : número de vecinos por usuario (`None` para usar todos, como el taller).
+    artists : tabla opcional con `artistID` y `artistname` para los resultados.
+    """
+
+    def __init__(self, user_artists, k = 50, artists = None, valor = 'nro_reproducciones',
+                 tamano_bloque = TAMANO_BLOQUE):
+        self.R, self.usuarios, self.artistas = matriz_dispersa(user_artists, valor = valor)
+        self.vecinos = vecinos_coseno(self.R, k, tamano_bloque = tamano_bloque)
+        self.escuchados = self.R.copy()
+        self.escuchados.data[:] = 1
+        self.posicion = pd.Series(np.arange(len(self.usuarios)), index = self.usuarios)
+        self.nombres = None
+        if artists is not None:
+            self.nombres = artists.set_index('artistID')['artistname']
+
+    def puntajes(self, usuario):
+        """Media ponderada por similitud de las reproducciones de cada artista.
+
+        Es `cf_user_wmean(usuario, artista)` del taller para todos los artistas,
+        usando sólo a los vecinos del índice; vale 0 para los artistas que
+        ningún vecino escuchó.
+        """
+        i = self.posicion[usuario]
+        sim = self.vecinos[i]
+        numerador = (sim @ self.R).toarray().ravel()
+        denominador = (sim @ self.escuchados).toarray().ravel()
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            return np.where(denominador != 0, numerador / denominador, 0.0)
+
+    def recomendar(self, usuario, n = 10):
+        """Los `n` artistas no escuchados por `usuario` con mayor puntaje."""
+        puntaje = self.puntajes(usuario)
+        i = self.posicion[usuario]
+        escuchados = self.R.indices[self.R.indptr[i]:self.R.indptr[i + 1]]
+        puntaje[escuchados] = -np.inf
+        n = min(n, len(puntaje) - len(escuchados))
+        mejores = np.argpartition(-puntaje, n - 1)[:n]
+        mejores = mejores[np.argsort(-puntaje[mejores], kind = "stable")]
+        resultado = pd.DataFrame({'artistID': self.artistas[mejores], 'score': puntaje[mejores]})
+        if self.nombres is not None:
+            resultado.insert(0, 'artistname', self.nombres.reindex(resultado['artistID']).to_numpy())
+        return resultado
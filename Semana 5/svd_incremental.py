@@ -0,0 +1,175 @@
+# coding: utf-8
+
+"""Recomendador de factores latentes con SVD truncada sobre la matriz dispersa.
+
+En `S5_LSC3_Colab` la matriz de ratings se vuelve densa con
+`pivot(...).fillna(0)`, se le resta el promedio de cada usuario, se calcula
+`svds(A_demeaned, k=50)` y luego se arma la matriz completa
+`A_recomendaciones = U·Σ·Vt` de usuarios × películas. Aquí:
+
+- la matriz de ratings es CSR y el centrado por usuario es implícito: `svds`
+  recibe un `LinearOperator` que calcula (R − μ·1ᵀ)·x sin formar la matriz;
+- las recomendaciones de un usuario se calculan al pedirlas, con
+  U_u·Σ·Vt + μ_u y `np.argpartition`, sin reconstruir la matriz completa;
+- los usuarios nuevos se agregan proyectándolos sobre la base existente
+  (fold-in) o con la actualización de rango k de Brand (2006), que también
+  ajusta Σ y Vt; los usuarios que califican películas nuevas se vuelven a
+  proyectar con sus ratings actualizados.
+
+Con los mismos datos, `RecomendadorSVD` reproduce los puntajes de
+`A_recomendaciones` del cuaderno.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.linalg import LinearOperator, svds
+
+from lastfm import matriz_dispersa
+
+
+def _operador_centrado(R, medias):
+    # (R − μ·1ᵀ) como operador lineal, sin formar la matriz densa
+    unos = np.ones(R.shape[1])
+
+    def matvec(x):
+        x = np.asarray(x).reshape(R.shape[1], -1)
+        return R @ x - np.outer(medias, unos @ x)
+
+    def rmatvec(y):
+        y = np.asarray(y).reshape(R.shape[0], -1)
+        return R.T @ y - np.outer(unos, medias @ y)
+
+    return LinearOperator(R.shape, matvec = matvec, rmatvec = rmatvec,
+                          matmat = matvec, rmatmat = rmatvec, dtype = np.float64)
+
+
+class RecomendadorSVD:
+    """SVD truncada de la matriz de ratings centrada por usuario.
+
+    Parámetros
+    ----------
+    ratings : tabla con una fila por rating.
+    k : número de factores latentes (como `svds(A_demeaned, k=50)`).
+    usuario, item, valor : nombres de las columnas de `ratings`.
+    semilla : semilla del vector inicial de `svds`.
+    """
+
+    def __init__(self, ratings, k = 50, usuario = 'user_id', item = 'movie_id', valor = 'rating',
+                 semilla = 123):
+        self.columnas = (usuario, item, valor)
+        self.R, usuarios, items = matriz_dispersa(ratings, usuario, item, valor)
+        self.R = self.R.tolil()
+        self.usuarios = pd.Index(usuarios)
+        self.items = pd.Index(items)
+        n_items = len(items)
+        R = self.R.tocsr()
+        # Como `np.mean(A, axis=1)` del cuaderno: los ratings faltantes cuentan como 0
+        self.medias = np.asarray(R.sum(axis = 1)).ravel() / n_items
+        v0 = np.random.default_rng(semilla).standard_normal(min(R.shape))
+        U, sigma, Vt = svds(_operador_centrado(R, self.medias), k = k, v0 = v0)
+        orden = np.argsort(-sigma)
+        self.U, self.sigma, self.Vt = U[:, orden], sigma[orden], Vt[orden]
+
+    def _fila(self, tabla):
+        # Vector disperso (1 × items) con los ratings de una tabla; se ignoran ítems desconocidos
+        _, item, valor = self.columnas
+        j = self.items.get_indexer(tabla[item])
+        conocidos = j >= 0
+        return sparse.csr_matrix((tabla[valor].to_numpy(dtype = np.float64)[conocidos],
+                                  (np.zeros(conocidos.sum(), dtype = np.intp), j[conocidos])),
+                                 shape = (1, len(self.items)))
+
+    def _proyectar(self, filas):
+        # Fold-in: u = (r − μ)·V·Σ⁻¹
+        medias = np.asarray(filas.sum(axis = 1)).ravel() / len(self.items)
+        centrado = filas @ self.Vt.T - np.outer(medias, self.Vt.sum(axis = 1))
+        return centrado / self.sigma, medias
+
+    def puntajes(self, usuario):
+        """Rating predicho de `usuario` para todos los ítems: U_u·Σ·Vt + μ_u."""
+        i = self.usuarios.get_loc(usuario)
+        return (self.U[i] * self.sigma) @ self.Vt + self.medias[i]
+
+    def predict(self, usuarios, items):
+        """Rating predicho para cada par (usuarios[i], items[i]) sin reconstruir la matriz."""
+        i = self.usuarios.get_indexer(usuarios)
+        j = self.items.get_indexer(items)
+        if (i < 0).any() or (j < 0).any():
+            raise KeyError("Hay usuarios o ítems que no están en el modelo")
+        return np.einsum("ij,ij->i", self.U[i] * self.sigma, self.Vt[:, j].T) + self.medias[i]
+
+    def recomendar(self, usuario, n = 10, movies = None):
+        """Los `n` ítems no calificados por `usuario` con mayor rating predicho.
+
+        Si se pasa `movies` (con la columna del ítem) se agregan sus columnas.
+        """
+        _, item, _ = self.columnas
+        puntaje = self.puntajes(usuario)
+        vistos = self.R.rows[self.usuarios.get_loc(usuario)]
+        puntaje[vistos] = -np.inf
+        n = min(n, len(puntaje) - len(vistos))
+        mejores = np.argpartition(-puntaje, n - 1)[:n]
+        mejores = mejores[np.argsort(-puntaje[mejores], kind = "stable")]
+        resultado = pd.DataFrame({item: self.items[mejores], 'Predictions': puntaje[mejores]})
+        if movies is not None:
+            resultado = resultado.merge(movies, how = 'left', on = item)
+        return resultado
+
+    def agregar_ratings(self, nuevos, metodo = "fold-in"):
+        """Incorpora ratings nuevos sin recalcular la SVD.
+
+        Los usuarios ya conocidos se vuelven a proyectar con todos sus ratings
+        (fold-in). Los usuarios nuevos se proyectan sobre la base actual
+        (`metodo="fold-in"`) o se agregan con la actualización de Brand
+        (`metodo="brand"`), que también actualiza Σ y Vt. Los ítems que no
+        están en el modelo se ignoran.
+        """
+        usuario, _, _ = self.columnas
+        conocidos = nuevos[nuevos[usuario].isin(self.usuarios)]
+        for u, tabla in conocidos.groupby(usuario):
+            i = self.usuarios.get_loc(u)
+            fila = self._fila(tabla)
+            self.R[i, fila.indices] = fila.data
+        if len(conocidos):
+            posiciones = self.usuarios.get_indexer(conocidos[usuario].unique())
+            self.U[posiciones], self.medias[posiciones] = self._proyectar(self.R[posiciones].tocsr())
+
+        nuevos = nuevos[~nuevos[usuario].isin(self.usuarios)]
+        if len(nuevos) == 0:
+            return self
+        ids = nuevos[usuario].unique()
+        filas = sparse.vstack([self._fila(t) for _, t in nuevos.groupby(usuario, sort = False)]).tocsr()
+        if metodo == "fold-in":
+            U_nuevos, medias = self._proyectar(filas)
+            self.U = np.vstack([self.U, U_nuevos])
+        elif metodo == "brand":
+            medias = self._brand(filas)
+        else:
+            raise ValueError("metodo debe ser 'fold-in' o 'brand'")
+        self.R = sparse.vstack([self.R, filas]).tolil()
+        self.usuarios = self.usuarios.append(pd.Index(ids))
+        self.medias = np.concatenate([self.medias, medias])
+        return self
+
+    def _brand(self, filas):
+        # Actualización de rango k de Brand para agregar filas C a A ≈ U·Σ·Vt
+        medias = np.asarray(filas.sum(axis = 1)).ravel() / len(self.items)
+        C = filas.toarray() - medias[:, None]
+        L = C @ self.Vt.T
+        H = C - L @ self.Vt
+        J, K = np.linalg.qr(H.T)
+        k, c = len(self.sigma), C.shape[0]
+        medio = np.zeros((k + c, k + J.shape[1]))
+        medio[:k, :k] = np.diag(self.sigma)
+        medio[k:, :k] = L
+        medio[k:, k:] = K.T
+        Um, sigma, Vtm = np.linalg.svd(medio, full_matrices = False)
+        Um, sigma, Vtm = Um[:, :k], sigma[:k], Vtm[:k]
+        U_ampliada = np.zeros((self.U.shape[0] + c, k + c))
+        U_ampliada[:self.U.shape[0], :k] = self.U
+        U_ampliada[self.U.shape[0]:, k:] = np.eye(c)
+        self.U = U_ampliada @ Um
+        self.Vt = Vtm @ np.vstack([self.Vt, J.T])
+        self.sigma = sigma
+        return medias
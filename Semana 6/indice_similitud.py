@@ -0,0 +1,125 @@
+# coding: utf-8
+
+"""Índice de vecinos más parecidos para el recomendador basado en contenido.
+
+En `S6_LSC2_Content` se calcula la matriz densa `linear_kernel(tfidf_matrix,
+tfidf_matrix)` (y `cosine_similarity(count_matrix, count_matrix)` para los
+metadatos) de todos los títulos contra todos, y `recomendador` arma en cada
+llamada la serie título → índice y ordena la fila completa con `sorted`. Con
+10⁵ títulos esa matriz ocupa 80 GB. `IndiceSimilitud`:
+
+- recibe las matrices dispersas (TF-IDF de la sinopsis, conteos de los
+  metadatos, ...) y normaliza sus filas, de modo que el producto punto es la
+  similitud de coseno;
+- combina las similitudes de cada matriz con pesos (modelo híbrido);
+- calcula las similitudes por bloques de filas y guarda sólo los k vecinos
+  más parecidos de cada título, elegidos con `np.argpartition`;
+- se guarda y se carga de un archivo `.npz`.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+# Elementos de la matriz densa de similitudes que se forman a la vez (≈ 160 MB en float64)
+PRESUPUESTO_BLOQUE = 20_000_000
+
+
+def vista_tfidf(matriz, vectorizador, filas = 5):
+    """Primeras `filas` de una matriz TF-IDF como `DataFrame` con el vocabulario.
+
+    Reemplaza `pd.DataFrame(tfidf_matrix.toarray(), ...)`: sólo se densifican
+    las filas que se muestran, no la matriz completa.
+    """
+    return pd.DataFrame(matriz[:filas].toarray(), columns = vectorizador.get_feature_names_out())
+
+
+class IndiceSimilitud:
+    """Los k títulos más parecidos a cada título según una similitud de coseno híbrida.
+
+    Parámetros
+    ----------
+    titulos : títulos en el orden de las filas de las matrices.
+    matrices : diccionario {nombre: matriz (títulos × términos)}, p. ej.
+        {"sinopsis": tfidf_matrix, "metadatos": count_matrix}.
+    pesos : diccionario {nombre: peso}; por defecto todos iguales y suman 1.
+    k : vecinos guardados por título (sin contar al propio título).
+    """
+
+    def __init__(self, titulos, matrices, pesos = None, k = 50, presupuesto_bloque = PRESUPUESTO_BLOQUE):
+        self.titulos = np.asarray(titulos, dtype = str)
+        if pesos is None:
+            pesos = {nombre: 1 / len(matrices) for nombre in matrices}
+        self.pesos = dict(pesos)
+        normalizadas = {nombre: normalize(sparse.csr_matrix(m, dtype = np.float64)) for nombre, m in matrices.items()}
+        self.vecinos = self._construir(normalizadas, k, presupuesto_bloque)
+        self._posiciones()
+
+    def _posiciones(self):
+        # Primera fila de cada título, calculada una sola vez
+        self.posicion = pd.Series(np.arange(len(self.titulos)), index = self.titulos)
+        self.posicion = self.posicion[~self.posicion.index.duplicated()]
+
+    def _construir(self, normalizadas, k, presupuesto_bloque):
+        n = len(self.titulos)
+        k = min(k, n - 1)
+        if k <= 0:
+            # Con un solo título (o k = 0) no hay vecinos que guardar
+            return sparse.csr_matrix((n, n))
+        transpuestas = {nombre: m.T.tocsc() for nombre, m in normalizadas.items()}
+        tamano_bloque = max(1, presupuesto_bloque // max(n, 1))
+        indptr = np.arange(0, n * k + 1, k)
+        indices = np.empty(n * k, dtype = np.int64)
+        datos = np.empty(n * k)
+        for inicio in range(0, n, tamano_bloque):
+            fin = min(inicio + tamano_bloque, n)
+            S = np.zeros((fin - inicio, n))
+            for nombre, m in normalizadas.items():
+                peso = self.pesos.get(nombre, 0)
+                if not peso:
+                    continue
+                if (fin - inicio) * m.shape[1] <= presupuesto_bloque:
+                    # Disperso × denso es más rápido que el producto de dos dispersas cuando el bloque se llena
+                    S += peso * (m @ m[inicio:fin].toarray().T).T
+                else:
+                    S += peso * (m[inicio:fin] @ transpuestas[nombre]).toarray()
+            filas = np.arange(fin - inicio)
+            # El propio título no es su vecino
+            S[filas, filas + inicio] = -np.inf
+            mejores = np.argpartition(-S, k - 1, axis = 1)[:, :k]
+            sim = np.take_along_axis(S, mejores, axis = 1)
+            # Mayor similitud primero y, en empates, el menor índice (como `sorted` en el cuaderno)
+            orden = np.lexsort((mejores, -sim), axis = 1)
+            indices[inicio * k:fin * k] = np.take_along_axis(mejores, orden, axis = 1).ravel()
+            datos[inicio * k:fin * k] = np.take_along_axis(sim, orden, axis = 1).ravel()
+        return sparse.csr_matrix((datos, indices, indptr), shape = (n, n))
+
+    def similares(self, titulo, n = 10):
+        """`DataFrame` con los `n` títulos más parecidos a `titulo` y su similitud."""
+        i = self.posicion[titulo]
+        inicio = self.vecinos.indptr[i]
+        fin = min(inicio + n, self.vecinos.indptr[i + 1])
+        indices = self.vecinos.indices[inicio:fin]
+        return pd.DataFrame({"titulo": self.titulos[indices], "similitud": self.vecinos.data[inicio:fin]},
+                            index = indices)
+
+    def recomendador(self, title, n = 10):
+        """Serie de títulos recomendados, como `recomendador(title)` del cuaderno."""
+        return self.similares(title, n)["titulo"]
+
+    def guardar(self, ruta):
+        np.savez_compressed(ruta, titulos = self.titulos, indptr = self.vecinos.indptr,
+                            indices = self.vecinos.indices, datos = self.vecinos.data,
+                            pesos = np.array(list(self.pesos.items()), dtype = object).astype(str))
+
+    @classmethod
+    def cargar(cls, ruta):
+        archivo = np.load(ruta)
+        indice = cls.__new__(cls)
+        indice.titulos = archivo["titulos"]
+        n = len(indice.titulos)
+        indice.vecinos = sparse.csr_matrix((archivo["datos"], archivo["indices"], archivo["indptr"]), shape = (n, n))
+        indice.pesos = {str(nombre): float(peso) for nombre, peso in archivo["pesos"]}
+        indice._posiciones()
+        return indice
@@ -0,0 +1,157 @@
+# coding: utf-8
+
+"""Lectura de PDF largos por páginas, en paralelo y con memoria acotada.
+
+En `S6_LSC1_NLP` el texto de `acuerdo_final.pdf` se arma con
+`documento += page.extract_text()` (concatenación cuadrática), se limpia con
+cinco pasadas de `re.sub` sobre el documento completo y se procesa con un solo
+`nlp(documento)`, que choca con `nlp.max_length` y guarda en memoria todos los
+tokens; luego se llama otra vez a `nlp` para los lemas. Aquí:
+
+- las páginas se extraen en varios procesos, cada uno con su `PdfReader`, y
+  se entregan en orden con a lo sumo unas pocas tareas en curso;
+- el texto de cada página se corta en oraciones y párrafos (los que quedan
+  incompletos al final de una página siguen en la siguiente) y se agrupan en
+  fragmentos de a lo sumo `max_caracteres`;
+- cada fragmento se normaliza con una sola expresión regular (tildes,
+  signos, números, espacios y minúsculas, como en el cuaderno);
+- los stopwords se quitan con `nlp.tokenizer.pipe` y los lemas salen de
+  `nlp.pipe`, como en `limpieza.py`;
+- `contar_lemas` acumula los conteos fragmento por fragmento, de modo que en
+  memoria sólo hay unas pocas páginas a la vez.
+
+A diferencia de `documento += page.extract_text()`, la última palabra de una
+página no se pega con la primera de la siguiente.
+"""
+
+import os
+import re
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import unidecode
+from PyPDF2 import PdfReader
+
+from limpieza import COMPONENTES_INNECESARIOS
+
+# Páginas extraídas en cada tarea
+PAGINAS_POR_TAREA = 20
+
+# Largo máximo (en caracteres) de los fragmentos que se pasan a spaCy
+MAX_CARACTERES = 5000
+
+_FIN_ORACION = re.compile(r"(?<=[.!?;:])\s+|\n\s*\n")
+# Todo lo que no es letra: los tramos de sólo dígitos se borran y los demás pasan a ser un espacio
+_NO_LETRA = re.compile(r"[^A-Za-z]+")
+
+
+def normalizar(texto):
+    """Los pasos de limpieza del cuaderno en una sola pasada de expresión regular.
+
+    Equivale a `unidecode`, `re.sub('[^A-Za-z0-9 ]+', ' ')`, `re.sub('\\d+', '')`,
+    colapsar espacios, `strip()` y `lower()`.
+    """
+    texto = _NO_LETRA.sub(lambda m: "" if m.group().isdigit() else " ", unidecode.unidecode(texto))
+    return texto.strip().lower()
+
+
+# `PdfReader` de cada proceso, abierto una vez por `_inicializar`
+_LECTOR = None
+
+
+def _inicializar(ruta):
+    global _LECTOR
+    _LECTOR = PdfReader(ruta)
+
+
+def _extraer(inicio, fin, lector = None):
+    lector = _LECTOR if lector is None else lector
+    return [lector.pages[i].extract_text() or "" for i in range(inicio, fin)]
+
+
+def paginas(ruta, n_procesos = None, paginas_por_tarea = PAGINAS_POR_TAREA):
+    """Texto de cada página del PDF, en orden, extraído en `n_procesos` procesos."""
+    lector = PdfReader(ruta)
+    total = len(lector.pages)
+    tareas = [(inicio, min(inicio + paginas_por_tarea, total)) for inicio in range(0, total, paginas_por_tarea)]
+    n_procesos = min(n_procesos or os.cpu_count() or 1, max(len(tareas), 1))
+    if n_procesos <= 1:
+        for inicio, fin in tareas:
+            yield from _extraer(inicio, fin, lector)
+        return
+    with ProcessPoolExecutor(max_workers = n_procesos, initializer = _inicializar,
+                             initargs = (str(ruta),)) as ejecutor:
+        # Como mucho dos tareas por proceso en curso, para no acumular páginas en memoria
+        pendientes = deque()
+        for inicio, fin in tareas:
+            pendientes.append(ejecutor.submit(_extraer, inicio, fin))
+            if len(pendientes) >= 2 * n_procesos:
+                yield from pendientes.popleft().result()
+        while pendientes:
+            yield from pendientes.popleft().result()
+
+
+def _cortar(texto, max_caracteres):
+    """Trozos de a lo sumo `max_caracteres` cortados entre palabras; el último puede ser más corto."""
+    inicio = 0
+    while len(texto) - inicio > max_caracteres:
+        corte = texto.rfind(" ", inicio, inicio + max_caracteres)
+        corte = corte if corte > inicio else inicio + max_caracteres
+        trozo = texto[inicio:corte].strip()
+        if trozo:
+            yield trozo
+        inicio = corte
+    yield texto[inicio:].strip()
+
+
+def _oraciones(textos, max_caracteres):
+    # Lo que queda incompleto al final de una página sigue en la siguiente, pero se corta si pasa
+    # de `max_caracteres`: sin puntuación (tablas, OCR) se acumularía todo el documento
+    resto = ""
+    for texto in textos:
+        partes = _FIN_ORACION.split(resto + " " + texto)
+        *cortadas, resto = _cortar(partes.pop(), max_caracteres)
+        yield from partes
+        yield from cortadas
+    yield resto
+
+
+def fragmentos(textos, max_caracteres = MAX_CARACTERES):
+    """Fragmentos normalizados de oraciones completas a partir de los textos de las páginas."""
+    actual, largo = [], 0
+    for parte in _oraciones(textos, max_caracteres):
+        parte = normalizar(parte)
+        if not parte:
+            continue
+        if largo + len(parte) > max_caracteres and actual:
+            yield " ".join(actual)
+            actual, largo = [], 0
+        # Las oraciones más largas que el máximo se cortan entre palabras
+        *largas, parte = _cortar(parte, max_caracteres)
+        yield from largas
+        actual.append(parte)
+        largo += len(parte) + 1
+    if actual:
+        yield " ".join(actual)
+
+
+def lemas(fragmentos, nlp, n_process = 1, batch_size = 64):
+    """Lista de lemas sin stopwords de cada fragmento (pasos `doc_sin_stopwords` y `lemmas`)."""
+    sin_stop = (" ".join(t.text for t in doc if not t.is_stop)
+                for doc in nlp.tokenizer.pipe(fragmentos, batch_size = batch_size))
+    deshabilitar = [c for c in COMPONENTES_INNECESARIOS if c in nlp.pipe_names]
+    for doc in nlp.pipe(sin_stop, n_process = n_process, batch_size = batch_size, disable = deshabilitar):
+        yield [t.lemma_ for t in doc if not t.is_space]
+
+
+def contar_lemas(ruta, nlp, n_procesos = None, n_process = 1, batch_size = 64,
+                 max_caracteres = MAX_CARACTERES):
+    """`Counter` con la frecuencia de cada lema del PDF, acumulada fragmento por fragmento.
+
+    Sirve para `WordCloud(...).generate_from_frequencies(conteos)` en lugar de
+    `generate(doc_lemmas)`.
+    """
+    conteos = Counter()
+    for lista in lemas(fragmentos(paginas(ruta, n_procesos), max_caracteres), nlp, n_process, batch_size):
+        conteos.update(lista)
+    return conteos
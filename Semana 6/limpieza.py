@@ -0,0 +1,184 @@
+# coding: utf-8
+
+"""Limpieza de textos en español por lotes, con caché en disco.
+
+`text_cleaning` de `S6_LSC2_Content` y `S6_LSC3_LDA` procesa un documento a
+la vez con `list(map(...))` y llama tres veces a `nlp(...)` por documento.
+Sólo una de esas llamadas necesita el modelo completo: los stopwords
+(`token.is_stop`) y el filtro de longitud (`len(token)`) dependen únicamente
+del tokenizador. Aquí:
+
+- las expresiones regulares se compilan una vez;
+- los stopwords y el filtro de longitud usan `nlp.tokenizer.pipe`, y los
+  lemas salen de una sola pasada de `nlp.pipe` (con `n_process` y
+  `batch_size`) sin los componentes que no intervienen en el lema (`parser`,
+  `ner`);
+- `LematizadorPropio` reúne el diccionario de `Lematizador_propio` en una
+  sola expresión regular con alternativas (o en un diccionario para listas
+  de tokens);
+- `limpiar_corpus` guarda los tokens limpios de cada documento en una base
+  SQLite indexada por el hash del texto y de la configuración, de modo que al
+  volver a correr el corpus sólo se procesan los documentos nuevos o
+  modificados.
+
+El resultado es el mismo que el de `text_cleaning` con el mismo `nlp`.
+"""
+
+import hashlib
+import json
+import re
+import sqlite3
+from pathlib import Path
+
+import pandas as pd
+import spacy
+import unidecode
+
+CARPETA = Path(__file__).resolve().parent
+
+# Cambia si cambian los pasos de limpieza, para invalidar el caché
+VERSION = 1
+
+# Componentes que no intervienen en el lema
+COMPONENTES_INNECESARIOS = ["parser", "ner", "senter"]
+
+_NO_PALABRA = re.compile("[^\\w\\s]|\n")
+_DIGITOS = re.compile("\\d+")
+_TV = re.compile('tv')
+_MINISERIE = re.compile('miniserie')
+_ESPACIOS = re.compile('\\s+')
+
+
+def cargar_nlp(modelo = "es_core_news_sm", extra_stopwords = None):
+    """Modelo de spaCy con los stopwords extra del taller.
+
+    `extra_stopwords` es un conjunto de palabras o la ruta a un CSV de una
+    columna sin encabezado (como `extra_stopwords.csv`).
+    """
+    nlp = spacy.load(modelo) if isinstance(modelo, str) else modelo
+    if extra_stopwords is not None:
+        if isinstance(extra_stopwords, (str, Path)):
+            extra_stopwords = set(pd.read_csv(extra_stopwords, sep=',', header=None)[0].to_list())
+        nlp.Defaults.stop_words |= set(extra_stopwords)
+        # Las palabras que ya están en el vocabulario guardan su marca de stopword
+        for palabra in extra_stopwords:
+            nlp.vocab[palabra].is_stop = True
+    return nlp
+
+
+def prelimpiar(txt):
+    """Pasos de expresiones regulares de `text_cleaning` (tildes, signos, números, minúsculas)."""
+    out = unidecode.unidecode(txt)
+    out = _NO_PALABRA.sub(' ', out)
+    out = _DIGITOS.sub("", out)
+    out = _TV.sub(' ', out)
+    out = _MINISERIE.sub('miniseriedetv', out)
+    out = _ESPACIOS.sub(' ', out)
+    return out.lower()
+
+
+def _limpiar_lotes(textos, nlp, n_process, batch_size):
+    # Las tres pasadas de `text_cleaning`; sólo la segunda usa el modelo completo
+    sin_stop = (" ".join(t.text for t in doc if not t.is_stop)
+                for doc in nlp.tokenizer.pipe((prelimpiar(t) for t in textos), batch_size = batch_size))
+    deshabilitar = [c for c in COMPONENTES_INNECESARIOS if c in nlp.pipe_names]
+    lemas = (" ".join(t.lemma_ for t in doc)
+             for doc in nlp.pipe(sin_stop, n_process = n_process, batch_size = batch_size,
+                                 disable = deshabilitar))
+    for doc in nlp.tokenizer.pipe(lemas, batch_size = batch_size):
+        yield [t.text for t in doc if len(t) > 2]
+
+
+def _huella(nlp):
+    # Identifica el modelo y los stopwords con los que se limpió el texto
+    meta = nlp.meta
+    partes = [str(VERSION), meta.get("lang", ""), meta.get("name", ""), meta.get("version", ""),
+              ",".join(nlp.pipe_names), ",".join(sorted(nlp.Defaults.stop_words))]
+    return hashlib.sha1("\x1f".join(partes).encode("utf-8")).hexdigest()
+
+
+class _Cache:
+    def __init__(self, ruta):
+        self.conexion = sqlite3.connect(str(ruta))
+        self.conexion.execute("CREATE TABLE IF NOT EXISTS tokens (clave TEXT PRIMARY KEY, tokens TEXT)")
+
+    def leer(self, claves):
+        encontrados = {}
+        claves = list(claves)
+        for inicio in range(0, len(claves), 500):
+            parte = claves[inicio:inicio + 500]
+            consulta = "SELECT clave, tokens FROM tokens WHERE clave IN (%s)" % ",".join("?" * len(parte))
+            encontrados.update((c, json.loads(t)) for c, t in self.conexion.execute(consulta, parte))
+        return encontrados
+
+    def escribir(self, pares):
+        self.conexion.executemany("INSERT OR REPLACE INTO tokens VALUES (?, ?)",
+                                  ((c, json.dumps(t, ensure_ascii = False)) for c, t in pares))
+        self.conexion.commit()
+
+    def cerrar(self):
+        self.conexion.close()
+
+
+def limpiar_corpus(textos, nlp, n_process = 1, batch_size = 256, cache = None):
+    """Lista de tokens limpios de cada texto, en el mismo orden.
+
+    Equivale a `list(map(text_cleaning, textos))`. Con `cache` (ruta a un
+    archivo SQLite) los documentos ya procesados con el mismo modelo y los
+    mismos stopwords se leen del disco y sólo se procesan los demás.
+    """
+    textos = ["" if pd.isna(t) else str(t) for t in textos]
+    if cache is None:
+        return list(_limpiar_lotes(textos, nlp, n_process, batch_size))
+
+    huella = _huella(nlp)
+    claves = [hashlib.sha1((huella + t).encode("utf-8")).hexdigest() for t in textos]
+    almacen = _Cache(cache)
+    try:
+        resultado = almacen.leer(set(claves))
+        pendientes = {}
+        for clave, texto in zip(claves, textos):
+            if clave not in resultado:
+                pendientes.setdefault(clave, texto)
+        lote = []
+        for clave, tokens in zip(pendientes, _limpiar_lotes(list(pendientes.values()), nlp,
+                                                            n_process, batch_size)):
+            resultado[clave] = tokens
+            lote.append((clave, tokens))
+            if len(lote) >= 1000:
+                almacen.escribir(lote)
+                lote = []
+        almacen.escribir(lote)
+    finally:
+        almacen.cerrar()
+    return [resultado[c] for c in claves]
+
+
+class LematizadorPropio:
+    """`Lematizador_propio` con todas las reglas en una sola expresión regular.
+
+    `lemmas` es el diccionario del cuaderno ({r"\\bpalabra\\b": "lema"}) o uno
+    de palabras sin `\\b`. Como en el cuaderno, las reglas no distinguen
+    mayúsculas y se aplican en orden: si el lema de una regla coincide con
+    una regla posterior, se usa el lema de esta última.
+    """
+
+    def __init__(self, lemmas):
+        palabras = [re.sub(r"^\\b|\\b$", "", p).lower() for p in lemmas]
+        objetivos = list(lemmas.values())
+        self.mapa = {}
+        for i, (palabra, lema) in enumerate(zip(palabras, objetivos)):
+            for posterior, lema_posterior in zip(palabras[i + 1:], objetivos[i + 1:]):
+                if lema.lower() == posterior:
+                    lema = lema_posterior
+            self.mapa.setdefault(palabra, lema)
+        # Las alternativas más largas primero para que no las tape un prefijo
+        alternativas = sorted(self.mapa, key = len, reverse = True)
+        self.patron = re.compile(r"\b(?:%s)\b" % "|".join(map(re.escape, alternativas)), flags = re.IGNORECASE)
+
+    def __call__(self, text):
+        return self.patron.sub(lambda m: self.mapa[m.group(0).lower()], text)
+
+    def tokens(self, tokens):
+        """Misma sustitución sobre una lista de tokens, con búsqueda en el diccionario."""
+        return [self.mapa.get(t.lower(), t) for t in tokens]
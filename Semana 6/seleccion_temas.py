@@ -0,0 +1,274 @@
+# coding: utf-8
+
+"""Barrido del número de temas de LDA en paralelo, con una sola tabla de coocurrencias.
+
+En `S6_LSC3_LDA`, `calcular_coherencia` y `perplejidad_ntemas` entrenan dos
+veces los mismos modelos (uno por número de temas, uno tras otro), y cada
+`CoherenceModel` vuelve a recorrer todas las ventanas de `texts` para contar
+las coocurrencias de las palabras de ese modelo. Aquí:
+
+- el corpus se guarda una vez en formato Matrix Market (`MmCorpus`) junto con
+  el diccionario, y cada proceso lo lee del disco en lugar de recibir una
+  copia serializada en cada tarea;
+- cada número de temas se entrena en su propio proceso y ahí mismo se
+  calcula la perplejidad, de modo que cada modelo se entrena una sola vez;
+- `TablaCoocurrencia` cuenta una sola vez las ventanas deslizantes (c_v) y los
+  documentos (u_mass) en que aparece cada palabra y cada par de palabras; sólo
+  agrega las palabras principales de cada modelo que aún no conoce. Las
+  coherencias son las mismas que las de `CoherenceModel`;
+- con `paciencia`, el barrido se detiene cuando la coherencia deja de mejorar
+  durante ese número de modelos consecutivos.
+"""
+
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+from gensim import matutils
+from gensim.corpora import Dictionary, MmCorpus
+from gensim.models import LdaMulticore
+from scipy import sparse
+
+# Como en `gensim.topic_coherence.direct_confirmation_measure`
+EPSILON = 1e-12
+
+# Tamaño de la ventana deslizante de c_v en `CoherenceModel`
+VENTANA_CV = 110
+
+# Parámetros de `LdaMulticore` en `calcular_coherencia` del cuaderno
+PARAMETROS_LDA = {"random_state": 123, "passes": 20}
+
+
+class TablaCoocurrencia:
+    """Conteos de ventanas y documentos por palabra y por par de palabras.
+
+    Las ventanas son las de `CoherenceModel` con `coherence='c_v'`: cada
+    texto aporta `len(texto) − ventana + 1` ventanas (una sola si es más
+    corto), los tokens que no están en `dictionary` ocupan su posición y una
+    palabra cuenta en una ventana con la misma regla de `WordOccurrenceAccumulator`.
+    Los conteos se calculan sólo para las palabras pedidas y se guardan para
+    los modelos siguientes.
+    """
+
+    def __init__(self, texts, dictionary, ventana = VENTANA_CV):
+        self.dictionary = dictionary
+        self.ventana = ventana
+        token2id = dictionary.token2id
+        largos = np.array([len(t) for t in texts], dtype = np.int64)
+        ids = np.fromiter((token2id.get(w, -1) for t in texts for w in t), dtype = np.int64,
+                          count = largos.sum())
+        doc = np.repeat(np.arange(len(texts)), largos)
+        pos = np.arange(len(ids)) - np.repeat(np.cumsum(largos) - largos, largos)
+        self.ventanas_doc = np.maximum(largos - ventana + 1, 1)
+        self.inicio_doc = np.cumsum(self.ventanas_doc) - self.ventanas_doc
+        self.n_ventanas = int(self.ventanas_doc.sum())
+        self.n_docs = len(texts)
+        # Ocurrencias de cada palabra del diccionario ordenadas por (palabra, documento, posición)
+        conocidos = ids >= 0
+        orden = np.lexsort((pos[conocidos], doc[conocidos], ids[conocidos]))
+        self._doc = doc[conocidos][orden]
+        self._pos = pos[conocidos][orden]
+        conteos = np.bincount(ids[conocidos], minlength = len(dictionary))
+        self._indptr = np.concatenate([[0], np.cumsum(conteos)])
+        self.columna = {}
+        self._W = sparse.csc_matrix((self.n_ventanas, 0), dtype = np.float64)
+        self._D = sparse.csc_matrix((self.n_docs, 0), dtype = np.float64)
+        self.co_ventanas = np.zeros((0, 0))
+        self.co_docs = np.zeros((0, 0))
+
+    def _incidencias(self, nuevas):
+        # Matrices binarias ventanas × palabras y documentos × palabras de las palabras nuevas
+        partes = [np.arange(self._indptr[i], self._indptr[i + 1]) for i in nuevas]
+        largo = np.array([len(p) for p in partes], dtype = np.int64)
+        sel = np.concatenate(partes) if partes else np.zeros(0, dtype = np.int64)
+        col = np.repeat(np.arange(len(nuevas)), largo)
+        doc, pos = self._doc[sel], self._pos[sel]
+        misma = np.zeros(len(sel), dtype = bool)
+        misma[1:] = (col[1:] == col[:-1]) & (doc[1:] == doc[:-1])
+        grupo = np.cumsum(~misma) - 1
+        siguiente = np.full(len(sel), np.iinfo(np.int64).max // 2)
+        siguiente[:-1] = np.where(misma[1:], pos[1:], siguiente[:-1])
+        # Primera ocurrencia del mismo (palabra, documento) a menos de `ventana` posiciones
+        clave = grupo * (pos.max(initial = 0) + self.ventana + 1) + pos
+        primera_cerca = pos[np.searchsorted(clave, clave - self.ventana + 1)]
+        # Ventanas en que cada ocurrencia es la última de su palabra. Como `_slide_window` de
+        # gensim, la palabra deja de contar cuando sale de la ventana una ocurrencia anterior
+        # aunque quede otra dentro
+        bajo = np.maximum(pos - self.ventana + 1, 0)
+        alto = np.minimum.reduce([pos, siguiente - self.ventana, self.ventanas_doc[doc] - 1,
+                                  np.where(primera_cerca < pos, primera_cerca, pos)])
+        cuantas = np.maximum(alto - bajo + 1, 0)
+        desde = np.repeat(self.inicio_doc[doc] + bajo - np.cumsum(cuantas) + cuantas, cuantas)
+        filas = desde + np.arange(cuantas.sum())
+        W = sparse.csc_matrix((np.ones(len(filas)), (filas, np.repeat(col, cuantas))),
+                              shape = (self.n_ventanas, len(nuevas)))
+        primera = ~misma
+        D = sparse.csc_matrix((np.ones(primera.sum()), (doc[primera], col[primera])),
+                              shape = (self.n_docs, len(nuevas)))
+        return W, D
+
+    def agregar(self, palabras):
+        """Calcula los conteos de las palabras (ids del diccionario) que aún no están en la tabla."""
+        nuevas = [int(p) for p in dict.fromkeys(np.ravel(palabras).tolist()) if int(p) not in self.columna]
+        if not nuevas:
+            return self
+        W, D = self._incidencias(nuevas)
+        self.co_ventanas = self._ampliar(self.co_ventanas, self._W, W)
+        self.co_docs = self._ampliar(self.co_docs, self._D, D)
+        self._W = sparse.hstack([self._W, W], format = "csc")
+        self._D = sparse.hstack([self._D, D], format = "csc")
+        for p in nuevas:
+            self.columna[p] = len(self.columna)
+        return self
+
+    @staticmethod
+    def _ampliar(co, anterior, nueva):
+        cruce = (nueva.T @ anterior).toarray()
+        propia = (nueva.T @ nueva).toarray()
+        return np.block([[co, cruce.T], [cruce, propia]])
+
+    def c_v(self, temas):
+        """Coherencia c_v de cada tema (NPMI, vectores de contexto y similitud de coseno)."""
+        self.agregar(np.concatenate(temas))
+        coherencias = []
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            for tema in temas:
+                j = [self.columna[int(p)] for p in tema]
+                P = self.co_ventanas[np.ix_(j, j)] / self.n_ventanas
+                p = np.diag(P)
+                npmi = np.log((P + EPSILON) / np.outer(p, p)) / -np.log(P + EPSILON)
+                conjunto = npmi.sum(axis = 0)
+                cos = npmi @ conjunto / (np.linalg.norm(npmi, axis = 1) * np.linalg.norm(conjunto))
+                coherencias.append(cos.mean())
+        return np.array(coherencias)
+
+    def u_mass(self, temas):
+        """Coherencia u_mass de cada tema: log((D(w_i, w_j) + ε) / D(w_j)) para j < i."""
+        self.agregar(np.concatenate(temas))
+        coherencias = []
+        for tema in temas:
+            j = [self.columna[int(p)] for p in tema]
+            P = self.co_docs[np.ix_(j, j)] / self.n_docs
+            i_, j_ = np.tril_indices(len(j), -1)
+            coherencias.append(np.mean(np.log((P[i_, j_] + EPSILON) / np.diag(P)[j_])))
+        return np.array(coherencias)
+
+
+def temas_principales(modelo, topn = 20):
+    """Ids de las `topn` palabras más probables de cada tema, como en `CoherenceModel`."""
+    return [matutils.argsort(tema, topn = topn, reverse = True) for tema in modelo.get_topics()]
+
+
+def guardar_corpus(corpus, dictionary, carpeta):
+    """Guarda el corpus como `MmCorpus` y el diccionario; devuelve sus rutas."""
+    carpeta = Path(carpeta)
+    carpeta.mkdir(parents = True, exist_ok = True)
+    ruta_corpus, ruta_diccionario = carpeta / "corpus.mm", carpeta / "diccionario.dict"
+    MmCorpus.serialize(str(ruta_corpus), corpus)
+    dictionary.save(str(ruta_diccionario))
+    return ruta_corpus, ruta_diccionario
+
+
+# Corpus y diccionario de cada proceso, leídos una vez por `_inicializar`
+_CORPUS = None
+_DICCIONARIO = None
+
+
+def _inicializar(ruta_corpus, ruta_diccionario):
+    global _CORPUS, _DICCIONARIO
+    _CORPUS = MmCorpus(str(ruta_corpus))
+    _DICCIONARIO = Dictionary.load(str(ruta_diccionario))
+
+
+def _entrenar(num_topics, parametros, corpus = None, dictionary = None):
+    corpus = _CORPUS if corpus is None else corpus
+    dictionary = _DICCIONARIO if dictionary is None else dictionary
+    modelo = LdaMulticore(corpus = corpus, id2word = dictionary, num_topics = num_topics, **parametros)
+    return modelo, np.exp2(-modelo.log_perplexity(corpus))
+
+
+def barrido_temas(corpus, dictionary, texts, start = 1, limit = 10, step = 1, n_procesos = None,
+                  criterio = "c_v", paciencia = None, tolerancia = 0.0, topn = 20, carpeta = None,
+                  **parametros_lda):
+    """Entrena un `LdaMulticore` por cada número de temas de `range(start, limit, step)`.
+
+    Devuelve `(modelos, metricas)`: la lista de modelos y un `DataFrame` con
+    una fila por número de temas y las columnas `c_v`, `u_mass` y
+    `perplejidad` (la de la celda de `np.exp2(-log_perplexity(corpus))`).
+
+    Los modelos se entrenan en `n_procesos` procesos (por defecto uno por
+    núcleo), con los parámetros de `calcular_coherencia` salvo los que se
+    pasen en `parametros_lda`. Dentro de esos procesos cada `LdaMulticore`
+    usa `workers=1`, para no lanzar un grupo de procesos por modelo con más
+    procesos que núcleos; como `LdaMulticore` actualiza cada `chunksize ×
+    workers` documentos, con corpus de más de `chunksize` documentos los
+    modelos pueden diferir de los del cuaderno (con `n_procesos=1` se usan
+    los `workers` por defecto, como en el cuaderno). Si se da `paciencia`, el barrido se detiene
+    cuando la coherencia `criterio` no supera en más de `tolerancia` a la
+    mejor durante `paciencia` modelos seguidos. `carpeta` es donde se guarda
+    el corpus (por defecto una carpeta temporal).
+    """
+    ks = list(range(start, limit, step))
+    parametros = {**PARAMETROS_LDA, **parametros_lda}
+    n_procesos = min(n_procesos or os.cpu_count() or 1, len(ks))
+    tabla = TablaCoocurrencia(texts, dictionary)
+    modelos, filas = [], []
+    mejor, sin_mejora = -np.inf, 0
+
+    def evaluar(modelo, perplejidad):
+        nonlocal mejor, sin_mejora
+        temas = temas_principales(modelo, topn)
+        fila = {"c_v": tabla.c_v(temas).mean(), "u_mass": tabla.u_mass(temas).mean(),
+                "perplejidad": perplejidad}
+        modelos.append(modelo)
+        filas.append(fila)
+        if fila[criterio] > mejor + tolerancia:
+            mejor, sin_mejora = fila[criterio], 0
+        else:
+            sin_mejora += 1
+        return paciencia is not None and sin_mejora >= paciencia
+
+    if n_procesos <= 1:
+        for k in ks:
+            if evaluar(*_entrenar(k, parametros, corpus, dictionary)):
+                break
+    else:
+        with tempfile.TemporaryDirectory() as temporal:
+            rutas = guardar_corpus(corpus, dictionary, carpeta or temporal)
+            parametros = {"workers": 1, **parametros}
+            with ProcessPoolExecutor(max_workers = n_procesos, initializer = _inicializar,
+                                     initargs = rutas) as ejecutor:
+                # Como mucho `n_procesos` modelos en curso; se evalúan en orden de k
+                pendientes = deque()
+                siguientes = iter(ks)
+                for k in siguientes:
+                    pendientes.append(ejecutor.submit(_entrenar, k, parametros))
+                    if len(pendientes) < n_procesos:
+                        continue
+                    if evaluar(*pendientes.popleft().result()):
+                        break
+                else:
+                    while pendientes:
+                        if evaluar(*pendientes.popleft().result()):
+                            break
+                for futuro in pendientes:
+                    futuro.cancel()
+    metricas = pd.DataFrame(filas, index = pd.Index(ks[:len(filas)], name = "num_topics"))
+    return modelos, metricas
+
+
+def graficar_metricas(metricas, columnas = ("c_v", "perplejidad")):
+    """Una gráfica por métrica contra el número de temas, como las del cuaderno."""
+    etiquetas = {"c_v": "Medida de Coherencia", "u_mass": "Medida de Coherencia (u_mass)",
+                 "perplejidad": "Medida de Perplejidad"}
+    fig, ejes = plt.subplots(1, len(columnas), figsize = (6 * len(columnas), 4), squeeze = False)
+    for eje, columna in zip(ejes[0], columnas):
+        eje.plot(metricas.index, metricas[columna])
+        eje.set_xlabel("Número de Temas")
+        eje.set_ylabel(etiquetas.get(columna, columna))
+    plt.show()
@@ -0,0 +1,22 @@
+# coding: utf-8
+
+import pytest
+
+pytest.importorskip("PyPDF2")
+pytest.importorskip("unidecode")
+
+from ingesta_pdf import fragmentos, normalizar
+
+
+def test_fragmentos_sin_puntuacion_respetan_el_maximo():
+    # Páginas tipo tabla u OCR: sin signos de fin de oración ni líneas en blanco
+    paginas = ["clausula %d del acuerdo sobre tierras y desarrollo rural " % i * 40 for i in range(300)]
+    resultado = list(fragmentos(paginas, max_caracteres = 5000))
+    assert len(resultado) > 1
+    assert max(len(f) for f in resultado) <= 5000
+    assert " ".join(resultado).split() == normalizar(" ".join(paginas)).split()
+
+
+def test_fragmentos_ultimo_resto_respeta_el_maximo():
+    resultado = list(fragmentos(["uno. dos", "palabra " * 2000], max_caracteres = 1000))
+    assert max(len(f) for f in resultado) <= 1000
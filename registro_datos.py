@@ -0,0 +1,227 @@
+# coding: utf-8
+
+"""Registro de las bases de los talleres con un caché en Parquet y tipos compactos.
+
+Cada cuaderno vuelve a leer los archivos de texto con `pd.read_csv` y los
+tipos por defecto: identificadores en `int64`, `Genero` y `tipo_crimen` como
+texto repetido fila por fila y las fechas como cadenas que hay que convertir
+a mano. Aquí:
+
+- `DATOS` describe cada fuente (ruta, separador, nombres de columnas, tipos y
+  columnas de fecha) con las convenciones de los cuadernos: `user_artists`,
+  `artists`, `datos_clientes`, `blog_casciari`, `delitos` y las tablas de
+  MovieLens `u.data`, `u.item` y `u.user`;
+- la primera vez que se pide una base se lee la fuente, se convierten los
+  tipos (categorías, enteros de 32 bits o menos, fechas) y se guarda como
+  Parquet en la carpeta `cache_parquet` junto a la fuente;
+- las cargas siguientes leen el Parquet con `pyarrow`, sólo las columnas de
+  `columnas` y, con `filtros`, sólo los grupos de filas que pasan el filtro;
+- el caché se invalida si cambia el tamaño o la fecha de modificación de la
+  fuente y el contenido (BLAKE2) es otro; si sólo cambió la fecha (p. ej. al
+  volver a descargar el mismo archivo) se conserva.
+
+Las tablas de MovieLens no están en el repositorio: antes de cargarlas hay
+que descargar `ml-100k.zip` de GroupLens (la dirección está en `DATOS`) y
+copiar `u.data`, `u.item` y `u.user` en `Semana 5/data`, que es donde los lee
+el cuaderno `S5_LSC3_Colab`.
+
+Desde un cuaderno de una carpeta `Semana N`::
+
+    import sys; sys.path.append("..")
+    from registro_datos import cargar
+    clientes = cargar("datos_clientes", columnas = ["Genero", "Edad"])
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+RAIZ = Path(__file__).resolve().parent
+
+# Carpeta del caché, dentro de la carpeta de cada fuente
+CARPETA_CACHE = "cache_parquet"
+
+VERSION = 1
+
+# Filas por grupo del Parquet: con grupos más chicos los filtros descartan más
+FILAS_POR_GRUPO = 100_000
+
+# MovieLens 100K: `u.data`, `u.item` y `u.user` vienen dentro del zip, en la carpeta `ml-100k`
+_DESCARGA_MOVIELENS = "https://files.grouplens.org/datasets/movielens/ml-100k.zip"
+
+_GENEROS_MOVIELENS = ['desconocido', 'Accion', 'Aventura', 'Animacion', 'Infantil', 'Comedia', 'Crimen',
+                      'Documental', 'Drama', 'Fantasia', 'Cine-Noir', 'Horror', 'Musical', 'Misterio',
+                      'Romance', 'Ciencia_ficcipn', 'Thriller', 'Guerra', 'Western']
+
+# Fuentes conocidas. `lectura` va a `pd.read_csv`; `tipos` se aplica después de leer y de
+# renombrar; `fechas` son columnas a convertir con `pd.to_datetime(..., **opciones)`;
+# `descarga` es de dónde bajar las fuentes que no vienen con el repositorio.
+DATOS = {
+    "user_artists": {
+        "ruta": "Semana 5/user_artists.dat",
+        "lectura": {"sep": "\t"},
+        "renombrar": {"weight": "nro_reproducciones"},
+        "tipos": {"userID": "int32", "artistID": "int32", "nro_reproducciones": "int32"},
+    },
+    "artists": {
+        "ruta": "Semana 5/artists.dat",
+        "lectura": {"sep": "\t"},
+        "renombrar": {"id": "artistID", "name": "artistname"},
+        "tipos": {"artistID": "int32"},
+    },
+    "datos_clientes": {
+        "ruta": "Semana 4/datos_clientes.csv",
+        "tipos": {"Id_Cliente": "int32", "Genero": "category", "Edad": "int16", "Puntaje_Gasto": "int16"},
+    },
+    "blog_casciari": {
+        "ruta": "Semana 6/blog_casciari.csv",
+        "fechas": {"fecha": {"format": "%m/%d/%y"}},
+    },
+    "delitos": {
+        "ruta": "S7_LC_Taller_Geograficos_KDE/Files/data/Chicago_delitos_verano_2019.csv",
+        "tipos": {"tipo_crimen": "category", "nro_area_comunitaria": "int16"},
+        "fechas": {"fecha": {"format": "ISO8601", "utc": True}},
+    },
+    "ratings": {
+        "ruta": "Semana 5/data/u.data",
+        "descarga": _DESCARGA_MOVIELENS,
+        "lectura": {"sep": "\t", "names": ['user_id', 'movie_id', 'rating', 'timestamp'],
+                    "encoding": "latin-1"},
+        "tipos": {"user_id": "int32", "movie_id": "int32", "rating": "int8"},
+        "fechas": {"timestamp": {"unit": "s"}},
+    },
+    "movies": {
+        "ruta": "Semana 5/data/u.item",
+        "descarga": _DESCARGA_MOVIELENS,
+        "lectura": {"sep": "|", "encoding": "latin-1",
+                    "names": ['movie_id', 'titulo', 'fecha_estreno', 'fecha_estreno_video', 'URL_IMDb']
+                    + _GENEROS_MOVIELENS},
+        "tipos": dict({"movie_id": "int32"}, **{g: "bool" for g in _GENEROS_MOVIELENS}),
+        "fechas": {"fecha_estreno": {"format": "%d-%b-%Y"}},
+    },
+    "users": {
+        "ruta": "Semana 5/data/u.user",
+        "descarga": _DESCARGA_MOVIELENS,
+        "lectura": {"sep": "|", "encoding": "latin-1",
+                    "names": ['user_id', 'edad', 'genero', 'ocupacion', 'codigo_postal'],
+                    # Como texto desde la lectura, para no perder los ceros a la izquierda
+                    "dtype": {"codigo_postal": "str"}},
+        "tipos": {"user_id": "int32", "edad": "int8", "genero": "category", "ocupacion": "category"},
+    },
+}
+
+
+def registrar(nombre, ruta, lectura = None, renombrar = None, tipos = None, fechas = None):
+    """Agrega (o reemplaza) una fuente en `DATOS`; `ruta` puede ser absoluta o relativa a la raíz."""
+    DATOS[nombre] = {"ruta": str(ruta), "lectura": lectura or {}, "renombrar": renombrar or {},
+                     "tipos": tipos or {}, "fechas": fechas or {}}
+
+
+def _fuente(nombre):
+    if nombre not in DATOS:
+        raise KeyError("base desconocida %r; las registradas son %s" % (nombre, sorted(DATOS)))
+    return RAIZ / DATOS[nombre]["ruta"]
+
+
+def _exigir_fuente(nombre):
+    ruta = _fuente(nombre)
+    if not ruta.exists():
+        mensaje = "no se encontró la fuente de %r en %s" % (nombre, ruta)
+        if "descarga" in DATOS[nombre]:
+            mensaje += "; descárguela de %s y copie %s en %s" % (DATOS[nombre]["descarga"], ruta.name, ruta.parent)
+        raise FileNotFoundError(mensaje)
+    return ruta
+
+
+def _rutas_cache(nombre, carpeta_cache):
+    carpeta = Path(carpeta_cache) if carpeta_cache is not None else _fuente(nombre).parent / CARPETA_CACHE
+    return carpeta / (nombre + ".parquet"), carpeta / (nombre + ".json")
+
+
+def _huella(ruta, tamano_bloque = 1 << 20):
+    h = hashlib.blake2b(digest_size = 16)
+    with open(ruta, "rb") as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _firma(nombre, huella = None):
+    estado = os.stat(_exigir_fuente(nombre))
+    # La descripción entra en la firma: cambiar tipos o nombres también invalida el caché
+    return {"version": VERSION, "descripcion": json.dumps(DATOS[nombre], sort_keys = True),
+            "tamano": estado.st_size, "mtime": estado.st_mtime_ns, "huella": huella}
+
+
+def leer_fuente(nombre):
+    """La base leída del archivo de texto y con los tipos de `DATOS`, sin pasar por el caché."""
+    descripcion = DATOS[nombre]
+    tabla = pd.read_csv(_exigir_fuente(nombre), **descripcion.get("lectura", {}))
+    tabla = tabla.rename(columns = descripcion.get("renombrar", {}))
+    for columna, opciones in descripcion.get("fechas", {}).items():
+        tabla[columna] = pd.to_datetime(tabla[columna], errors = "coerce", **opciones)
+    return tabla.astype(descripcion.get("tipos", {}))
+
+
+def convertir(nombre, carpeta_cache = None):
+    """Lee la fuente y escribe su Parquet y su firma; devuelve la ruta del Parquet."""
+    ruta, ruta_firma = _rutas_cache(nombre, carpeta_cache)
+    ruta.parent.mkdir(parents = True, exist_ok = True)
+    tabla = pa.Table.from_pandas(leer_fuente(nombre), preserve_index = False)
+    temporal = ruta.with_suffix(".tmp")
+    pq.write_table(tabla, temporal, row_group_size = FILAS_POR_GRUPO)
+    os.replace(temporal, ruta)
+    with open(ruta_firma, "w") as archivo:
+        json.dump(_firma(nombre, _huella(_fuente(nombre))), archivo)
+    return ruta
+
+
+def vigente(nombre, carpeta_cache = None):
+    """Si el Parquet de `nombre` corresponde a la fuente actual."""
+    ruta, ruta_firma = _rutas_cache(nombre, carpeta_cache)
+    if not (ruta.exists() and ruta_firma.exists()):
+        return False
+    with open(ruta_firma) as archivo:
+        guardada = json.load(archivo)
+    actual = _firma(nombre)
+    if all(guardada.get(k) == actual[k] for k in ("version", "descripcion", "tamano", "mtime")):
+        return True
+    if any(guardada.get(k) != actual[k] for k in ("version", "descripcion", "tamano")):
+        return False
+    # Sólo cambió la fecha de modificación: se compara el contenido y, si es el mismo, se
+    # actualiza la firma para no volver a leer la fuente completa en la próxima carga
+    actual["huella"] = _huella(_fuente(nombre))
+    if actual["huella"] != guardada.get("huella"):
+        return False
+    with open(ruta_firma, "w") as archivo:
+        json.dump(actual, archivo)
+    return True
+
+
+def cargar(nombre, columnas = None, filtros = None, carpeta_cache = None):
+    """`DataFrame` de la base `nombre` desde el caché, convirtiendo la fuente si hace falta.
+
+    Parámetros
+    ----------
+    columnas : columnas a leer (el resto no se lee del disco).
+    filtros : filtros de `pyarrow`, p. ej. `[("tipo_crimen", "==", "robo")]`.
+    carpeta_cache : carpeta del Parquet (por defecto `cache_parquet` junto a la fuente).
+    """
+    ruta, _ = _rutas_cache(nombre, carpeta_cache)
+    if not vigente(nombre, carpeta_cache):
+        convertir(nombre, carpeta_cache)
+    tabla = pq.read_table(ruta, columns = None if columnas is None else list(columnas), filters = filtros)
+    return tabla.to_pandas()
+
+
+def esquema(nombre, carpeta_cache = None):
+    """Esquema `pyarrow` de la base (columnas y tipos), sin leer los datos."""
+    ruta, _ = _rutas_cache(nombre, carpeta_cache)
+    if not vigente(nombre, carpeta_cache):
+        convertir(nombre, carpeta_cache)
+    return pq.read_schema(ruta)